@@ -0,0 +1,221 @@
+"""Firebase ID-token authentication for API routes"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from fastapi import Depends, HTTPException, WebSocket
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from core.config import settings
+from core.firebase import ensure_firebase, verify_firebase_token
+
+# Source of Firebase ID-token signing keys (see firebase_admin._token_gen)
+ID_TOKEN_CERT_URI = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+class TokenVerifier:
+    """
+    Verify Firebase ID tokens, caching decoded claims
+    
+    A signature check (and, when the signing keys are stale, a key fetch)
+    happens once per token; the claims are then served from a per-worker LRU
+    of AUTH_TOKEN_CACHE_SIZE tokens until the token's `exp`. Concurrent
+    requests with the same unseen token share one verification.
+    """
+    
+    def __init__(self, verify: Callable[[str], dict] = verify_firebase_token, max_tokens: int = None):
+        self._verify = verify
+        self.max_tokens = max_tokens if max_tokens is not None else settings.AUTH_TOKEN_CACHE_SIZE
+        # sha256(token) -> decoded claims
+        self._claims: "OrderedDict[str, dict]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}  # verifications in progress
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.key_refreshes = 0
+        self.key_refresh_failures = 0
+        self.key_refresh_supported = True
+    
+    async def verify(self, token: str) -> dict:
+        """
+        Decoded claims of a valid token
+        
+        Raises:
+            ValueError: If the token is invalid or expired
+        """
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        claims = self._claims.get(key)
+        if claims is not None:
+            if claims.get("exp", 0) > time.time():
+                self._claims.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._claims[key]
+        
+        pending = self._pending.get(key)
+        if pending is None:
+            self.misses += 1
+            pending = asyncio.ensure_future(self._verify_uncached(key, token))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(pending)
+    
+    async def _verify_uncached(self, key: str, token: str) -> dict:
+        try:
+            # The SDK call is blocking (RSA check, occasional key download)
+            claims = await asyncio.to_thread(self._verify, token)
+        except Exception as e:
+            self.failures += 1
+            if isinstance(e, ValueError):
+                raise
+            raise ValueError(f"Invalid token: {e}")
+        self._claims[key] = claims
+        if len(self._claims) > self.max_tokens:
+            self._claims.popitem(last=False)
+        return claims
+    
+    def refresh_signing_keys(self) -> bool:
+        """
+        Re-download the ID-token signing keys into the SDK's HTTP cache
+        
+        firebase_admin fetches keys inline, on the request path, once its
+        cached copy expires. Refreshing them ahead of time keeps that fetch
+        off requests. Initializes Firebase first if warmup hasn't yet.
+        
+        Returns:
+            Whether the keys were refreshed (failures are only logged)
+        """
+        if not ensure_firebase():
+            self.key_refresh_failures += 1
+            return False
+        try:
+            request = _signing_key_request()
+            if request is None:
+                # The SDK doesn't expose its key fetcher: keys are fetched inline
+                print("Firebase signing-key refresh not supported by this firebase_admin version")
+                self.key_refresh_supported = False
+                return False
+            request(ID_TOKEN_CERT_URI, headers={"Cache-Control": "no-cache"})
+        except Exception as e:
+            self.key_refresh_failures += 1
+            print(f"Failed to refresh Firebase signing keys: {e}")
+            return False
+        self.key_refreshes += 1
+        return True
+    
+    async def run_key_refresher(self):
+        """
+        Periodically refresh signing keys (run as a background task)
+        
+        Retries after AUTH_KEY_REFRESH_RETRY seconds when a refresh fails
+        (e.g. Firebase isn't reachable yet), and stops if the SDK doesn't
+        support it.
+        """
+        while self.key_refresh_supported:
+            refreshed = await asyncio.to_thread(self.refresh_signing_keys)
+            await asyncio.sleep(settings.AUTH_KEY_REFRESH_INTERVAL if refreshed else settings.AUTH_KEY_REFRESH_RETRY)
+    
+    def metrics(self) -> dict:
+        return {
+            "enabled": settings.AUTH_ENABLED,
+            "cached_tokens": len(self._claims),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "key_refreshes": self.key_refreshes,
+            "key_refresh_failures": self.key_refresh_failures,
+        }
+
+
+def _signing_key_request():
+    """
+    The SDK's caching HTTP request for signing keys, or None
+    
+    Reaches into firebase_admin internals (auth._get_client(app)
+    ._token_verifier.request, as of firebase-admin 6.x), so any missing
+    piece means the refresh is skipped rather than failing.
+    """
+    from firebase_admin import auth
+    get_client = getattr(auth, "_get_client", None)
+    if get_client is None:
+        return None
+    request = getattr(getattr(get_client(None), "_token_verifier", None), "request", None)
+    return request if callable(request) else None
+
+
+# Global instance
+_token_verifier = None
+
+
+def get_token_verifier() -> TokenVerifier:
+    """Get token verifier instance (singleton)"""
+    global _token_verifier
+    if _token_verifier is None:
+        _token_verifier = TokenVerifier()
+    return _token_verifier
+
+
+async def get_auth_claims(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> Optional[dict]:
+    """
+    Claims of the request's `Authorization: Bearer <Firebase ID token>`
+    
+    Returns None while AUTH_ENABLED is off.
+    
+    Raises:
+        HTTPException: 401 if the token is missing or invalid
+    """
+    if not settings.AUTH_ENABLED:
+        return None
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Missing bearer token", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return await get_token_verifier().verify(credentials.credentials)
+    except ValueError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+
+def ensure_user(claims: Optional[dict], user_id: str):
+    """
+    Check that a request acts on the token owner's own data
+    
+    Raises:
+        HTTPException: 403 if the token belongs to another user
+    """
+    if claims is not None and claims.get("uid") != user_id:
+        raise HTTPException(status_code=403, detail="Token does not belong to this user")
+
+
+async def require_user(user_id: str, claims: Optional[dict] = Depends(get_auth_claims)) -> Optional[dict]:
+    """Route dependency: authenticated as the `user_id` path parameter"""
+    ensure_user(claims, user_id)
+    return claims
+
+
+async def authenticate_websocket(websocket: WebSocket, user_id: str) -> bool:
+    """
+    Verify a WebSocket's token once, before accepting it
+    
+    The token comes from the `token` query parameter (browsers can't set
+    headers on WebSockets) or an Authorization header. Rejected sockets are
+    closed with 1008.
+    """
+    if not settings.AUTH_ENABLED:
+        return True
+    token = websocket.query_params.get("token")
+    header = websocket.headers.get("authorization", "")
+    if not token and header.lower().startswith("bearer "):
+        token = header[len("bearer "):]
+    try:
+        if not token:
+            raise ValueError("Missing token")
+        ensure_user(await get_token_verifier().verify(token), user_id)
+        return True
+    except (ValueError, HTTPException):
+        await websocket.close(code=1008)
+        return False
@@ -1,6 +1,6 @@
 """Application configuration"""
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -24,16 +24,135 @@ class Settings(BaseSettings):
     FIREBASE_PROJECT_ID: str = ""
     FIREBASE_CREDENTIALS_PATH: str = ""
     
+    # Authentication (Firebase ID tokens on the chat and usage routes)
+    AUTH_ENABLED: bool = False  # off: routes trust the user_id they are given
+    AUTH_TOKEN_CACHE_SIZE: int = 10000  # verified tokens cached per worker, each until its exp
+    AUTH_KEY_REFRESH_INTERVAL: int = 3600  # seconds between background signing-key refreshes
+    AUTH_KEY_REFRESH_RETRY: int = 30  # seconds before retrying a failed refresh
+    
+    # Data store
+    DATASTORE_BACKEND: str = "firestore"  # "firestore" or "memory" (tests/local benchmarking)
+    FIRESTORE_TIMEOUT: float = 10.0  # seconds per Firestore call
+    
+    # Message persistence (write-behind queue)
+    MESSAGE_BATCH_SIZE: int = 100  # flush once this many messages are queued
+    MESSAGE_FLUSH_INTERVAL: float = 0.5  # or after this many seconds
+    MESSAGE_QUEUE_MAX: int = 5000  # enqueue waits when the queue is full
+    
+    # Response cache (opt-in)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_AGENTS: List[str] = []  # agent IDs to cache, or ["*"] for all
+    RESPONSE_CACHE_BACKEND: str = "memory"  # "memory" (per worker) or "sqlite" (shared on host)
+    RESPONSE_CACHE_PATH: str = "/tmp/agentchat_response_cache.sqlite3"
+    RESPONSE_CACHE_TTL: int = 3600  # seconds
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000
+    RESPONSE_CACHE_SQLITE_TIMEOUT: float = 0.1  # seconds to wait for another worker's write lock
+    RESPONSE_CACHE_TOUCH_INTERVAL: int = 60  # seconds between access-time updates of an entry (sqlite)
+    
+    # Request coalescing (identical in-flight first messages share one upstream call)
+    COALESCE_ENABLED: bool = True
+    COALESCE_MAX_WAITERS: int = 100  # consumers per shared call
+    
+    # Upstream admission control (per worker)
+    LLM_MAX_CONCURRENCY: int = 32  # concurrent Gemini calls
+    LLM_MAX_QUEUE: int = 256  # calls waiting for a slot before new ones are rejected
+    LLM_QUEUE_TIMEOUT: float = 30.0  # seconds a call may wait for a slot
+    
+    # Upstream retries and circuit breaker
+    LLM_RETRY_MAX_ATTEMPTS: int = 2  # retries after the first attempt
+    LLM_RETRY_BUDGET: float = 20.0  # seconds; no retry is started past this
+    LLM_RETRY_BASE_DELAY: float = 0.5  # backoff base when upstream gives no delay
+    LLM_RETRY_JITTER: float = 0.2  # up to +20% on top of an upstream retry delay
+    LLM_BREAKER_FAILURE_RATE: float = 0.5
+    LLM_BREAKER_MIN_CALLS: int = 10  # calls in the window before the breaker can open
+    LLM_BREAKER_WINDOW: float = 30.0  # seconds
+    LLM_BREAKER_COOLDOWN: float = 15.0  # seconds open before a trial call
+    
+    # Hedged requests (second request when the first chunk is slow)
+    LLM_HEDGE_ENABLED: bool = False
+    LLM_HEDGE_PERCENTILE: float = 95.0  # hedge after this percentile of time-to-first-chunk
+    LLM_HEDGE_MIN_DELAY: float = 0.5  # seconds
+    LLM_HEDGE_DEFAULT_DELAY: float = 2.0  # seconds, until enough latency samples
+    LLM_HEDGE_SAMPLES: int = 500  # recent latency samples kept
+    LLM_HEDGE_BUDGET: float = 0.05  # max extra calls as a fraction of primary calls
+    LLM_HEDGE_FALLBACK_AGENT: str = ""  # provider agent ID (e.g. "gemini-flash"); "" = same model
+    
+    # Conversation history (server-side)
+    CONVERSATION_MAX_TURNS: int = 50  # turns kept per conversation
+    CONVERSATION_CACHE_SIZE: int = 10000  # conversations cached per worker (LRU)
+    CONVERSATION_CACHE_TTL: int = 300  # seconds before re-reading from Firestore
+    CONVERSATION_SUMMARY_ENABLED: bool = True  # fold old turns into a running summary
+    CONVERSATION_WINDOW_TURNS: int = 10  # recent turns kept verbatim
+    CONVERSATION_SUMMARY_BATCH: int = 4  # summarize once this many turns fall out of the window
+    CONVERSATION_SUMMARY_MAX_WORDS: int = 200
+    
+    # Startup: load SDKs and build clients in the background after the port is
+    # bound (/health/ready answers 503 until done); False warms up before serving
+    LAZY_STARTUP: bool = True
+    
+    # Readiness (/health/ready): dependency checks run in the background and are
+    # cached; probes also fail while the worker is saturated so traffic sheds
+    READINESS_CHECK_INTERVAL: float = 10.0  # seconds between dependency checks
+    READINESS_CHECK_TIMEOUT: float = 2.0  # seconds before a check counts as failed
+    READINESS_SATURATION_RATIO: float = 0.9  # share of a queue / connection limit that counts as saturated
+    
     # Google Gemini API
     GEMINI_API_KEY: str = ""
     GEMINI_MODEL: str = "gemini-2.0-flash-exp"
     
+    # Agent / provider agent catalog ("builtin" = the lists in services/catalog.py)
+    CATALOG_SOURCE: str = "builtin"  # "builtin", "file" or "firestore"
+    CATALOG_PATH: str = ""  # JSON {"agents": [...], "provider_agents": [...]} for "file"
+    CATALOG_FIRESTORE_DOCUMENT: str = "config/catalog"  # same fields (plus optional "version")
+    CATALOG_POLL_INTERVAL: float = 30.0  # seconds between change checks
+    
+    # Other providers (see the provider agents in services/catalog.py)
+    OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"
+    ANTHROPIC_API_KEY: str = ""
+    ANTHROPIC_BASE_URL: str = "https://api.anthropic.com"
+    LLM_MAX_OUTPUT_TOKENS: int = 1024
+    LLM_HTTP_TIMEOUT: float = 60.0  # seconds
+    LLM_HTTP_MAX_CONNECTIONS: int = 100  # pooled connections per provider
+    LLM_PROVIDER_OVERRIDES: Dict[str, str] = {}  # provider -> backend, e.g. {"*": "fake"} for local testing
+    FAKE_PROVIDER_LATENCY: float = 0.05  # seconds per chunk from the fake backend
+    
+    # "auto" provider agent: pick a model from live latency / error statistics
+    AUTO_ROUTING_ENABLED: bool = False  # off: "auto" uses GEMINI_MODEL
+    AUTO_ROUTING_CANDIDATES: List[str] = []  # provider agent IDs to choose from; empty = all configured
+    AUTO_ROUTING_PREMIUM_AGENTS: List[str] = ["openai-gpt-4", "claude-opus", "gemini-ultra"]  # premium users only
+    AUTO_ROUTING_EWMA_ALPHA: float = 0.2
+    AUTO_ROUTING_SAMPLES: int = 200  # latency samples per model for the p95
+    AUTO_ROUTING_TAIL_WEIGHT: float = 0.25  # how far the latency estimate leans from EWMA towards p95
+    AUTO_ROUTING_ERROR_PENALTY: float = 4.0  # score multiplier per unit of error rate
+    AUTO_ROUTING_LOAD_SCALE: float = 50.0  # in-flight calls that double a model's score
+    AUTO_ROUTING_PRIOR_LATENCY: float = 1.0  # seconds assumed for models without samples
+    AUTO_ROUTING_EXPLORE: float = 0.05  # share of requests sent to a random candidate
+    AUTO_ROUTING_LONG_PROMPT_CHARS: int = 4000  # prompts this long are scored separately
+    AUTO_ROUTING_WINDOW: float = 60.0  # seconds, for throughput
+    
+    # Prompt assembly
+    PROMPT_TOKEN_BUDGET: int = 4000  # default prompt budget (approximate tokens)
+    PROMPT_TOKEN_BUDGETS: Dict[str, int] = {}  # per-model overrides, e.g. {"gemini-pro": 8000}
+    PROMPT_TOKEN_CACHE_SIZE: int = 4096  # cached per-message token counts
+    
     # Rate Limiting
     MESSAGE_RATE_LIMIT: int = 500  # messages per week for base tier
     RATE_LIMIT_WINDOW: int = 604800  # 7 days in seconds
+    TIER_CACHE_TTL: int = 300  # seconds a cached subscription tier is trusted for lane priority
+    
+    # Token usage cache (per worker)
+    TOKEN_STATUS_CACHE_TTL: int = 30  # seconds a cached token status stays fresh
+    TOKEN_CACHE_MAX_USERS: int = 10000  # LRU bound on cached statuses
+    TOKEN_LEASE_SIZE: int = 2  # tokens reserved from Firestore per transaction
+    TOKEN_LEASE_TTL: int = 60  # seconds before unspent leased tokens are returned
     
     # WebSocket
-    WEBSOCKET_TIMEOUT: int = 300  # 5 minutes
+    WEBSOCKET_TIMEOUT: int = 300  # 5 minutes without chat frames closes an idle socket
+    WEBSOCKET_MAX_IN_FLIGHT: int = 4  # concurrent messages per connection
+    WEBSOCKET_PING_INTERVAL: int = 25  # seconds of client silence before a ping
+    WEBSOCKET_PONG_TIMEOUT: int = 20  # seconds to answer a ping before the socket is dropped
+    WEBSOCKET_MAX_CONNECTIONS: int = 1000  # open sockets per worker
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,227 @@
+"""Async data-access layer shared by all services"""
+import copy
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.config import settings
+from core.firebase import get_async_firestore_client
+
+
+# Write sentinels understood by every DataStore implementation. They are our
+# own types so that importing this module doesn't load google.cloud.firestore;
+# FirestoreDataStore converts them to Firestore's on write.
+class _ServerTimestamp:
+    """Set the field to the time the write is committed"""
+    
+    def __repr__(self) -> str:
+        return "SERVER_TIMESTAMP"
+
+
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+
+class Increment:
+    """Add `value` to the field's current value (missing counts as 0)"""
+    
+    def __init__(self, value):
+        self.value = value
+
+
+# (collection, document id)
+DocKey = Tuple[str, str]
+
+# Transaction callback: receives the current document (or None) and returns
+# (fields to merge into the document or None, value to return to the caller)
+TransactionFn = Callable[[Optional[dict]], Tuple[Optional[dict], Any]]
+
+
+class DataStore:
+    """Interface for async document storage"""
+    
+    @property
+    def available(self) -> bool:
+        """Whether the backing store can be reached"""
+        raise NotImplementedError
+    
+    async def get(self, collection: str, doc_id: str) -> Optional[dict]:
+        """Get a document, or None if it doesn't exist"""
+        raise NotImplementedError
+    
+    async def get_many(self, keys: List[DocKey]) -> List[Optional[dict]]:
+        """Get several documents in one round-trip, in the order requested"""
+        raise NotImplementedError
+    
+    async def set(self, collection: str, doc_id: str, data: dict, merge: bool = False):
+        """Create or overwrite a document (or merge fields into it)"""
+        raise NotImplementedError
+    
+    async def add(self, collection: str, data: dict) -> str:
+        """Add a document with a generated ID and return the ID"""
+        raise NotImplementedError
+    
+    async def add_many(self, collection: str, docs: List[dict]):
+        """Add several documents with generated IDs in one batched write"""
+        raise NotImplementedError
+    
+    async def transact(self, collection: str, doc_id: str, fn: TransactionFn) -> Any:
+        """Atomically read a document, apply `fn` and merge its update"""
+        raise NotImplementedError
+
+
+class FirestoreDataStore(DataStore):
+    """DataStore backed by Firestore's AsyncClient (one shared client per process)"""
+    
+    def __init__(self, timeout: float = None):
+        self._client = None
+        self.timeout = timeout if timeout is not None else settings.FIRESTORE_TIMEOUT
+    
+    @property
+    def client(self):
+        """Lazy initialization of the shared async Firestore client"""
+        if self._client is None:
+            self._client = get_async_firestore_client()
+        return self._client
+    
+    @property
+    def available(self) -> bool:
+        try:
+            return self.client is not None
+        except Exception:
+            return False
+    
+    def _ref(self, collection: str, doc_id: str):
+        return self.client.collection(collection).document(doc_id)
+    
+    def _encode(self, data: dict) -> dict:
+        """Replace our write sentinels with Firestore's"""
+        from google.cloud import firestore
+        
+        encoded = {}
+        for key, value in data.items():
+            if value is SERVER_TIMESTAMP:
+                value = firestore.SERVER_TIMESTAMP
+            elif isinstance(value, Increment):
+                value = firestore.Increment(value.value)
+            elif isinstance(value, dict):
+                value = self._encode(value)
+            encoded[key] = value
+        return encoded
+    
+    async def get(self, collection: str, doc_id: str) -> Optional[dict]:
+        snapshot = await self._ref(collection, doc_id).get(timeout=self.timeout)
+        return snapshot.to_dict() if snapshot.exists else None
+    
+    async def get_many(self, keys: List[DocKey]) -> List[Optional[dict]]:
+        refs = [self._ref(collection, doc_id) for collection, doc_id in keys]
+        found = {}
+        async for snapshot in self.client.get_all(refs, timeout=self.timeout):
+            if snapshot.exists:
+                found[snapshot.reference.path] = snapshot.to_dict()
+        return [found.get(ref.path) for ref in refs]
+    
+    async def set(self, collection: str, doc_id: str, data: dict, merge: bool = False):
+        await self._ref(collection, doc_id).set(self._encode(data), merge=merge, timeout=self.timeout)
+    
+    async def add(self, collection: str, data: dict) -> str:
+        _, ref = await self.client.collection(collection).add(self._encode(data), timeout=self.timeout)
+        return ref.id
+    
+    async def add_many(self, collection: str, docs: List[dict]):
+        collection_ref = self.client.collection(collection)
+        # Firestore allows at most 500 writes per batch
+        for start in range(0, len(docs), 500):
+            batch = self.client.batch()
+            for data in docs[start:start + 500]:
+                batch.set(collection_ref.document(), self._encode(data))
+            await batch.commit(timeout=self.timeout)
+    
+    async def transact(self, collection: str, doc_id: str, fn: TransactionFn) -> Any:
+        from google.cloud import firestore
+        
+        ref = self._ref(collection, doc_id)
+        
+        @firestore.async_transactional
+        async def run(transaction):
+            snapshot = await ref.get(transaction=transaction, timeout=self.timeout)
+            update, result = fn(snapshot.to_dict() if snapshot.exists else None)
+            if update:
+                transaction.set(ref, self._encode(update), merge=True)
+            return result
+        
+        return await run(self.client.transaction())
+
+
+class MemoryDataStore(DataStore):
+    """
+    In-process DataStore for tests and local benchmarking
+    
+    Operations never await, so each one is atomic with respect to the event
+    loop. Write sentinels are resolved the way Firestore would resolve them.
+    """
+    
+    def __init__(self):
+        self.collections: Dict[str, Dict[str, dict]] = {}
+    
+    @property
+    def available(self) -> bool:
+        return True
+    
+    async def get(self, collection: str, doc_id: str) -> Optional[dict]:
+        doc = self.collections.get(collection, {}).get(doc_id)
+        return copy.deepcopy(doc) if doc is not None else None
+    
+    async def get_many(self, keys: List[DocKey]) -> List[Optional[dict]]:
+        return [await self.get(collection, doc_id) for collection, doc_id in keys]
+    
+    async def set(self, collection: str, doc_id: str, data: dict, merge: bool = False):
+        self._write(collection, doc_id, data, merge)
+    
+    async def add(self, collection: str, data: dict) -> str:
+        doc_id = uuid.uuid4().hex
+        self._write(collection, doc_id, data, merge=False)
+        return doc_id
+    
+    async def add_many(self, collection: str, docs: List[dict]):
+        for data in docs:
+            self._write(collection, uuid.uuid4().hex, data, merge=False)
+    
+    async def transact(self, collection: str, doc_id: str, fn: TransactionFn) -> Any:
+        update, result = fn(await self.get(collection, doc_id))
+        if update:
+            self._write(collection, doc_id, update, merge=True)
+        return result
+    
+    def _write(self, collection: str, doc_id: str, data: dict, merge: bool):
+        docs = self.collections.setdefault(collection, {})
+        existing = docs.get(doc_id) if merge else None
+        docs[doc_id] = self._resolve(data, existing or {})
+    
+    def _resolve(self, data: dict, existing: dict) -> dict:
+        """Merge `data` into `existing`, resolving sentinels"""
+        result = dict(existing)
+        for key, value in data.items():
+            if value is SERVER_TIMESTAMP:
+                result[key] = datetime.now(timezone.utc)
+            elif isinstance(value, Increment):
+                result[key] = result.get(key, 0) + value.value
+            elif isinstance(value, dict):
+                nested = result.get(key)
+                result[key] = self._resolve(value, nested if isinstance(nested, dict) else {})
+            else:
+                result[key] = copy.deepcopy(value)
+        return result
+
+
+_datastore = None
+
+
+def get_datastore() -> DataStore:
+    """Get the process-wide data store (singleton)"""
+    global _datastore
+    if _datastore is None:
+        if settings.DATASTORE_BACKEND == "memory":
+            _datastore = MemoryDataStore()
+        else:
+            _datastore = FirestoreDataStore()
+    return _datastore
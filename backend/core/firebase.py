@@ -1,14 +1,20 @@
 """Firebase initialization and utilities"""
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
-import os
+import threading
 from pathlib import Path
 
 from core.config import settings
 
+# firebase_admin is imported on first use, keeping it out of process startup
+
+_init_lock = threading.Lock()
+_initialized = None  # result of the first initialize_firebase() via ensure_firebase()
+
 
 def initialize_firebase():
     """Initialize Firebase Admin SDK"""
+    import firebase_admin
+    from firebase_admin import credentials
+    
     if not firebase_admin._apps:
         if settings.FIREBASE_CREDENTIALS_PATH:
             cred_path = Path(settings.FIREBASE_CREDENTIALS_PATH)
@@ -30,9 +36,27 @@ def initialize_firebase():
     return True
 
 
+def ensure_firebase() -> bool:
+    """Initialize Firebase once per process (thread-safe); returns whether it is available"""
+    global _initialized
+    if _initialized is None:
+        with _init_lock:
+            if _initialized is None:
+                try:
+                    _initialized = initialize_firebase()
+                except Exception as e:
+                    print(f"Firebase initialization failed: {e}")
+                    _initialized = False
+                if not _initialized:
+                    print("Running without Firebase - some features will be disabled")
+    return _initialized
+
+
 def get_firestore_client():
     """Get Firestore client"""
+    ensure_firebase()
     try:
+        from firebase_admin import firestore
         return firestore.client()
     except Exception as e:
         raise ValueError(
@@ -41,11 +65,25 @@ def get_firestore_client():
         )
 
 
+def get_async_firestore_client():
+    """Get async Firestore client (shared per process)"""
+    ensure_firebase()
+    try:
+        from firebase_admin import firestore_async
+        return firestore_async.client()
+    except Exception as e:
+        raise ValueError(
+            f"Firestore not available: {str(e)}. "
+            "Make sure Firebase is properly initialized with a project ID."
+        )
+
+
 def verify_firebase_token(token: str):
     """Verify Firebase ID token"""
+    ensure_firebase()
     try:
+        from firebase_admin import auth
         decoded_token = auth.verify_id_token(token)
         return decoded_token
     except Exception as e:
         raise ValueError(f"Invalid token: {str(e)}")
-
@@ -6,30 +6,76 @@ FastAPI application for handling chat requests and agent interactions
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 
 from routers import chat, agents, subscription, health, provider_agents, usage
+from core.auth import get_token_verifier
 from core.config import settings
-from core.firebase import initialize_firebase
+from services.catalog import get_catalog_reloader
+from services.conversation_store import get_conversation_store
+from services.llm_providers import get_provider_registry
+from services.message_writer import get_message_writer
+from services.readiness import get_readiness_checker
+from services.token_service import get_token_service
+from services.warmup import get_warmup
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Firebase (optional - app will work without it for development)
-try:
-    firebase_initialized = initialize_firebase()
-    if not firebase_initialized:
-        print("Running without Firebase - some features will be disabled")
-except Exception as e:
-    print(f"Firebase initialization failed: {e}")
-    print("Running without Firebase - some features will be disabled")
+# Firebase and the LLM SDKs are initialized on first use or by warmup
+# (optional - app will work without Firebase for development)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers on startup and drain them on shutdown"""
+    warmup = get_warmup()
+    warmup_task = None
+    if settings.LAZY_STARTUP:
+        # Serve (health checks, at least) while SDKs load
+        warmup_task = asyncio.create_task(warmup.run())
+    else:
+        await warmup.run()
+    token_service = get_token_service()
+    lease_reconciler = asyncio.create_task(token_service.run_lease_reconciler())
+    message_writer = get_message_writer()
+    message_writer.start()
+    key_refresher = None
+    if settings.AUTH_ENABLED:
+        key_refresher = asyncio.create_task(get_token_verifier().run_key_refresher())
+    readiness_checker = asyncio.create_task(get_readiness_checker().run())
+    catalog_reloader = None
+    if settings.CATALOG_SOURCE != "builtin":
+        await get_catalog_reloader().check()
+        catalog_reloader = asyncio.create_task(get_catalog_reloader().run())
+    
+    yield
+    
+    if warmup_task is not None:
+        warmup_task.cancel()
+    lease_reconciler.cancel()
+    readiness_checker.cancel()
+    if key_refresher is not None:
+        key_refresher.cancel()
+    if catalog_reloader is not None:
+        catalog_reloader.cancel()
+    # Return unspent leased tokens so other workers can grant them
+    await token_service.release_all_leases()
+    # Flush queued chat messages and conversation turns before exiting
+    await message_writer.stop()
+    await get_conversation_store().flush()
+    await get_provider_registry().close()
+
 
 # Create FastAPI app
 app = FastAPI(
     title="AI Agent Chat API",
     description="Backend API for AI Agent Chat Application",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS middleware
@@ -1,40 +1,61 @@
 """Chat endpoints"""
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Dict, Optional, Set, Tuple
+from datetime import datetime, timezone
+import asyncio
 import json
-from google.cloud import firestore
+import math
+import time
 
-from core.firebase import verify_firebase_token, get_firestore_client
-from services.gemini_service import GeminiService
-from services.rate_limiter import RateLimiter
+from core.auth import authenticate_websocket, ensure_user, get_auth_claims
+from core.config import settings
+from core.firebase import verify_firebase_token
+from services.catalog import Catalog, get_catalog
+from services.conversation_store import get_conversation_store
+from services.gemini_service import get_gemini_service
+from services.llm_providers import get_provider_registry
+from services.llm_scheduler import PRIORITY_LANE, STANDARD_LANE
+from services.message_writer import get_message_writer
+from services.resilience import UpstreamError
+from services.rate_limiter import get_rate_limiter
+from services.readiness import get_readiness_checker
 from services.token_service import get_token_service
 
 router = APIRouter()
-gemini_service = GeminiService()
 
-# Lazy initialization - will be created on first use
-_rate_limiter = None
 
-def get_rate_limiter():
-    """Get rate limiter instance (lazy initialization)"""
-    global _rate_limiter
-    if _rate_limiter is None:
-        _rate_limiter = RateLimiter()
-    return _rate_limiter
+async def _summarize_turns(previous_summary: str, turns: list) -> str:
+    return await get_gemini_service().summarize_turns(previous_summary, turns)
+
+
+if settings.CONVERSATION_SUMMARY_ENABLED:
+    get_conversation_store().set_summarizer(_summarize_turns)
 
 
 class ConnectionManager:
     """Manages WebSocket connections"""
     
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
     
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket) -> bool:
+        """
+        Accept a connection
+        
+        Returns:
+            False if this worker already holds WEBSOCKET_MAX_CONNECTIONS
+            sockets (the connection is closed with 1013 "try again later")
+        """
         await websocket.accept()
-        self.active_connections.append(websocket)
+        if len(self.active_connections) >= settings.WEBSOCKET_MAX_CONNECTIONS:
+            await websocket.close(code=1013, reason="Server busy, try again later")
+            return False
+        self.active_connections.add(websocket)
+        return True
     
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
     
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
@@ -45,76 +66,576 @@ class ConnectionManager:
 
 
 manager = ConnectionManager()
+get_readiness_checker().add_gauge(
+    "websocket_connections", lambda: (len(manager.active_connections), settings.WEBSOCKET_MAX_CONNECTIONS)
+)
+
+
+class WebSocketSession:
+    """
+    Concurrent generations on one WebSocket
+    
+    Every chat frame runs as its own task, so a second message (or a message
+    to another agent) doesn't wait for the first reply. Frames may carry a
+    client `request_id`; all frames sent back for that message carry it too,
+    and {"type": "cancel", "request_id": ...} stops that generation, freeing
+    its upstream slot. Frames without a request_id are answered one at a
+    time, in order. At most WEBSOCKET_MAX_IN_FLIGHT messages run (or wait)
+    per connection. A frame that isn't a JSON object gets an "invalid_frame"
+    error and is otherwise ignored.
+    
+    A socket that sends nothing for WEBSOCKET_PING_INTERVAL seconds gets a
+    {"type": "ping"}; if nothing comes back within WEBSOCKET_PONG_TIMEOUT the
+    client is gone and the socket is closed. Sockets with no messages in
+    progress and no chat frames for WEBSOCKET_TIMEOUT seconds are closed as
+    idle. Closing cancels all in-progress generations.
+    
+    The user's scheduler lane is resolved once, when the socket connects.
+    """
+    
+    def __init__(self, websocket: WebSocket, user_id: str, lane: str = STANDARD_LANE):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.lane = lane
+        # request_id (or an internal key for untagged frames) -> generation task
+        self.tasks: Dict[object, asyncio.Task] = {}
+        self._send_lock = asyncio.Lock()
+        self._untagged_lock = asyncio.Lock()
+        now = time.monotonic()
+        self.last_received = now  # any frame, including pongs
+        self.last_activity = now  # chat frames and finished replies
+        self._ping_sent: Optional[float] = None
+    
+    def received(self, chat: bool):
+        """Note a frame from the client (chat frames also reset the idle timer)"""
+        self.last_received = time.monotonic()
+        self._ping_sent = None
+        if chat:
+            self.last_activity = self.last_received
+    
+    def receive_timeout(self) -> float:
+        """Seconds to wait for the next frame before checking on the client"""
+        now = time.monotonic()
+        if self._ping_sent is not None:
+            timeout = self._ping_sent + settings.WEBSOCKET_PONG_TIMEOUT - now
+        else:
+            timeout = self.last_received + settings.WEBSOCKET_PING_INTERVAL - now
+        if not self.tasks:
+            timeout = min(timeout, self.last_activity + settings.WEBSOCKET_TIMEOUT - now)
+        return max(timeout, 0.0)
+    
+    def close_reason(self) -> Optional[Tuple[int, str]]:
+        """(close code, reason) if the socket should be closed, else None"""
+        now = time.monotonic()
+        if self._ping_sent is not None and now - self._ping_sent >= settings.WEBSOCKET_PONG_TIMEOUT:
+            return 1001, "No response to ping"
+        if not self.tasks and now - self.last_activity >= settings.WEBSOCKET_TIMEOUT:
+            return 1000, "Idle timeout"
+        return None
+    
+    async def ping(self):
+        """Ping a quiet client (once per WEBSOCKET_PING_INTERVAL of silence)"""
+        if self._ping_sent is None and time.monotonic() - self.last_received >= settings.WEBSOCKET_PING_INTERVAL:
+            self._ping_sent = time.monotonic()
+            await self.send({"type": "ping"})
+    
+    async def send(self, frame: dict, request_id=None):
+        """Send a frame, tagged with the request it answers"""
+        if request_id is not None:
+            frame = {"request_id": request_id, **frame}
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(frame))
+    
+    async def submit(self, message_data: dict):
+        """Start answering a chat frame in the background"""
+        request_id = message_data.get("request_id")
+        if request_id is not None and (not isinstance(request_id, (str, int)) or request_id in self.tasks):
+            await self.send({
+                "type": "error",
+                "code": "invalid_request_id",
+                "error": "request_id must be a string or number not used by another message in flight",
+            }, request_id if isinstance(request_id, (str, int)) else None)
+            return
+        if len(self.tasks) >= settings.WEBSOCKET_MAX_IN_FLIGHT:
+            await self.send({
+                "type": "error",
+                "code": "too_many_requests",
+                "error": "Too many messages in progress. Wait for a reply or cancel one.",
+            }, request_id)
+            return
+        
+        key = request_id if request_id is not None else object()
+        task = asyncio.create_task(self._run(request_id, message_data))
+        self.tasks[key] = task
+        task.add_done_callback(lambda _: self._finished(key))
+    
+    async def cancel(self, request_id):
+        """Stop an in-flight generation; nothing is saved for it"""
+        task = self.tasks.get(request_id) if isinstance(request_id, (str, int)) else None
+        if task is None:
+            await self.send({
+                "type": "error",
+                "code": "unknown_request",
+                "error": "No message in progress with this request_id",
+            }, request_id if isinstance(request_id, (str, int)) else None)
+            return
+        task.cancel()
+        await self.send({"type": "cancelled"}, request_id)
+    
+    def close(self):
+        """Cancel everything still running for this connection"""
+        for task in list(self.tasks.values()):
+            task.cancel()
+    
+    def _finished(self, key):
+        self.tasks.pop(key, None)
+        self.last_activity = time.monotonic()
+    
+    async def _run(self, request_id, message_data: dict):
+        try:
+            if request_id is None:
+                async with self._untagged_lock:
+                    await _answer_websocket_message(self, request_id, message_data, self.lane)
+            else:
+                await _answer_websocket_message(self, request_id, message_data, self.lane)
+        except asyncio.CancelledError:
+            raise
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            print(f"Error answering WebSocket message for {self.user_id}: {e}")
+            try:
+                await self.send({"type": "error", "code": "error", "error": "Internal server error"}, request_id)
+            except Exception:
+                pass
+
+
+async def _stream_to_websocket(
+    session: WebSocketSession,
+    request_id,
+    agent_id: str,
+    user_message: str,
+    conversation_history: list,
+    conversation_summary: str,
+    lane: str,
+    provider_agent_id: Optional[str],
+    catalog: Catalog
+) -> Tuple[str, int]:
+    """
+    Forward a streamed agent response to the client as incremental frames
+    
+    Sends a "start" frame followed by one "delta" frame per chunk. The caller
+    sends the closing "done" frame once the message has been persisted.
+    
+    Returns:
+        Tuple of (assembled response text, number of chunks sent)
+    """
+    await session.send({
+        "type": "start",
+        "agent_id": agent_id,
+    }, request_id)
+    
+    chunks = []
+    async for chunk in get_gemini_service().stream_agent_response(
+        agent_id=agent_id,
+        user_message=user_message,
+        user_id=session.user_id,
+        conversation_history=conversation_history,
+        conversation_summary=conversation_summary,
+        lane=lane,
+        provider_agent_id=provider_agent_id,
+        catalog=catalog
+    ):
+        chunks.append(chunk)
+        await session.send({
+            "type": "delta",
+            "agent_id": agent_id,
+            "delta": chunk,
+        }, request_id)
+    
+    return "".join(chunks), len(chunks)
+
+
+async def _answer_websocket_message(session: WebSocketSession, request_id, message_data: dict, lane: str):
+    """Validate a chat frame, generate the reply and send it back"""
+    user_id = session.user_id
+    
+    # Verify user has access (check subscription, rate limits, etc.)
+    # For now, simplified version
+    
+    # Get agent response from Gemini
+    agent_id = message_data.get("agent_id")
+    user_message = message_data.get("message")
+    
+    if not agent_id or not user_message:
+        await session.send({
+            "error": "Missing agent_id or message"
+        }, request_id)
+        return
+    
+    # One catalog snapshot for the whole message, even if it is reloaded meanwhile
+    catalog = get_catalog()
+    try:
+        provider_agent_id = _requested_provider_agent(message_data, catalog)
+    except ValueError as e:
+        await session.send({
+            "error": str(e)
+        }, request_id)
+        return
+    
+    # Check rate limits
+    if not await get_rate_limiter().check_limit(user_id):
+        await session.send({
+            "error": "Rate limit exceeded. Please upgrade your plan."
+        }, request_id)
+        return
+    
+    conversation_history, conversation_summary = await _get_history(user_id, agent_id, message_data)
+    if lane == STANDARD_LANE:
+        # Picks up an upgrade seen since the socket connected
+        lane = _get_lane(user_id)
+    
+    try:
+        # Streaming mode: forward chunks as start / delta / done frames
+        if message_data.get("stream"):
+            response, chunk_count = await _stream_to_websocket(
+                session, request_id, agent_id, user_message,
+                conversation_history, conversation_summary, lane, provider_agent_id, catalog
+            )
+        else:
+            # Get agent response
+            response = await get_gemini_service().get_agent_response(
+                agent_id=agent_id,
+                user_message=user_message,
+                user_id=user_id,
+                conversation_history=conversation_history,
+                conversation_summary=conversation_summary,
+                lane=lane,
+                provider_agent_id=provider_agent_id,
+                catalog=catalog
+            )
+    except UpstreamError as e:
+        # Nothing is saved for a failed reply
+        await session.send({
+            "type": "error",
+            "agent_id": agent_id,
+            **e.to_dict(),
+        }, request_id)
+        return
+    
+    # Save to Firestore (only the assembled message). The reply is complete,
+    # so a cancel arriving now must not leave it half-recorded.
+    await asyncio.shield(_persist_reply(
+        user_id, agent_id, user_message, response, provider_agent_id,
+        client_history=bool(message_data.get("conversation_history")),
+    ))
+    
+    # Send response
+    if message_data.get("stream"):
+        await session.send({
+            "type": "done",
+            "agent_id": agent_id,
+            "response": response,
+            "usage": {
+                "chunks": chunk_count,
+                "response_chars": len(response),
+            },
+        }, request_id)
+    else:
+        await session.send({
+            "agent_id": agent_id,
+            "response": response,
+        }, request_id)
 
 
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    """WebSocket endpoint for real-time chat"""
-    await manager.connect(websocket)
+    """WebSocket endpoint for real-time chat (see WebSocketSession)"""
+    # The token is checked once per connection, not per frame
+    if not await authenticate_websocket(websocket, user_id):
+        return
+    if not await manager.connect(websocket):
+        return
+    session = WebSocketSession(websocket, user_id, await _resolve_lane(user_id))
     
     try:
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
-            
-            # Verify user has access (check subscription, rate limits, etc.)
-            # For now, simplified version
-            
-            # Get agent response from Gemini
-            agent_id = message_data.get("agent_id")
-            user_message = message_data.get("message")
+            close_reason = session.close_reason()
+            if close_reason:
+                await websocket.close(*close_reason)
+                break
             
-            if not agent_id or not user_message:
-                await websocket.send_text(json.dumps({
-                    "error": "Missing agent_id or message"
-                }))
+            try:
+                data = await asyncio.wait_for(websocket.receive_text(), session.receive_timeout())
+            except asyncio.TimeoutError:
+                await session.ping()
                 continue
-            
-            # Check rate limits
-            if not await get_rate_limiter().check_limit(user_id):
-                await websocket.send_text(json.dumps({
-                    "error": "Rate limit exceeded. Please upgrade your plan."
-                }))
+            try:
+                message_data = json.loads(data)
+            except ValueError:
+                message_data = None
+            if not isinstance(message_data, dict):
+                # One bad frame mustn't end the other messages on this socket
+                session.received(chat=False)
+                await session.send({
+                    "type": "error",
+                    "code": "invalid_frame",
+                    "error": "Frames must be JSON objects",
+                })
                 continue
+            frame_type = message_data.get("type")
+            session.received(chat=frame_type not in ("ping", "pong"))
             
-            # Get agent response
-            response = await gemini_service.get_agent_response(
-                agent_id=agent_id,
-                user_message=user_message,
-                user_id=user_id
-            )
-            
-            # Save to Firestore
-            db = get_firestore_client()
-            db.collection("messages").add({
-                "user_id": user_id,
-                "agent_id": agent_id,
-                "message": user_message,
-                "response": response,
-                "timestamp": firestore.SERVER_TIMESTAMP,
-            })
-            
-            # Update rate limiter
-            await get_rate_limiter().increment_usage(user_id)
-            
-            # Send response
-            await websocket.send_text(json.dumps({
-                "agent_id": agent_id,
-                "response": response,
-            }))
+            if frame_type == "pong":
+                continue
+            if frame_type == "ping":
+                await session.send({"type": "pong"})
+            elif frame_type == "cancel":
+                await session.cancel(message_data.get("request_id"))
+            else:
+                await session.submit(message_data)
             
     except WebSocketDisconnect:
+        pass
+    finally:
+        # The client is gone: stop generating replies nobody will read
+        session.close()
         manager.disconnect(websocket)
 
 
+async def _consume_message_token(user_id: str):
+    """
+    Check and use a token for a message (each message = 1 token)
+    
+    The check, weekly reset and increment happen in one atomic operation.
+    
+    Returns:
+        Token status after the token was used
+    
+    Raises:
+        HTTPException: 429 if the user has no tokens left
+    """
+    token_service = get_token_service()
+    token_used, token_status = await token_service.consume_token(user_id)
+    
+    if not token_used:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Free tokens exhausted. You've used {token_status['tokens_used']}/{token_status['tokens_limit']} tokens. Upgrade to Premium for unlimited messages."
+        )
+    
+    return token_status
+
+
+def _requested_provider_agent(message_data: dict, catalog: Catalog) -> Optional[str]:
+    """
+    Provider agent (model) requested for a message, if any
+    
+    Clients name it with `provider_agent_id`, or (like the mobile app's
+    model picker) with `provider` and / or `model_id`, which are matched
+    against the catalog.
+    
+    Checked before a token is used, so a request for a model this server
+    can't serve costs nothing.
+    
+    Raises:
+        ValueError: If no provider agent in the catalog matches, or its
+            provider isn't configured on this server (e.g. no API key)
+    """
+    provider_agent_id = message_data.get("provider_agent_id")
+    provider = message_data.get("provider")
+    model_id = message_data.get("model_id")
+    if not provider_agent_id and (provider or model_id):
+        agent = catalog.find_provider_agent(provider, model_id)
+        if agent is None:
+            raise ValueError(f"Unknown model: {provider or '*'}/{model_id or '*'}")
+        provider_agent_id = agent["id"]
+    registry = get_provider_registry()
+    if not registry.is_known(provider_agent_id, catalog):
+        raise ValueError(f"Unknown provider agent: {provider_agent_id}")
+    agent = catalog.get_provider_agent(provider_agent_id) if provider_agent_id else None
+    if agent is not None and not registry.is_configured(agent["provider"]):
+        raise ValueError(f"Model not available on this server: {agent['provider']}/{agent['model_id']}")
+    return provider_agent_id
+
+
+def _get_provider_agent_id(message_data: dict, catalog: Catalog) -> Optional[str]:
+    """
+    Provider agent requested for an HTTP message, if any
+    
+    Raises:
+        HTTPException: 400 if it isn't in the provider agents catalog
+    """
+    try:
+        return _requested_provider_agent(message_data, catalog)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _get_lane(user_id: str, token_status: Optional[dict] = None) -> str:
+    """
+    Scheduler lane for a user's upstream calls
+    
+    Premium users and unlimited-tier subscribers go in the priority lane.
+    Uses already-known status only, so it never adds a Firestore read.
+    """
+    if token_status is not None:
+        is_premium = token_status.get("is_premium", False)
+    else:
+        is_premium = get_token_service().is_premium_cached(user_id)
+    if is_premium or get_rate_limiter().has_unlimited_tier(user_id):
+        return PRIORITY_LANE
+    return STANDARD_LANE
+
+
+async def _resolve_lane(user_id: str) -> str:
+    """
+    Scheduler lane for a user, reading their token status and tier if needed
+    
+    For WebSocket connections, whose messages don't use a token (HTTP
+    messages pick their lane in _charge_message).
+    """
+    token_status, _ = await asyncio.gather(
+        get_token_service().get_token_status(user_id),
+        get_rate_limiter().load_tier(user_id),
+    )
+    return _get_lane(user_id, token_status)
+
+
+async def _charge_message(user_id: str) -> Tuple[dict, str]:
+    """
+    Use a token for an HTTP message and pick the lane for its upstream call
+    
+    The subscription tier is loaded alongside the token, so unlimited-tier
+    subscribers get the priority lane on HTTP messages too.
+    
+    Returns:
+        Tuple of (token status, for _refund_message_token, scheduler lane)
+    
+    Raises:
+        HTTPException: 429 if the user has no tokens left
+    """
+    token_status, _ = await asyncio.gather(
+        _consume_message_token(user_id),
+        get_rate_limiter().load_tier(user_id),
+    )
+    return token_status, _get_lane(user_id, token_status)
+
+
+async def _refund_message_token(user_id: str, token_status: dict):
+    """Give the token back when the upstream failed and nothing was saved"""
+    await asyncio.shield(get_token_service().refund_token(user_id, token_status))
+
+
+async def _get_history(user_id: str, agent_id: str, message_data: dict) -> Tuple[list, str]:
+    """
+    Get conversation context for a message
+    
+    Uses `conversation_history` from the request if a client still sends it,
+    otherwise the server-side conversation store.
+    
+    Returns:
+        Tuple of (recent turns, running summary of older turns)
+    """
+    conversation_history = message_data.get("conversation_history")
+    if conversation_history:
+        return conversation_history, ""
+    summary, turns = await get_conversation_store().get_context(user_id, agent_id)
+    return turns, summary
+
+
+async def _save_message(
+    user_id: str,
+    agent_id: str,
+    user_message: str,
+    response: str,
+    provider_agent_id: Optional[str] = None,
+    client_history: bool = False
+):
+    """
+    Record the turn and queue the message for write-behind persistence
+    
+    With `client_history` (the request carried conversation_history), the
+    turn is still stored but not summarized: _get_history wouldn't use it.
+    """
+    await get_conversation_store().append_turn(
+        user_id, agent_id, user_message, response, summarize=not client_history
+    )
+    message = {
+        "user_id": user_id,
+        "agent_id": agent_id,
+        "message": user_message,
+        "response": response,
+        "timestamp": datetime.now(timezone.utc),
+    }
+    if provider_agent_id:
+        message["provider_agent_id"] = provider_agent_id
+    await get_message_writer().enqueue(message)
+
+
+async def _persist_reply(
+    user_id: str,
+    agent_id: str,
+    user_message: str,
+    response: str,
+    provider_agent_id: Optional[str] = None,
+    client_history: bool = False
+):
+    """
+    Save a completed reply
+    
+    Nothing here waits on the data store: the message writer persists the
+    message and counts it against the user's usage in the background.
+    """
+    await _save_message(user_id, agent_id, user_message, response, provider_agent_id, client_history)
+
+
+def _upstream_http_error(error: UpstreamError) -> HTTPException:
+    """HTTP error for a failed upstream call, with Retry-After when known"""
+    headers = None
+    if error.client_retry_after is not None:
+        headers = {"Retry-After": str(math.ceil(error.client_retry_after))}
+    return HTTPException(status_code=error.status_code, detail=error.to_dict(), headers=headers)
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _wait_for_disconnect(request: Request):
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _cancel_on_disconnect(request: Request, awaitable):
+    """
+    Await a reply, cancelling it if the HTTP client disconnects first
+    
+    Raises:
+        HTTPException: 499 if the client went away (never delivered)
+    """
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        abandoned = not task.done()
+        if abandoned:
+            task.cancel()
+    if abandoned:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return task.result()
+
+
 @router.post("/message")
-async def send_message(message_data: dict):
+async def send_message(message_data: dict, request: Request, claims: Optional[dict] = Depends(get_auth_claims)):
     """HTTP endpoint for sending messages (fallback)"""
     try:
         user_id = message_data.get("user_id")
         agent_id = message_data.get("agent_id")
         user_message = message_data.get("message")
-        conversation_history = message_data.get("conversation_history", [])
         
         if not user_id or not agent_id or not user_message:
             raise HTTPException(
@@ -122,69 +643,32 @@ async def send_message(message_data: dict):
                 detail="Missing required fields: user_id, agent_id, or message"
             )
         
-        # Check tokens (each message = 1 token)
-        token_service = get_token_service()
-        can_use_token = await token_service.can_use_token(user_id)
+        ensure_user(claims, user_id)
+        catalog = get_catalog()
+        provider_agent_id = _get_provider_agent_id(message_data, catalog)
+        token_status, lane = await _charge_message(user_id)
+        conversation_history, conversation_summary = await _get_history(user_id, agent_id, message_data)
         
-        if not can_use_token:
-            # Get token status for error message
-            token_status = await token_service.get_token_status(user_id)
-            raise HTTPException(
-                status_code=429,
-                detail=f"Free tokens exhausted. You've used {token_status['tokens_used']}/{token_status['tokens_limit']} tokens. Upgrade to Premium for unlimited messages."
-            )
-        
-        # Use a token before processing the message
-        token_used = await token_service.use_token(user_id)
-        if not token_used:
-            raise HTTPException(
-                status_code=429,
-                detail="Unable to use token. Please try again or upgrade to Premium."
-            )
-        
-        # Get agent response
-        response = await gemini_service.get_agent_response(
-            agent_id=agent_id,
-            user_message=user_message,
-            user_id=user_id,
-            conversation_history=conversation_history
-        )
-        
-        # Save to Firestore (optional - don't fail if Firestore not configured)
+        # Get agent response (abandoned if the client disconnects meanwhile)
         try:
-            db = get_firestore_client()
-            db.collection("messages").add({
-                "user_id": user_id,
-                "agent_id": agent_id,
-                "message": user_message,
-                "response": response,
-                "timestamp": firestore.SERVER_TIMESTAMP,
-            })
-        except Exception as e:
-            # Log but don't fail if Firestore isn't configured
-            error_str = str(e)
-            # Check for database existence error FIRST (most common after API is enabled)
-            if "does not exist" in error_str or ("404" in error_str and "database" in error_str.lower()):
-                # Database doesn't exist - need to create it
-                if not hasattr(send_message, '_firestore_db_warning_logged'):
-                    print("⚠️  Firestore database doesn't exist. Messages won't be persisted. Create database at: https://console.firebase.google.com/project/agentchat-f7eb8/firestore")
-                    send_message._firestore_db_warning_logged = True
-            elif "SERVICE_DISABLED" in error_str or ("firestore.googleapis.com" in error_str and "not been used" in error_str):
-                # API not enabled
-                if not hasattr(send_message, '_firestore_warning_logged'):
-                    print("⚠️  Firestore API not enabled. Messages won't be persisted. Enable at: https://console.developers.google.com/apis/api/firestore.googleapis.com/overview?project=agentchat-f7eb8")
-                    send_message._firestore_warning_logged = True
-            else:
-                # Other errors - log once
-                if not hasattr(send_message, '_firestore_other_warning_logged'):
-                    print(f"⚠️  Failed to save message to Firestore (continuing anyway): {e}")
-                    send_message._firestore_other_warning_logged = True
+            response = await _cancel_on_disconnect(request, get_gemini_service().get_agent_response(
+                agent_id=agent_id,
+                user_message=user_message,
+                user_id=user_id,
+                conversation_history=conversation_history,
+                conversation_summary=conversation_summary,
+                lane=lane,
+                provider_agent_id=provider_agent_id,
+                catalog=catalog
+            ))
+        except UpstreamError as e:
+            await _refund_message_token(user_id, token_status)
+            raise _upstream_http_error(e)
         
-        # Update rate limiter (optional)
-        try:
-            await get_rate_limiter().increment_usage(user_id)
-        except Exception as e:
-            print(f"Failed to update rate limiter (continuing anyway): {e}")
+        await _persist_reply(
+            user_id, agent_id, user_message, response, provider_agent_id,
+            client_history=bool(message_data.get("conversation_history")),
+        )
         
         return {
             "agent_id": agent_id,
@@ -196,3 +680,78 @@ async def send_message(message_data: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+
+@router.post("/message/stream")
+async def stream_message(message_data: dict, claims: Optional[dict] = Depends(get_auth_claims)):
+    """
+    HTTP streaming endpoint (Server-Sent Events)
+    
+    Same request body and token checks as POST /message. The reply is sent as
+    a "start" event, one "delta" event per chunk, and a final "done" event
+    carrying the assembled response.
+    """
+    try:
+        user_id = message_data.get("user_id")
+        agent_id = message_data.get("agent_id")
+        user_message = message_data.get("message")
+        
+        if not user_id or not agent_id or not user_message:
+            raise HTTPException(
+                status_code=400,
+                detail="Missing required fields: user_id, agent_id, or message"
+            )
+        
+        ensure_user(claims, user_id)
+        catalog = get_catalog()
+        provider_agent_id = _get_provider_agent_id(message_data, catalog)
+        token_status, lane = await _charge_message(user_id)
+        conversation_history, conversation_summary = await _get_history(user_id, agent_id, message_data)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    async def event_stream():
+        yield _sse_event("start", {"agent_id": agent_id})
+        
+        chunks = []
+        try:
+            async for chunk in get_gemini_service().stream_agent_response(
+                agent_id=agent_id,
+                user_message=user_message,
+                user_id=user_id,
+                conversation_history=conversation_history,
+                conversation_summary=conversation_summary,
+                lane=lane,
+                provider_agent_id=provider_agent_id,
+                catalog=catalog
+            ):
+                chunks.append(chunk)
+                yield _sse_event("delta", {"delta": chunk})
+        except UpstreamError as e:
+            await _refund_message_token(user_id, token_status)
+            yield _sse_event("error", {"agent_id": agent_id, **e.to_dict()})
+            return
+        
+        # A client disconnect cancels this generator (and the upstream call);
+        # once the reply is complete it is saved in full
+        response = "".join(chunks)
+        await asyncio.shield(_persist_reply(
+            user_id, agent_id, user_message, response, provider_agent_id,
+            client_history=bool(message_data.get("conversation_history")),
+        ))
+        
+        yield _sse_event("done", {
+            "agent_id": agent_id,
+            "response": response,
+            "user_id": user_id,
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering
+        },
+    )
@@ -1,5 +1,18 @@
 """Health check endpoints"""
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from core.auth import get_token_verifier
+from services.catalog import get_catalog_reloader
+from services.hedging import get_hedge_policy
+from services.llm_scheduler import get_llm_scheduler
+from services.message_writer import get_message_writer
+from services.model_router import get_model_router
+from services.readiness import get_readiness_checker
+from services.resilience import circuit_breaker_metrics
+from services.warmup import get_warmup
+from services.request_coalescer import get_request_coalescer
+from services.response_cache import get_response_cache
 
 router = APIRouter()
 
@@ -12,7 +25,30 @@ async def health_check():
 
 @router.get("/ready")
 async def readiness_check():
-    """Readiness check for Kubernetes/Cloud Run"""
-    # Add checks for database, external services, etc.
-    return {"status": "ready"}
+    """
+    Readiness check for Kubernetes/Cloud Run
+    
+    503 while warming up, when a cached dependency check failed, or while the
+    worker is saturated. Reads only local state (see services/readiness.py).
+    """
+    status = get_readiness_checker().status()
+    if not status.pop("ready"):
+        return JSONResponse(status_code=503, content=status)
+    return status
 
+@router.get("/metrics")
+async def metrics():
+    """Internal performance metrics"""
+    return {
+        "message_writer": get_message_writer().metrics(),
+        "llm_scheduler": get_llm_scheduler().metrics(),
+        "circuit_breakers": circuit_breaker_metrics(),
+        "hedging": get_hedge_policy().metrics(),
+        "auto_routing": get_model_router().metrics(),
+        "response_cache": get_response_cache().metrics(),
+        "coalescer": get_request_coalescer().metrics(),
+        "auth": get_token_verifier().metrics(),
+        "catalog": get_catalog_reloader().metrics(),
+        "warmup": get_warmup().metrics(),
+        "readiness": get_readiness_checker().metrics(),
+    }
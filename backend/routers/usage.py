@@ -1,12 +1,13 @@
 """Usage/Token tracking endpoints"""
 from fastapi import APIRouter, HTTPException, Depends
 from typing import Optional
+from core.auth import require_user
 from services.token_service import get_token_service
 
 router = APIRouter()
 
 
-@router.get("/status/{user_id}")
+@router.get("/status/{user_id}", dependencies=[Depends(require_user)])
 async def get_usage_status(user_id: str):
     """
     Get token/usage status for a user
@@ -38,7 +39,7 @@ async def get_usage_status(user_id: str):
         )
 
 
-@router.post("/reset/{user_id}")
+@router.post("/reset/{user_id}", dependencies=[Depends(require_user)])
 async def reset_tokens(user_id: str):
     """
     Reset tokens for a user (admin/testing endpoint)
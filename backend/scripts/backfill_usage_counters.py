@@ -0,0 +1,93 @@
+"""
+Backfill usage counters
+
+Builds the per-user, per-period message counters used by RateLimiter from the
+existing `messages` collection. Counters are overwritten (not incremented), so
+the script is safe to re-run. Run it while chat traffic is paused, or re-run it
+once after enabling counters, to avoid racing live increments.
+
+Usage:
+    python scripts/backfill_usage_counters.py               # all users
+    python scripts/backfill_usage_counters.py --user UID    # single user
+    python scripts/backfill_usage_counters.py --dry-run     # print, don't write
+"""
+import argparse
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from google.cloud import firestore  # noqa: E402
+
+from core.firebase import initialize_firebase, get_firestore_client  # noqa: E402
+from services.rate_limiter import RateLimiter, USAGE_COUNTERS_COLLECTION, TIERS  # noqa: E402
+
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 500
+
+
+def count_messages(db, rate_limiter: RateLimiter, user_id: str = None) -> dict:
+    """Count messages per user and period: {user_id: {period_id: count}}"""
+    query = db.collection("messages")
+    if user_id:
+        query = query.where("user_id", "==", user_id)
+
+    counters = defaultdict(lambda: defaultdict(int))
+    scanned = 0
+    for doc in query.select(["user_id", "timestamp"]).stream():
+        data = doc.to_dict()
+        timestamp = data.get("timestamp")
+        if not data.get("user_id") or timestamp is None:
+            continue
+        for tier in TIERS:
+            counters[data["user_id"]][rate_limiter.get_period_id(tier, timestamp)] += 1
+        scanned += 1
+
+    print(f"Scanned {scanned} messages for {len(counters)} users")
+    return counters
+
+
+def write_counters(db, counters: dict):
+    """Overwrite counter documents in batches"""
+    batch = db.batch()
+    pending = 0
+    for user_id, periods in counters.items():
+        batch.set(db.collection(USAGE_COUNTERS_COLLECTION).document(user_id), {
+            "user_id": user_id,
+            "periods": dict(periods),
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        })
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    print(f"Wrote counters for {len(counters)} users")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill usage counters from messages")
+    parser.add_argument("--user", help="Only backfill this user ID")
+    parser.add_argument("--dry-run", action="store_true", help="Print counters without writing")
+    args = parser.parse_args()
+
+    if not initialize_firebase():
+        sys.exit("Firebase is not configured")
+
+    db = get_firestore_client()
+    counters = count_messages(db, RateLimiter(), args.user)
+
+    if args.dry_run:
+        for user_id, periods in counters.items():
+            print(user_id, dict(sorted(periods.items())))
+        return
+
+    write_counters(db, counters)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Prompt builder benchmark
+
+Builds prompts for synthetic long conversations and compares the
+token-budget builder against the old fixed 10-turn window: build time
+(cold and warm token-count cache) and resulting prompt size.
+
+Usage:
+    python scripts/bench_prompt_builder.py
+    python scripts/bench_prompt_builder.py --turns 200 --budget 8000 --iterations 500
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.prompt_builder import PromptBuilder, estimate_tokens  # noqa: E402
+
+PERSONA = (
+    "You are an experienced CEO coach with 20+ years of experience helping executives "
+    "grow their businesses. Provide practical, actionable advice on leadership, strategy, "
+    "and business growth."
+)
+
+WORDS = (
+    "strategy growth team leadership market revenue customer product hiring culture "
+    "feedback roadmap budget pricing launch investor runway churn retention goal"
+).split()
+
+
+def synthetic_text(rng: random.Random, min_words: int, max_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) + "."
+
+
+def synthetic_conversation(rng: random.Random, turns: int, long_ratio: float) -> list:
+    """Mix of short turns and occasional very long ones"""
+    history = []
+    for _ in range(turns):
+        if rng.random() < long_ratio:
+            history.append({
+                "user_message": synthetic_text(rng, 200, 600),
+                "response": synthetic_text(rng, 800, 2000),
+            })
+        else:
+            history.append({
+                "user_message": synthetic_text(rng, 5, 30),
+                "response": synthetic_text(rng, 30, 120),
+            })
+    return history
+
+
+def fixed_window_prompt(history: list, user_message: str) -> str:
+    """Previous behaviour: always the last 10 turns"""
+    parts = [PERSONA]
+    for msg in history[-10:]:
+        parts.append(f"User: {msg.get('user_message', '')}")
+        parts.append(f"Assistant: {msg.get('response', '')}")
+    parts.append(f"User: {user_message}")
+    parts.append("Assistant:")
+    return "\n".join(parts)
+
+
+def time_per_call(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prompt assembly")
+    parser.add_argument("--turns", type=int, default=100, help="Turns per conversation")
+    parser.add_argument("--budget", type=int, default=4000, help="Token budget")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    builder = PromptBuilder()
+    user_message = "How should I prioritise hiring versus product work next quarter?"
+
+    print(f"{'scenario':<16} {'builder':<14} {'cold ms':>9} {'warm ms':>9} {'tokens':>8} {'turns':>6}")
+    for name, long_ratio in (("short chat", 0.0), ("mixed", 0.1), ("long messages", 0.5)):
+        history = synthetic_conversation(rng, args.turns, long_ratio)
+
+        estimate_tokens.cache_clear()
+        started = time.perf_counter()
+        prompt = builder.build(PERSONA, user_message, history, args.budget)
+        cold = (time.perf_counter() - started) * 1000
+        warm = time_per_call(lambda: builder.build(PERSONA, user_message, history, args.budget), args.iterations)
+        turns = prompt.count("\nUser: ") - 1
+        print(f"{name:<16} {'token budget':<14} {cold:>9.3f} {warm:>9.3f} {estimate_tokens(prompt):>8} {turns:>6}")
+
+        window = fixed_window_prompt(history, user_message)
+        fixed = time_per_call(lambda: fixed_window_prompt(history, user_message), args.iterations)
+        print(f"{'':<16} {'fixed 10':<14} {'':>9} {fixed:>9.3f} {estimate_tokens(window):>8} {min(10, len(history)):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Startup benchmark
+
+Measures, each in a fresh interpreter, how long `import main` takes, how
+long until the app answers its first request after startup, how long
+warmup takes until /health/ready is 200, and the latency of the first chat
+message. Fails (exit code 1) when a measurement exceeds its budget, so it
+can run in CI. Uses the in-memory data store and the fake LLM backend
+unless --real is given.
+
+Usage:
+    python scripts/bench_startup.py
+    python scripts/bench_startup.py --runs 5 --import-budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Budgets (milliseconds, median of runs)
+IMPORT_BUDGET_MS = 1200
+FIRST_REQUEST_BUDGET_MS = 100
+READY_BUDGET_MS = 5000
+FIRST_MESSAGE_BUDGET_MS = 1000
+
+# Runs in the child interpreter; prints one JSON line of timings
+CHILD = r"""
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    request_started = time.perf_counter()
+    client.get("/health/")
+    first_request = time.perf_counter() - request_started
+    while client.get("/health/ready").status_code != 200:
+        time.sleep(0.005)
+    ready = time.perf_counter() - request_started
+    message_started = time.perf_counter()
+    response = client.post("/api/chat/message", json={"user_id": "bench", "agent_id": "ceo_coach", "message": "hi"})
+    first_message = time.perf_counter() - message_started
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": first_request * 1000,
+    "ready_ms": ready * 1000,
+    "first_message_ms": first_message * 1000,
+    "message_status": response.status_code,
+}))
+"""
+
+
+def run_once(real: bool) -> dict:
+    env = dict(os.environ)
+    if not real:
+        env.setdefault("GEMINI_API_KEY", "benchmark")
+        env.setdefault("DATASTORE_BACKEND", "memory")
+        env.setdefault("FIREBASE_CREDENTIALS_PATH", "/nonexistent/benchmark.json")
+        env.setdefault("LLM_PROVIDER_OVERRIDES", '{"*": "fake"}')
+        env.setdefault("FAKE_PROVIDER_LATENCY", "0")
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", CHILD],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--real", action="store_true", help="use the configured Firestore / LLM backends")
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--first-request-budget-ms", type=float, default=FIRST_REQUEST_BUDGET_MS)
+    parser.add_argument("--ready-budget-ms", type=float, default=READY_BUDGET_MS)
+    parser.add_argument("--first-message-budget-ms", type=float, default=FIRST_MESSAGE_BUDGET_MS)
+    args = parser.parse_args()
+
+    runs = [run_once(args.real) for _ in range(args.runs)]
+    budgets = {
+        "import_ms": args.import_budget_ms,
+        "first_request_ms": args.first_request_budget_ms,
+        "ready_ms": args.ready_budget_ms,
+        "first_message_ms": args.first_message_budget_ms,
+    }
+
+    failed = False
+    print(f"Startup ({args.runs} runs, median)")
+    for metric, budget in budgets.items():
+        value = statistics.median(run[metric] for run in runs)
+        ok = value <= budget
+        failed = failed or not ok
+        print(f"  {metric:<18} {value:8.1f} ms   budget {budget:8.1f} ms   {'ok' if ok else 'OVER BUDGET'}")
+    statuses = {run["message_status"] for run in runs}
+    if statuses != {200}:
+        print(f"  first message returned {statuses}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Token verification benchmark
+
+Mints RS256 ID tokens with a local signing key and compares the cost of a
+full signature check (what firebase_admin does for every call to
+verify_id_token, minus the key download) against a TokenVerifier cache hit,
+both for the verifier alone and for an authenticated request to
+GET /api/usage/status through the app (in-memory data store).
+
+Usage:
+    python scripts/bench_token_verification.py
+    python scripts/bench_token_verification.py --iterations 5000 --requests 1000
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("DATASTORE_BACKEND", "memory")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+os.environ["AUTH_ENABLED"] = "true"
+
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+from google.auth import crypt, jwt  # noqa: E402
+
+from core import auth  # noqa: E402
+
+PROJECT_ID = "benchmark-project"
+KEY_ID = "benchmark-key"
+
+
+def make_signing_key():
+    """(signer, {kid: PEM certificate}) for a throwaway RSA key"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "benchmark")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(1)
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    signer = crypt.RSASigner.from_string(private_pem, key_id=KEY_ID)
+    return signer, {KEY_ID: cert.public_bytes(serialization.Encoding.PEM)}
+
+
+def mint_token(signer, uid: str) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "uid": uid,
+        "iat": now,
+        "exp": now + 3600,
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+def make_verify(certs: dict):
+    """Signature and claim check against local certificates"""
+    def verify(token: str) -> dict:
+        claims = jwt.decode(token, certs=certs, audience=PROJECT_ID)
+        claims["uid"] = claims["sub"]
+        return claims
+    return verify
+
+
+async def bench_verifier(verify, token: str, iterations: int) -> tuple:
+    """Microseconds per call: (uncached, cached)"""
+    uncached = auth.TokenVerifier(verify=verify, max_tokens=0)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await uncached.verify(token)
+    uncached_us = (time.perf_counter() - started) / iterations * 1e6
+
+    cached = auth.TokenVerifier(verify=verify)
+    await cached.verify(token)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await cached.verify(token)
+    cached_us = (time.perf_counter() - started) / iterations * 1e6
+    return uncached_us, cached_us
+
+
+def bench_requests(verify, token: str, uid: str, requests: int) -> tuple:
+    """Milliseconds per authenticated HTTP request: (uncached, cached)"""
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    headers = {"Authorization": f"Bearer {token}"}
+    results = []
+    for max_tokens in (0, None):
+        auth._token_verifier = auth.TokenVerifier(verify=verify, max_tokens=max_tokens)
+        assert client.get(f"/api/usage/status/{uid}", headers=headers).status_code == 200
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(f"/api/usage/status/{uid}", headers=headers)
+        results.append((time.perf_counter() - started) / requests * 1000)
+    return tuple(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    signer, certs = make_signing_key()
+    uid = "benchmark-user"
+    token = mint_token(signer, uid)
+    verify = make_verify(certs)
+
+    uncached_us, cached_us = asyncio.run(bench_verifier(verify, token, args.iterations))
+    print(f"TokenVerifier.verify ({args.iterations} calls)")
+    print(f"  signature check: {uncached_us:8.1f} us/call")
+    print(f"  cached claims:   {cached_us:8.1f} us/call  ({uncached_us / cached_us:.0f}x faster)")
+
+    uncached_ms, cached_ms = bench_requests(verify, token, uid, args.requests)
+    print(f"\nGET /api/usage/status with a bearer token ({args.requests} requests)")
+    print(f"  signature check: {uncached_ms:8.3f} ms/request")
+    print(f"  cached claims:   {cached_ms:8.3f} ms/request  ({uncached_ms - cached_ms:.3f} ms saved)")
+
+
+if __name__ == "__main__":
+    main()
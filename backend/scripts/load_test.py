@@ -0,0 +1,147 @@
+"""
+Chat load test
+
+Fires concurrent requests at POST /api/chat/message and reports throughput
+for each concurrency level. With a non-blocking generation path throughput
+should scale with concurrency instead of flatlining at one request at a time.
+
+Usage:
+    # In-process, against a simulated model and the in-memory data store
+    # (no network or credentials needed)
+    python scripts/load_test.py --latency 0.5 --concurrency 1 10 50 200
+
+    # Against a running server
+    python scripts/load_test.py --url http://localhost:8000 --concurrency 1 10 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+class SimulatedResponse:
+    """Minimal stand-in for a Gemini response"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class SimulatedModel:
+    """Model that answers after a fixed delay without touching the network"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def generate_content_async(self, prompt, **kwargs):
+        await asyncio.sleep(self.latency)
+        return SimulatedResponse("simulated response")
+
+
+def build_in_process_client(latency: float) -> httpx.AsyncClient:
+    """Create a client bound to the ASGI app with a simulated model"""
+    os.environ.setdefault("GEMINI_API_KEY", "load-test")
+    # Point at a missing credentials file so Firebase stays disabled,
+    # and keep users, counters and messages in the in-memory data store
+    os.environ.setdefault("FIREBASE_CREDENTIALS_PATH", "/nonexistent/load-test.json")
+    os.environ.setdefault("DATASTORE_BACKEND", "memory")
+
+    import main
+    from services.gemini_service import get_gemini_service
+
+    get_gemini_service().model = SimulatedModel(latency)
+    transport = httpx.ASGITransport(app=main.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://load-test")
+
+
+async def seed_premium_users(user_ids):
+    """Mark in-process users premium so --requests above the free limit isn't answered with 429"""
+    from services.token_service import get_token_service
+
+    for user_id in user_ids:
+        await get_token_service().set_premium_status(user_id, True)
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests_per_worker: int,
+                    run_id: str, in_process: bool) -> dict:
+    """
+    Run one concurrency level and return timing stats
+
+    Every level uses its own users, so token limits spent at one level
+    don't turn into errors (and skewed latencies) at the next.
+    """
+    latencies = []
+    errors = 0
+    user_ids = [f"load-test-{run_id}-c{concurrency}-{worker_id}" for worker_id in range(concurrency)]
+    if in_process:
+        await seed_premium_users(user_ids)
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        for i in range(requests_per_worker):
+            started = time.perf_counter()
+            response = await client.post(
+                "/api/chat/message",
+                json={
+                    "user_id": user_ids[worker_id],
+                    "agent_id": "ceo_coach",
+                    "message": f"Load test message {i}",
+                },
+                timeout=120,
+            )
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    total = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed": elapsed,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "p50": latencies[total // 2] if total else 0.0,
+        "p99": latencies[min(total - 1, int(total * 0.99))] if total else 0.0,
+    }
+
+
+async def main_async(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url)
+    else:
+        client = build_in_process_client(args.latency)
+
+    # Fresh user IDs per run, also against a running server
+    run_id = str(int(time.time()))
+    print(f"{'concurrency':>12} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 (s)':>9} {'p99 (s)':>9}")
+    async with client:
+        for level in args.concurrency:
+            stats = await run_level(client, level, args.requests, run_id, in_process=not args.url)
+            print(
+                f"{stats['concurrency']:>12} {stats['requests']:>9} {stats['errors']:>7} "
+                f"{stats['throughput']:>9.1f} {stats['p50']:>9.3f} {stats['p99']:>9.3f}"
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the chat HTTP endpoint")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated model latency in seconds")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--requests", type=int, default=3, help="Requests per concurrent worker")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
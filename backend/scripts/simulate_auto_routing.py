@@ -0,0 +1,133 @@
+"""
+Auto-routing simulation
+
+Replays synthetic traffic against ModelRouter on a virtual clock. Each model
+has a lognormal latency distribution (plus time per prompt character) and a
+throttling error rate; halfway through the run the fastest model degrades, to
+check that traffic moves away from it. Compares mean / p95 latency and error
+rate of auto routing against always using the default model and against an
+oracle that knows the true distributions.
+
+Usage:
+    python scripts/simulate_auto_routing.py
+    python scripts/simulate_auto_routing.py --requests 50000 --rate 40 --seed 7
+"""
+import argparse
+import heapq
+import math
+import random
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from core.config import settings  # noqa: E402
+from services.model_router import ModelRouter  # noqa: E402
+
+DEFAULT_MODEL = "gemini-pro"
+
+# Provider agent -> (median seconds, lognormal sigma, seconds per 1k prompt chars, error rate) per phase
+MODELS = {
+    "gemini-pro": [(1.2, 0.35, 0.10, 0.01), (1.2, 0.35, 0.10, 0.01)],
+    "gemini-flash": [(0.5, 0.30, 0.05, 0.01), (1.8, 0.60, 0.05, 0.20)],
+    "openai-gpt-3.5-turbo": [(0.8, 0.50, 0.04, 0.02), (0.8, 0.50, 0.04, 0.02)],
+    "claude-haiku": [(0.7, 0.80, 0.30, 0.01), (0.7, 0.80, 0.30, 0.01)],
+}
+
+
+def expected_latency(params: tuple, prompt_chars: int) -> float:
+    median, sigma, per_kchar, error_rate = params
+    mean = median * math.exp(sigma ** 2 / 2) + per_kchar * prompt_chars / 1000
+    # A throttled request costs a retry
+    return mean * (1 + error_rate)
+
+
+def sample_call(rng: random.Random, params: tuple, prompt_chars: int) -> tuple:
+    """(latency, ok) of one synthetic upstream call"""
+    median, sigma, per_kchar, error_rate = params
+    if rng.random() < error_rate:
+        return median * 0.2, False
+    return rng.lognormvariate(math.log(median), sigma) + per_kchar * prompt_chars / 1000, True
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def simulate(policy: str, requests: int, rate: float, long_ratio: float, seed: int) -> dict:
+    """Run one policy ("auto", "static" or "oracle") over the same synthetic traffic"""
+    rng = random.Random(seed)
+    now = [0.0]
+    router = ModelRouter(clock=lambda: now[0], rng=random.Random(seed + 1))
+    candidates = {agent_id: agent_id for agent_id in MODELS}
+    pending = []  # (finish time, sequence, agent_id, prompt chars, latency, ok)
+    latencies = {0: [], 1: []}
+    errors = {0: 0, 1: 0}
+    shares = {0: {}, 1: {}}
+
+    for index in range(requests):
+        now[0] += rng.expovariate(rate)
+        while pending and pending[0][0] <= now[0]:
+            _, _, agent_id, prompt_chars, latency, ok = heapq.heappop(pending)
+            router.record(agent_id, prompt_chars, latency, ok)
+
+        phase = 0 if index < requests // 2 else 1
+        long = rng.random() < long_ratio
+        prompt_chars = rng.randint(4000, 20000) if long else rng.randint(100, 2000)
+        if policy == "static":
+            agent_id = DEFAULT_MODEL
+        elif policy == "oracle":
+            agent_id = min(MODELS, key=lambda a: expected_latency(MODELS[a][phase], prompt_chars))
+        else:
+            agent_id = router.choose(candidates, prompt_chars)
+
+        latency, ok = sample_call(rng, MODELS[agent_id][phase], prompt_chars)
+        router.start(agent_id)
+        heapq.heappush(pending, (now[0] + latency, index, agent_id, prompt_chars, latency, ok))
+        if not ok:
+            # The caller retries on the default model
+            errors[phase] += 1
+            latency += sample_call(rng, MODELS[DEFAULT_MODEL][phase], prompt_chars)[0]
+        latencies[phase].append(latency)
+        shares[phase][agent_id] = shares[phase].get(agent_id, 0) + 1
+
+    return {"latencies": latencies, "errors": errors, "shares": shares}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=20.0, help="requests per second")
+    parser.add_argument("--long-ratio", type=float, default=0.2, help="share of long prompts")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(
+        f"{args.requests} requests at {args.rate:.0f}/s, {args.long_ratio:.0%} long prompts, "
+        f"explore={settings.AUTO_ROUTING_EXPLORE}, alpha={settings.AUTO_ROUTING_EWMA_ALPHA}"
+    )
+    results = {
+        policy: simulate(policy, args.requests, args.rate, args.long_ratio, args.seed)
+        for policy in ("static", "auto", "oracle")
+    }
+
+    for phase, label in ((0, "phase 1 (steady)"), (1, "phase 2 (gemini-flash degraded)")):
+        print(f"\n{label}")
+        print(f"  {'policy':<8} {'mean ms':>9} {'p95 ms':>9} {'errors':>8}  traffic share")
+        for policy, result in results.items():
+            latencies = result["latencies"][phase]
+            mean = sum(latencies) / len(latencies)
+            shares = ", ".join(
+                f"{agent_id} {count / len(latencies):.0%}"
+                for agent_id, count in sorted(result["shares"][phase].items(), key=lambda item: -item[1])
+            )
+            print(
+                f"  {policy:<8} {mean * 1000:>9.0f} {percentile(latencies, 95) * 1000:>9.0f} "
+                f"{result['errors'][phase] / len(latencies):>8.1%}  {shares}"
+            )
+
+
+if __name__ == "__main__":
+    main()
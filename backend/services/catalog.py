@@ -0,0 +1,363 @@
+"""Agent and provider agent catalog"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from core.config import settings
+from core.datastore import get_datastore
+from models.agent import Agent
+from models.provider_agent import ProviderAgent
+
+# Persona used for agent IDs that aren't in the catalog
+DEFAULT_PERSONA = "You are a helpful AI assistant."
+
+
+# Predefined agents
+AGENTS = [
+    {
+        "id": "ceo_coach",
+        "name": "CEO Coach",
+        "description": "Get expert business advice and leadership guidance",
+        "persona": "You are an experienced CEO coach with 20+ years of experience helping executives grow their businesses. Provide practical, actionable advice on leadership, strategy, and business growth. Be concise, insightful, and focus on actionable steps.",
+        "category": "Business"
+    },
+    {
+        "id": "creative_writer",
+        "name": "Creative Writer",
+        "description": "Collaborate on stories, scripts, and creative projects",
+        "persona": "You are a creative writing assistant. Help users brainstorm ideas, develop characters, write dialogue, and refine their creative projects. Be imaginative, supportive, and help bring their creative vision to life.",
+        "category": "Creative"
+    },
+    {
+        "id": "tech_mentor",
+        "name": "Tech Mentor",
+        "description": "Get help with programming and technical questions",
+        "persona": "You are a tech mentor and programming expert. Help users understand programming concepts, debug code, learn new technologies, and solve technical challenges. Be clear, patient, and provide practical examples.",
+        "category": "Technology"
+    },
+    {
+        "id": "life_coach",
+        "name": "Life Coach",
+        "description": "Personal development and life advice",
+        "persona": "You are a life coach focused on personal development and growth. Help users set goals, overcome obstacles, build confidence, and create positive change in their lives. Be empathetic, encouraging, and action-oriented.",
+        "category": "Personal Development"
+    },
+]
+
+
+
+# Predefined provider agents (AI models)
+PROVIDER_AGENTS = [
+    # Auto mode
+    {
+        "id": "auto",
+        "name": "Auto Select",
+        "description": "Automatically chooses the best model",
+        "provider": "auto",
+        "model_id": "auto",
+        "is_default": True,
+    },
+    
+    # OpenAI Agents
+    {
+        "id": "openai-gpt-4",
+        "name": "GPT-4",
+        "description": "Most capable model, best for complex tasks",
+        "provider": "openai",
+        "model_id": "gpt-4",
+        "is_default": False,
+    },
+    {
+        "id": "openai-gpt-4-turbo",
+        "name": "GPT-4 Turbo",
+        "description": "Faster GPT-4, great balance",
+        "provider": "openai",
+        "model_id": "gpt-4-turbo",
+        "is_default": False,
+    },
+    {
+        "id": "openai-gpt-3.5-turbo",
+        "name": "GPT-3.5 Turbo",
+        "description": "Fast and cost-effective",
+        "provider": "openai",
+        "model_id": "gpt-3.5-turbo",
+        "is_default": True,
+    },
+    
+    # Claude Agents
+    {
+        "id": "claude-opus",
+        "name": "Claude Opus",
+        "description": "Most powerful Claude model",
+        "provider": "claude",
+        "model_id": "claude-3-opus-20240229",
+        "is_default": False,
+    },
+    {
+        "id": "claude-sonnet",
+        "name": "Claude Sonnet",
+        "description": "Balanced performance and speed",
+        "provider": "claude",
+        "model_id": "claude-3-sonnet-20240229",
+        "is_default": True,
+    },
+    {
+        "id": "claude-haiku",
+        "name": "Claude Haiku",
+        "description": "Fastest Claude model",
+        "provider": "claude",
+        "model_id": "claude-3-haiku-20240307",
+        "is_default": False,
+    },
+    
+    # Gemini Agents
+    {
+        "id": "gemini-ultra",
+        "name": "Gemini Ultra",
+        "description": "Most advanced Gemini model",
+        "provider": "gemini",
+        "model_id": "gemini-ultra",
+        "is_default": False,
+    },
+    {
+        "id": "gemini-pro",
+        "name": "Gemini Pro",
+        "description": "Best for most tasks",
+        "provider": "gemini",
+        "model_id": "gemini-pro",
+        "is_default": True,
+    },
+    {
+        "id": "gemini-flash",
+        "name": "Gemini Flash",
+        "description": "Fast and efficient",
+        "provider": "gemini",
+        "model_id": "gemini-flash",
+        "is_default": False,
+    },
+]
+
+
+
+class CachedBody(NamedTuple):
+    """A pre-serialized JSON response body and its ETag"""
+    body: bytes
+    etag: str
+
+
+def _serialize(data) -> CachedBody:
+    # Same encoding FastAPI's JSONResponse uses
+    body = json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+    return CachedBody(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+class Catalog:
+    """
+    Immutable, indexed snapshot of the agent and provider agent catalogs
+    
+    Entries are validated once against the API models, indexed by ID (and
+    provider agents by provider), and every response body the catalog
+    endpoints can return is serialized up front with its ETag.
+    """
+    
+    def __init__(self, agents: List[dict], provider_agents: List[dict], version: str = "builtin"):
+        self.version = version
+        self.agents: List[dict] = [Agent(**agent).model_dump() for agent in agents]
+        self.provider_agents: List[dict] = [ProviderAgent(**agent).model_dump() for agent in provider_agents]
+        self.agents_by_id: Dict[str, dict] = {agent["id"]: agent for agent in self.agents}
+        self.provider_agents_by_id: Dict[str, dict] = {agent["id"]: agent for agent in self.provider_agents}
+        self.provider_agents_by_provider: Dict[str, List[dict]] = {}
+        # (provider, model_id) -> provider agent, for clients that send those instead of an ID
+        self.provider_agents_by_model: Dict[Tuple[str, str], dict] = {}
+        for agent in self.provider_agents:
+            self.provider_agents_by_provider.setdefault(agent["provider"].lower(), []).append(agent)
+            self.provider_agents_by_model.setdefault((agent["provider"].lower(), agent["model_id"]), agent)
+        
+        self.agents_body = _serialize(self.agents)
+        self.agent_bodies = {agent_id: _serialize(agent) for agent_id, agent in self.agents_by_id.items()}
+        self.provider_agents_body = _serialize(self.provider_agents)
+        self.provider_agent_bodies = {
+            agent_id: _serialize(agent) for agent_id, agent in self.provider_agents_by_id.items()
+        }
+        self.provider_bodies = {
+            provider: _serialize(agents) for provider, agents in self.provider_agents_by_provider.items()
+        }
+        self.empty_body = _serialize([])
+    
+    def persona(self, agent_id: str) -> str:
+        """System prompt for an agent"""
+        agent = self.agents_by_id.get(agent_id)
+        return agent["persona"] if agent else DEFAULT_PERSONA
+    
+    def get_provider_agent(self, provider_agent_id: str) -> Optional[dict]:
+        return self.provider_agents_by_id.get(provider_agent_id)
+    
+    def find_provider_agent(self, provider: Optional[str], model_id: Optional[str]) -> Optional[dict]:
+        """
+        Provider agent matching a provider and / or model ID
+        
+        With only a provider, its first provider agent; with only a model ID,
+        the first provider agent serving that model.
+        """
+        if provider and model_id:
+            return self.provider_agents_by_model.get((provider.lower(), model_id))
+        if provider:
+            agents = self.provider_agents_by_provider.get(provider.lower())
+            return agents[0] if agents else None
+        return next((agent for agent in self.provider_agents if agent["model_id"] == model_id), None)
+    
+    def provider_agents_body_for(self, provider: Optional[str]) -> CachedBody:
+        """Body for GET /api/provider-agents, optionally filtered by provider"""
+        if not provider:
+            return self.provider_agents_body
+        return self.provider_bodies.get(provider.lower(), self.empty_body)
+
+
+def catalog_from_document(data: dict, version: str) -> Catalog:
+    """
+    Build a catalog from a {"agents": [...], "provider_agents": [...]} document
+    
+    A missing section keeps the built-in entries.
+    
+    Raises:
+        ValueError: If an entry is invalid
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Catalog document must be a JSON object")
+    return Catalog(data.get("agents", AGENTS), data.get("provider_agents", PROVIDER_AGENTS), version)
+
+
+class CatalogReloader:
+    """
+    Reload the catalog from CATALOG_SOURCE without restarting
+    
+    "file" re-reads CATALOG_PATH when its size or modification time changes;
+    "firestore" polls the CATALOG_FIRESTORE_DOCUMENT document ("collection/id")
+    and rebuilds when its `version` field (or content) changes. Both are
+    checked every CATALOG_POLL_INTERVAL seconds. A new catalog is built off
+    to the side and swapped in with a single reference assignment, so readers
+    never lock and requests that already hold a snapshot keep using it. An
+    invalid catalog (including provider agents whose provider has no
+    backend) is logged and the current one stays in place.
+    """
+    
+    def __init__(self, source: str = None):
+        self.source = source or settings.CATALOG_SOURCE
+        self._file_stamp: Optional[Tuple[int, int]] = None
+        self.reloads = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+    
+    async def check(self) -> bool:
+        """
+        Load the catalog if the source changed
+        
+        Returns:
+            True if a new catalog was swapped in
+        """
+        try:
+            if self.source == "file":
+                catalog = await self._check_file()
+            elif self.source == "firestore":
+                catalog = await self._check_firestore()
+            else:
+                return False
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            print(f"Failed to reload catalog from {self.source}: {e}")
+            return False
+        
+        if catalog is None or catalog.version == get_catalog().version:
+            return False
+        # Imported here: llm_providers imports this module
+        from services.llm_providers import get_provider_registry
+        try:
+            get_provider_registry().check_catalog(catalog)
+        except ValueError as e:
+            self.errors += 1
+            self.last_error = str(e)
+            print(f"Rejected catalog {catalog.version} from {self.source}: {e}")
+            return False
+        set_catalog(catalog)
+        self.reloads += 1
+        self.last_error = None
+        self.loaded_at = time.time()
+        print(f"Catalog {catalog.version} loaded from {self.source}: "
+              f"{len(catalog.agents)} agents, {len(catalog.provider_agents)} provider agents")
+        return True
+    
+    async def run(self):
+        """Poll for catalog changes (run as a background task)"""
+        while True:
+            await asyncio.sleep(settings.CATALOG_POLL_INTERVAL)
+            await self.check()
+    
+    def metrics(self) -> dict:
+        return {
+            "source": self.source,
+            "version": get_catalog().version,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+    
+    async def _check_file(self) -> Optional[Catalog]:
+        stat = os.stat(settings.CATALOG_PATH)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._file_stamp:
+            return None
+        # A file that fails to parse is retried once it changes again
+        self._file_stamp = stamp
+        with open(settings.CATALOG_PATH, "rb") as f:
+            raw = f.read()
+        return catalog_from_document(json.loads(raw), hashlib.sha256(raw).hexdigest()[:16])
+    
+    async def _check_firestore(self) -> Optional[Catalog]:
+        collection, doc_id = settings.CATALOG_FIRESTORE_DOCUMENT.split("/", 1)
+        data = await get_datastore().get(collection, doc_id)
+        if data is None:
+            return None
+        version = data.get("version")
+        if version is None:
+            version = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        version = str(version)
+        if version == get_catalog().version:
+            return None
+        return catalog_from_document(data, version)
+
+
+# Global instances
+_catalog = None
+_catalog_reloader = None
+
+
+def get_catalog() -> Catalog:
+    """
+    Get the current catalog snapshot
+    
+    Hold on to the returned object for the rest of a request; a reload
+    replaces the global snapshot, never mutates it.
+    """
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog(AGENTS, PROVIDER_AGENTS)
+    return _catalog
+
+
+def set_catalog(catalog: Catalog):
+    """Swap in a new catalog snapshot"""
+    global _catalog
+    _catalog = catalog
+
+
+def get_catalog_reloader() -> CatalogReloader:
+    """Get catalog reloader instance (singleton)"""
+    global _catalog_reloader
+    if _catalog_reloader is None:
+        _catalog_reloader = CatalogReloader()
+    return _catalog_reloader
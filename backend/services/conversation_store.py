@@ -0,0 +1,214 @@
+"""Server-side conversation history store"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from core.config import settings
+from core.datastore import get_datastore, SERVER_TIMESTAMP
+
+CONVERSATIONS_COLLECTION = "conversations"
+
+# (previous summary, turns to fold in) -> updated summary
+Summarizer = Callable[[str, List[dict]], Awaitable[str]]
+
+
+class ConversationStore:
+    """
+    Conversation history per (user, agent)
+    
+    Recent turns live in a bounded in-memory LRU in front of one Firestore
+    document per conversation (`conversations/{user_id}__{agent_id}`), which
+    holds the last CONVERSATION_MAX_TURNS turns. A cache miss costs a single
+    document read; appends update the cache immediately and are persisted in
+    the background.
+    
+    Turns use the shape GeminiService expects:
+    {"user_message": str, "response": str}
+    
+    With a summarizer set, turns older than CONVERSATION_WINDOW_TURNS are
+    folded into a running summary in the background once
+    CONVERSATION_SUMMARY_BATCH of them have accumulated, so context stays
+    bounded however long the conversation runs.
+    """
+    
+    def __init__(self, store=None, summarizer: Optional[Summarizer] = None):
+        self._store = store
+        self._summarizer = summarizer
+        # (user_id, agent_id) -> (expires_at, {"summary": str, "turns": [...]}), LRU ordered
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, dict]]" = OrderedDict()
+        self._pending_writes: Set[asyncio.Task] = set()
+        self._summarizing: Set[Tuple[str, str]] = set()
+    
+    @property
+    def store(self):
+        """Data store (defaults to the shared process-wide store)"""
+        if self._store is None:
+            self._store = get_datastore()
+        return self._store
+    
+    def set_summarizer(self, summarizer: Optional[Summarizer]):
+        """Set the function used to condense old turns into the running summary"""
+        self._summarizer = summarizer
+    
+    @staticmethod
+    def conversation_id(user_id: str, agent_id: str) -> str:
+        """Document ID for a conversation"""
+        return f"{user_id}__{agent_id}"
+    
+    async def get_history(self, user_id: str, agent_id: str) -> List[dict]:
+        """Get recent turns for a conversation, oldest first"""
+        _, turns = await self.get_context(user_id, agent_id)
+        return turns
+    
+    async def get_context(self, user_id: str, agent_id: str) -> Tuple[str, List[dict]]:
+        """
+        Get conversation context
+        
+        Returns:
+            Tuple of (running summary of older turns or "", recent turns oldest first)
+        """
+        key = (user_id, agent_id)
+        entry = self._get_cached(key)
+        if entry is None:
+            try:
+                doc = await self.store.get(CONVERSATIONS_COLLECTION, self.conversation_id(user_id, agent_id))
+            except Exception as e:
+                print(f"Error loading conversation history: {e}")
+                return "", []
+            entry = {
+                "summary": (doc or {}).get("summary", ""),
+                "turns": (doc or {}).get("turns", []),
+            }
+            self._put_cached(key, entry)
+        return entry["summary"], list(entry["turns"])
+    
+    async def append_turn(
+        self,
+        user_id: str,
+        agent_id: str,
+        user_message: str,
+        response: str,
+        summarize: bool = True
+    ):
+        """
+        Record a completed turn (cache now, Firestore in the background)
+        
+        Args:
+            summarize: False when the client sends its own history, so the
+                running summary would never be used (no summarizer call)
+        """
+        key = (user_id, agent_id)
+        turn = {"user_message": user_message, "response": response}
+        
+        summary, turns = await self.get_context(user_id, agent_id)
+        turns = (turns + [turn])[-settings.CONVERSATION_MAX_TURNS:]
+        self._put_cached(key, {"summary": summary, "turns": turns})
+        
+        self._spawn(self._persist_turn(user_id, agent_id, turn))
+        
+        # Summarize only once enough turns have fallen out of the window
+        overflow = len(turns) - settings.CONVERSATION_WINDOW_TURNS
+        if (
+            summarize
+            and self._summarizer is not None
+            and overflow >= settings.CONVERSATION_SUMMARY_BATCH
+            and key not in self._summarizing
+        ):
+            self._summarizing.add(key)
+            self._spawn(self._summarize(user_id, agent_id, summary, turns[:overflow]))
+    
+    async def flush(self):
+        """Wait for background writes to finish (e.g. on shutdown)"""
+        if self._pending_writes:
+            await asyncio.gather(*self._pending_writes, return_exceptions=True)
+    
+    def _spawn(self, coro):
+        """Run a background write, tracked so flush() can wait for it"""
+        task = asyncio.create_task(coro)
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
+    
+    async def _summarize(self, user_id: str, agent_id: str, summary: str, old_turns: List[dict]):
+        """Fold `old_turns` into the running summary and drop them from the window"""
+        key = (user_id, agent_id)
+        try:
+            new_summary = await self._summarizer(summary, old_turns)
+            if not new_summary:
+                return
+            
+            count = len(old_turns)
+            
+            def fold(doc: Optional[dict]):
+                turns = (doc or {}).get("turns", [])
+                # Only drop the turns we summarized, if nothing else already did
+                if turns[:count] != old_turns:
+                    return None, False
+                return {
+                    "summary": new_summary,
+                    "turns": turns[count:],
+                    "updated_at": SERVER_TIMESTAMP,
+                }, True
+            
+            if self.store.available:
+                await self.store.transact(
+                    CONVERSATIONS_COLLECTION, self.conversation_id(user_id, agent_id), fold
+                )
+            
+            entry = self._get_cached(key)
+            if entry is not None and entry["turns"][:count] == old_turns:
+                self._put_cached(key, {"summary": new_summary, "turns": entry["turns"][count:]})
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+        finally:
+            self._summarizing.discard(key)
+    
+    async def _persist_turn(self, user_id: str, agent_id: str, turn: dict):
+        """Append a turn to the conversation document atomically"""
+        def append(doc: Optional[dict]):
+            turns = (doc or {}).get("turns", [])
+            turns = (turns + [turn])[-settings.CONVERSATION_MAX_TURNS:]
+            return {
+                "user_id": user_id,
+                "agent_id": agent_id,
+                "turns": turns,
+                "updated_at": SERVER_TIMESTAMP,
+            }, None
+        
+        try:
+            if self.store.available:
+                await self.store.transact(
+                    CONVERSATIONS_COLLECTION, self.conversation_id(user_id, agent_id), append
+                )
+        except Exception as e:
+            print(f"Error saving conversation history: {e}")
+    
+    def _get_cached(self, key: Tuple[str, str]) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, context = entry
+        if time.monotonic() >= expires_at:
+            # Another worker may have appended turns since we cached
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return context
+    
+    def _put_cached(self, key: Tuple[str, str], context: dict):
+        self._cache[key] = (time.monotonic() + settings.CONVERSATION_CACHE_TTL, context)
+        self._cache.move_to_end(key)
+        while len(self._cache) > settings.CONVERSATION_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+
+# Global instance
+_conversation_store = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Get conversation store instance (singleton)"""
+    global _conversation_store
+    if _conversation_store is None:
+        _conversation_store = ConversationStore()
+    return _conversation_store
@@ -1,27 +1,62 @@
 """Google Gemini API service"""
-import google.generativeai as genai
+import asyncio
+import hashlib
+import time
 from core.config import settings
-from typing import Dict, Optional
+from services.catalog import Catalog, get_catalog
+from services.hedging import get_hedge_policy
+from services.llm_providers import DEFAULT_PROVIDER_AGENT, get_provider_registry, ProviderTarget
+from services.llm_scheduler import get_llm_scheduler, PRIORITY_LANE, STANDARD_LANE
+from services.model_router import auto_candidates, get_model_router
+from services.prompt_builder import PromptBuilder, get_token_budget
+from services.request_coalescer import get_request_coalescer
+from services.resilience import UPSTREAM_HEALTH_CODES, backoff_delay, classify_error, get_circuit_breaker
+from services.response_cache import get_response_cache
+from typing import AsyncIterator, Dict, Optional
 
 
 class GeminiService:
-    """Service for interacting with Google Gemini API"""
+    """
+    Service for generating agent replies
+    
+    Replies come from Gemini (GEMINI_MODEL) unless a request names a provider
+    agent, in which case it is routed to that provider's backend (see
+    services/llm_providers.py).
+    """
     
     def __init__(self):
-        if not settings.GEMINI_API_KEY:
+        self.providers = get_provider_registry()
+        if not settings.GEMINI_API_KEY and self.providers.backend_name("gemini") == "gemini":
             raise ValueError(
                 "GEMINI_API_KEY is not set. Please set it in your .env file. "
                 "Get your API key from: https://aistudio.google.com/app/apikey"
             )
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+        self.prompt_builder = PromptBuilder()
+        self.response_cache = get_response_cache()
+        self.coalescer = get_request_coalescer()
+        self.scheduler = get_llm_scheduler()
+        self.hedging = get_hedge_policy()
+        self.model_router = get_model_router()
+    
+    @property
+    def model(self):
+        """Default Gemini model (assignable, e.g. to a stand-in for load tests)"""
+        return self.providers.get_backend("gemini").get_model(settings.GEMINI_MODEL)
+    
+    @model.setter
+    def model(self, model):
+        self.providers.get_backend("gemini").models[settings.GEMINI_MODEL] = model
     
     async def get_agent_response(
         self,
         agent_id: str,
         user_message: str,
         user_id: str,
-        conversation_history: Optional[list] = None
+        conversation_history: Optional[list] = None,
+        conversation_summary: Optional[str] = None,
+        lane: str = STANDARD_LANE,
+        provider_agent_id: Optional[str] = None,
+        catalog: Optional[Catalog] = None
     ) -> str:
         """
         Get response from Gemini API with agent persona
@@ -31,76 +66,383 @@ class GeminiService:
             user_message: User's message
             user_id: User ID for context
             conversation_history: Previous messages in conversation
+            conversation_summary: Running summary of older turns
+            lane: Scheduler lane for the upstream call (priority or standard)
+            provider_agent_id: Provider agent (model) to answer with; default Gemini,
+                "auto" picks one from live latency stats when AUTO_ROUTING_ENABLED
+            catalog: Catalog snapshot for personas and provider agents (default:
+                the current one), so a reload mid-request can't mix versions
             
         Returns:
             Agent's response text
+            
+        Raises:
+            ValueError: If the provider agent doesn't exist
+            UpstreamError: If the provider couldn't produce a response
+        """
+        catalog = catalog or get_catalog()
+        target = self._resolve_target(provider_agent_id, user_message, conversation_history, lane, catalog)
+        persona = catalog.persona(agent_id)
+        cache_key = self._get_cache_key(agent_id, persona, user_message, conversation_history, conversation_summary, target)
+        if cache_key:
+            cached = await self.response_cache.get(agent_id, cache_key)
+            if cached is not None:
+                return cached
+        
+        prompt = self._prepare_prompt(persona, user_message, conversation_history, conversation_summary, target)
+        
+        # Generate response (async client - doesn't block the event loop)
+        chunks = self._generate(prompt, cache_key, conversation_history, conversation_summary, lane, target, stream=False)
+        return "".join([chunk async for chunk in chunks])
+    
+    async def stream_agent_response(
+        self,
+        agent_id: str,
+        user_message: str,
+        user_id: str,
+        conversation_history: Optional[list] = None,
+        conversation_summary: Optional[str] = None,
+        lane: str = STANDARD_LANE,
+        provider_agent_id: Optional[str] = None,
+        catalog: Optional[Catalog] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream response from Gemini API chunk by chunk
+        
+        Args:
+            agent_id: ID of the agent persona
+            user_message: User's message
+            user_id: User ID for context
+            conversation_history: Previous messages in conversation
+            conversation_summary: Running summary of older turns
+            lane: Scheduler lane for the upstream call (priority or standard)
+            provider_agent_id: Provider agent (model) to answer with; default Gemini,
+                "auto" picks one from live latency stats when AUTO_ROUTING_ENABLED
+            catalog: Catalog snapshot for personas and provider agents (default:
+                the current one), so a reload mid-request can't mix versions
+            
+        Yields:
+            Partial response text as it is generated
+            
+        Raises:
+            ValueError: If the provider agent doesn't exist
+            UpstreamError: If the provider failed (possibly after some chunks were yielded)
+        """
+        catalog = catalog or get_catalog()
+        target = self._resolve_target(provider_agent_id, user_message, conversation_history, lane, catalog)
+        persona = catalog.persona(agent_id)
+        cache_key = self._get_cache_key(agent_id, persona, user_message, conversation_history, conversation_summary, target)
+        if cache_key:
+            cached = await self.response_cache.get(agent_id, cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        prompt = self._prepare_prompt(persona, user_message, conversation_history, conversation_summary, target)
+        
+        async for chunk in self._generate(prompt, cache_key, conversation_history, conversation_summary, lane, target, stream=True):
+            yield chunk
+    
+    async def summarize_turns(self, previous_summary: str, turns: list) -> str:
+        """
+        Fold conversation turns into a running summary
+        
+        Args:
+            previous_summary: Current summary of earlier turns ("" if none)
+            turns: Turns to add to the summary, oldest first
+            
+        Returns:
+            Updated summary text
+            
+        Raises:
+            UpstreamError: If the Gemini API call fails (caller retries later)
+        """
+        prompt_parts = [
+            "Update the running summary of a conversation between a user and an AI assistant. "
+            "Keep the user's goals, key facts, decisions and open questions. "
+            f"Write at most {settings.CONVERSATION_SUMMARY_MAX_WORDS} words.",
+            f"Current summary: {previous_summary or '(none)'}",
+            "New turns:",
+        ]
+        for msg in turns:
+            prompt_parts.append(f"User: {msg.get('user_message', '')}")
+            prompt_parts.append(f"Assistant: {msg.get('response', '')}")
+        prompt_parts.append("Updated summary:")
+        
+        target = self.providers.default_target()
+        chunks = self._call_model("\n".join(prompt_parts), None, STANDARD_LANE, target, stream=False)
+        return "".join([chunk async for chunk in chunks]).strip()
+    
+    def _generate(
+        self,
+        prompt: str,
+        cache_key: Optional[str],
+        conversation_history: Optional[list],
+        conversation_summary: Optional[str],
+        lane: str,
+        target: ProviderTarget,
+        stream: bool
+    ) -> AsyncIterator[str]:
+        """
+        Upstream generation for a prompt
+        
+        Requests without prior context (e.g. the same first message to an
+        agent from many users) share one in-flight call via the coalescer;
+        the shared call runs in the lane of the request that started it.
+        """
+        def factory():
+            return self._call_model(prompt, cache_key, lane, target, stream)
+        
+        if settings.COALESCE_ENABLED and not conversation_history and not conversation_summary:
+            key = hashlib.sha256(f"{target.key}\x1f{prompt}".encode()).hexdigest()
+            return self.coalescer.stream(key, factory)
+        return factory()
+    
+    async def _call_model(
+        self,
+        prompt: str,
+        cache_key: Optional[str],
+        lane: str,
+        target: ProviderTarget,
+        stream: bool
+    ) -> AsyncIterator[str]:
+        """
+        Call the provider and yield the response text, caching it on success
+        
+        Each attempt is admitted by the provider's circuit breaker (and may be
+        hedged, see _hedged_attempt). Retryable failures (rate limits,
+        unavailability) are retried after the upstream retry delay or a
+        jittered backoff, as long as nothing was yielded yet and the retry
+        fits in LLM_RETRY_BUDGET seconds. Only failures of the upstream itself
+        (UPSTREAM_HEALTH_CODES) count against the breaker.
+        
+        Raises:
+            UpstreamError: If the call failed and can't be retried
+        """
+        breaker = get_circuit_breaker(target.provider)
+        deadline = time.monotonic() + settings.LLM_RETRY_BUDGET
+        attempt = 0
+        while True:
+            chunks = []
+            try:
+                breaker.before_call()
+                async for chunk in self._hedged_attempt(prompt, lane, target, stream):
+                    chunks.append(chunk)
+                    yield chunk
+                breaker.record_success()
+                break
+            except Exception as e:
+                error = classify_error(e)
+                if error is not e:
+                    error.__cause__ = e
+                if error.code in UPSTREAM_HEALTH_CODES:
+                    breaker.record_failure(error.retry_after)
+                elif error.code != "circuit_open":
+                    breaker.record_ignored()
+                if not error.retryable or chunks or attempt >= settings.LLM_RETRY_MAX_ATTEMPTS:
+                    raise error
+                delay = backoff_delay(attempt, error.retry_after)
+                if time.monotonic() + delay > deadline:
+                    raise error
+                attempt += 1
+                await asyncio.sleep(delay)
+        
+        text = "".join(chunks)
+        
+        if cache_key:
+            await self.response_cache.set(cache_key, text)
+    
+    async def _hedged_attempt(self, prompt: str, lane: str, target: ProviderTarget, stream: bool) -> AsyncIterator[str]:
         """
-        # Get agent persona (in production, fetch from database)
-        agent_persona = self._get_agent_persona(agent_id)
+        One upstream attempt, hedged when LLM_HEDGE_ENABLED
         
+        If the primary request hasn't produced its first chunk within the hedge
+        delay (and the hedge budget allows), a second request is sent to the
+        fallback model. Whichever produces a first chunk first is streamed;
+        the other is cancelled.
+        """
+        self.hedging.start_primary()
+        primary = self._attempt(target, prompt, lane, stream)
+        if not settings.LLM_HEDGE_ENABLED:
+            async for chunk in primary:
+                yield chunk
+            return
+        
+        racers = {asyncio.ensure_future(primary.__anext__()): (primary, time.monotonic())}
+        winner = None
+        error = None
+        try:
+            done, _ = await asyncio.wait(racers, timeout=self.hedging.delay())
+            if not done and self.hedging.try_hedge():
+                hedge = self._attempt(self._get_fallback_target(target), prompt, lane, stream)
+                racers[asyncio.ensure_future(hedge.__anext__())] = (hedge, time.monotonic())
+            
+            while racers and winner is None:
+                done, _ = await asyncio.wait(racers, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    attempt, attempt_started = racers.pop(future)
+                    if future.exception() is None or isinstance(future.exception(), StopAsyncIteration):
+                        winner = (future, attempt, attempt_started)
+                        break
+                    error = future.exception()
+        finally:
+            # Cancel the loser (or both, if we were cancelled ourselves)
+            for future in racers:
+                future.cancel()
+            if racers:
+                await asyncio.gather(*racers, return_exceptions=True)
+        
+        if winner is None:
+            raise error
+        future, attempt, attempt_started = winner
+        if attempt is not primary:
+            self.hedging.hedge_wins += 1
+        if future.exception() is not None:
+            return  # empty response
+        self.hedging.record_first_chunk(time.monotonic() - attempt_started)
+        yield future.result()
+        async for chunk in attempt:
+            yield chunk
+    
+    async def _attempt(self, target: ProviderTarget, prompt: str, lane: str, stream: bool) -> AsyncIterator[str]:
+        """Call a provider's backend once admitted by the scheduler, reporting latency to the model router"""
+        async with self.scheduler.slot(lane):
+            self.model_router.start(target.key)
+            started = time.monotonic()
+            ok = None
+            try:
+                if stream:
+                    async for chunk in target.backend.stream(target.model_id, prompt):
+                        yield chunk
+                else:
+                    yield await target.backend.generate(target.model_id, prompt)
+                ok = True
+            except Exception:
+                ok = False
+                raise
+            finally:
+                self.model_router.record(target.key, len(prompt), time.monotonic() - started, ok)
+    
+    def _resolve_target(
+        self,
+        provider_agent_id: Optional[str],
+        user_message: str,
+        conversation_history: Optional[list],
+        lane: str,
+        catalog: Catalog
+    ) -> ProviderTarget:
+        """
+        Provider and model for a request
+        
+        For "auto" (with AUTO_ROUTING_ENABLED) the model router picks among
+        configured providers whose circuit breaker isn't open, using the
+        request's size and the user's tier (priority lane = premium).
+        """
+        if provider_agent_id == DEFAULT_PROVIDER_AGENT and settings.AUTO_ROUTING_ENABLED:
+            candidates = auto_candidates(
+                self.providers.catalog(catalog),
+                premium=lane == PRIORITY_LANE,
+                exclude=lambda agent: (
+                    not self.providers.is_configured(agent["provider"])
+                    or get_circuit_breaker(agent["provider"]).state == "open"
+                ),
+            )
+            prompt_chars = len(user_message) + sum(
+                len(turn.get("user_message", "")) + len(turn.get("response", ""))
+                for turn in conversation_history or []
+            )
+            chosen = self.model_router.choose(
+                {agent["id"]: f"{agent['provider']}:{agent['model_id']}" for agent in candidates},
+                prompt_chars,
+            )
+            if chosen:
+                provider_agent_id = chosen
+        return self.providers.resolve(provider_agent_id, catalog)
+    
+    def _get_fallback_target(self, primary: ProviderTarget) -> ProviderTarget:
+        """
+        Where hedge requests go
+        
+        LLM_HEDGE_FALLBACK_AGENT names a provider agent in the catalog; without
+        one (or if its provider isn't configured) the primary target is used.
+        """
+        agent_id = settings.LLM_HEDGE_FALLBACK_AGENT
+        if not agent_id:
+            return primary
+        try:
+            return self.providers.resolve(agent_id)
+        except Exception as e:
+            print(f"Hedge fallback agent {agent_id!r} unavailable, hedging with the primary model: {e}")
+            return primary
+    
+    def _get_cache_key(
+        self,
+        agent_id: str,
+        persona: str,
+        user_message: str,
+        conversation_history: Optional[list],
+        conversation_summary: Optional[str],
+        target: ProviderTarget
+    ) -> Optional[str]:
+        """Response cache key, or None if caching is off for this agent"""
+        if not self.response_cache.is_enabled_for(agent_id):
+            return None
+        return self.response_cache.make_key(
+            persona=persona,
+            model=target.key,
+            user_message=user_message,
+            conversation_history=conversation_history,
+            conversation_summary=conversation_summary
+        )
+    
+    def _prepare_prompt(
+        self,
+        agent_persona: str,
+        user_message: str,
+        conversation_history: Optional[list],
+        conversation_summary: Optional[str],
+        target: ProviderTarget
+    ) -> str:
+        """Build the prompt for an agent request"""
         # Build conversation context
-        prompt = self._build_prompt(
+        return self._build_prompt(
             agent_persona=agent_persona,
             user_message=user_message,
-            conversation_history=conversation_history or []
+            conversation_history=conversation_history or [],
+            conversation_summary=conversation_summary,
+            token_budget=get_token_budget(target.model_id)
         )
-        
-        # Generate response
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            error_msg = str(e)
-            # Provide user-friendly error messages
-            if "429" in error_msg or "quota" in error_msg.lower() or "rate limit" in error_msg.lower():
-                # Extract retry time if available
-                retry_time = None
-                if "retry" in error_msg.lower():
-                    import re
-                    retry_match = re.search(r'retry.*?(\d+\.?\d*)\s*s', error_msg, re.IGNORECASE)
-                    if retry_match:
-                        retry_time = int(float(retry_match.group(1)))
-                
-                if retry_time:
-                    return f"I apologize, but I've reached the API rate limit. Please try again in {retry_time} seconds. You may need to upgrade your Gemini API plan for higher limits."
-                else:
-                    return "I apologize, but I've reached the API rate limit. Please try again in a moment, or consider upgrading your Gemini API plan for higher limits."
-            elif "ACCESS_TOKEN_SCOPE_INSUFFICIENT" in error_msg or "insufficient authentication scopes" in error_msg:
-                return "I apologize, but there's an authentication error. Please check that the Gemini API key is properly configured in the backend."
-            elif "API_KEY_INVALID" in error_msg or "invalid API key" in error_msg.lower():
-                return "I apologize, but the API key is invalid. Please check the Gemini API key configuration."
-            else:
-                return f"I apologize, but I encountered an error: {error_msg}"
-    
-    def _get_agent_persona(self, agent_id: str) -> str:
-        """Get system prompt for agent persona"""
-        personas = {
-            "ceo_coach": """You are an experienced CEO coach with 20+ years of experience 
-            helping executives grow their businesses. Provide practical, actionable advice 
-            on leadership, strategy, and business growth.""",
-            "creative_writer": """You are a creative writing assistant. Help users 
-            brainstorm ideas, develop characters, write dialogue, and refine their 
-            creative projects.""",
-        }
-        return personas.get(agent_id, "You are a helpful AI assistant.")
     
     def _build_prompt(
         self,
         agent_persona: str,
         user_message: str,
-        conversation_history: list
+        conversation_history: list,
+        conversation_summary: Optional[str] = None,
+        token_budget: Optional[int] = None
     ) -> str:
-        """Build the full prompt with persona and conversation history"""
-        prompt_parts = [agent_persona]
-        
-        # Add conversation history
-        for msg in conversation_history[-10:]:  # Last 10 messages
-            prompt_parts.append(f"User: {msg.get('user_message', '')}")
-            prompt_parts.append(f"Assistant: {msg.get('response', '')}")
-        
-        # Add current message
-        prompt_parts.append(f"User: {user_message}")
-        prompt_parts.append("Assistant:")
-        
-        return "\n".join(prompt_parts)
+        """Build the full prompt with persona and as much history as fits the model's token budget"""
+        return self.prompt_builder.build(
+            agent_persona=agent_persona,
+            user_message=user_message,
+            conversation_history=conversation_history,
+            token_budget=token_budget if token_budget is not None else get_token_budget(settings.GEMINI_MODEL),
+            conversation_summary=conversation_summary
+        )
+
 
+# Global instance
+_gemini_service = None
+
+
+def get_gemini_service() -> GeminiService:
+    """
+    Get agent reply service instance (lazy initialization)
+    
+    Raises:
+        ValueError: If GEMINI_API_KEY is missing (and Gemini isn't overridden)
+    """
+    global _gemini_service
+    if _gemini_service is None:
+        _gemini_service = GeminiService()
+    return _gemini_service
@@ -0,0 +1,80 @@
+"""Hedged upstream requests"""
+import math
+from collections import deque
+from typing import Deque
+
+from core.config import settings
+
+# Samples needed before the percentile replaces LLM_HEDGE_DEFAULT_DELAY
+_MIN_SAMPLES = 20
+
+
+class HedgePolicy:
+    """
+    When to send a hedge request, and how many
+    
+    The hedge delay is the LLM_HEDGE_PERCENTILE of recent time-to-first-chunk
+    samples (never below LLM_HEDGE_MIN_DELAY). Hedges are paid for from a
+    token bucket that every primary call tops up by LLM_HEDGE_BUDGET, so at
+    most that fraction of calls gets an extra upstream request.
+    """
+    
+    def __init__(self, percentile: float = None, budget: float = None):
+        self.percentile = percentile if percentile is not None else settings.LLM_HEDGE_PERCENTILE
+        self.budget = budget if budget is not None else settings.LLM_HEDGE_BUDGET
+        self._samples: Deque[float] = deque(maxlen=settings.LLM_HEDGE_SAMPLES)
+        self._credit = 0.0
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_skipped = 0
+    
+    def record_first_chunk(self, seconds: float):
+        """Record how long a call took to produce its first chunk"""
+        self._samples.append(seconds)
+    
+    def delay(self) -> float:
+        """Seconds to wait for the first chunk before hedging"""
+        if len(self._samples) < _MIN_SAMPLES:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, math.ceil(len(ordered) * self.percentile / 100) - 1)
+        return max(settings.LLM_HEDGE_MIN_DELAY, ordered[index])
+    
+    def start_primary(self):
+        """Count a primary call and add its share of hedge budget"""
+        self.primaries += 1
+        # Cap the bucket so a quiet period can't bank a burst of hedges
+        self._credit = min(self._credit + self.budget, max(1.0, self.budget * 100))
+    
+    def try_hedge(self) -> bool:
+        """Spend budget on a hedge request, if there is enough"""
+        if self._credit < 1:
+            self.budget_skipped += 1
+            return False
+        self._credit -= 1
+        self.hedges += 1
+        return True
+    
+    def metrics(self) -> dict:
+        return {
+            "enabled": settings.LLM_HEDGE_ENABLED,
+            "delay_ms": round(self.delay() * 1000, 1),
+            "samples": len(self._samples),
+            "primaries": self.primaries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_skipped": self.budget_skipped,
+        }
+
+
+# Global instance
+_hedge_policy = None
+
+
+def get_hedge_policy() -> HedgePolicy:
+    """Get hedge policy instance (singleton)"""
+    global _hedge_policy
+    if _hedge_policy is None:
+        _hedge_policy = HedgePolicy()
+    return _hedge_policy
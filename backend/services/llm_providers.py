@@ -0,0 +1,353 @@
+"""LLM provider backends and routing by provider agent"""
+import asyncio
+import json
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, NamedTuple, Optional
+
+from core.config import settings
+from services.catalog import Catalog, get_catalog
+from services.resilience import UpstreamError
+
+if TYPE_CHECKING:
+    import httpx
+
+# Provider agent used when a request doesn't name one
+DEFAULT_PROVIDER_AGENT = "auto"
+
+
+class ProviderHTTPError(Exception):
+    """Error response from a provider's HTTP API"""
+    
+    def __init__(self, provider: str, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} API error {status_code}: {detail}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMBackend:
+    """Interface for an async text-generation backend"""
+    
+    name = ""
+    
+    async def generate(self, model_id: str, prompt: str) -> str:
+        """Generate a complete response"""
+        raise NotImplementedError
+    
+    def stream(self, model_id: str, prompt: str) -> AsyncIterator[str]:
+        """Generate a response chunk by chunk"""
+        raise NotImplementedError
+    
+    async def close(self):
+        """Release pooled connections"""
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini through the google-generativeai SDK"""
+    
+    name = "gemini"
+    
+    def __init__(self):
+        # Imported here: the SDK is slow to import and only needed for Gemini calls
+        import google.generativeai as genai
+        
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self._genai = genai
+        # model_id -> GenerativeModel (or a stand-in with generate_content_async)
+        self.models: Dict[str, object] = {}
+    
+    def get_model(self, model_id: str):
+        if model_id not in self.models:
+            self.models[model_id] = self._genai.GenerativeModel(model_id)
+        return self.models[model_id]
+    
+    async def generate(self, model_id: str, prompt: str) -> str:
+        response = await self.get_model(model_id).generate_content_async(prompt)
+        return response.text
+    
+    async def stream(self, model_id: str, prompt: str) -> AsyncIterator[str]:
+        response = await self.get_model(model_id).generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class _HTTPBackend(LLMBackend):
+    """Base for providers called over HTTP with one pooled client per provider"""
+    
+    def __init__(self, api_key: str, base_url: str):
+        if not api_key:
+            raise UpstreamError("unavailable", f"The {self.name} provider is not configured on this server.")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self._client: Optional["httpx.AsyncClient"] = None
+    
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """Shared connection pool (lazy initialization)"""
+        if self._client is None:
+            import httpx
+            
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers(),
+                timeout=settings.LLM_HTTP_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+                ),
+            )
+        return self._client
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _headers(self) -> dict:
+        raise NotImplementedError
+    
+    async def _raise_for_status(self, response: "httpx.Response"):
+        if response.status_code < 400:
+            return
+        await response.aread()
+        retry_after = response.headers.get("retry-after")
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            retry_after = None
+        raise ProviderHTTPError(self.name, response.status_code, response.text[:500], retry_after)
+    
+    async def _stream_events(self, path: str, payload: dict) -> AsyncIterator[dict]:
+        """POST a streaming request and yield the JSON payload of each SSE data line"""
+        async with self.client.stream("POST", path, json=payload) as response:
+            await self._raise_for_status(response)
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if not data or data == "[DONE]":
+                    continue
+                yield json.loads(data)
+
+
+class OpenAIBackend(_HTTPBackend):
+    """OpenAI Chat Completions API"""
+    
+    name = "openai"
+    
+    def __init__(self):
+        super().__init__(settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL)
+    
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}"}
+    
+    def _payload(self, model_id: str, prompt: str, stream: bool) -> dict:
+        return {
+            "model": model_id,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": settings.LLM_MAX_OUTPUT_TOKENS,
+            "stream": stream,
+        }
+    
+    async def generate(self, model_id: str, prompt: str) -> str:
+        response = await self.client.post("/chat/completions", json=self._payload(model_id, prompt, False))
+        await self._raise_for_status(response)
+        return response.json()["choices"][0]["message"]["content"] or ""
+    
+    async def stream(self, model_id: str, prompt: str) -> AsyncIterator[str]:
+        async for event in self._stream_events("/chat/completions", self._payload(model_id, prompt, True)):
+            choices = event.get("choices") or [{}]
+            text = choices[0].get("delta", {}).get("content")
+            if text:
+                yield text
+
+
+class AnthropicBackend(_HTTPBackend):
+    """Anthropic Messages API (the "claude" provider agents)"""
+    
+    name = "claude"
+    
+    def __init__(self):
+        super().__init__(settings.ANTHROPIC_API_KEY, settings.ANTHROPIC_BASE_URL)
+    
+    def _headers(self) -> dict:
+        return {"x-api-key": self.api_key, "anthropic-version": "2023-06-01"}
+    
+    def _payload(self, model_id: str, prompt: str, stream: bool) -> dict:
+        return {
+            "model": model_id,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": settings.LLM_MAX_OUTPUT_TOKENS,
+            "stream": stream,
+        }
+    
+    async def generate(self, model_id: str, prompt: str) -> str:
+        response = await self.client.post("/v1/messages", json=self._payload(model_id, prompt, False))
+        await self._raise_for_status(response)
+        return "".join(
+            block.get("text", "") for block in response.json().get("content", []) if block.get("type") == "text"
+        )
+    
+    async def stream(self, model_id: str, prompt: str) -> AsyncIterator[str]:
+        async for event in self._stream_events("/v1/messages", self._payload(model_id, prompt, True)):
+            if event.get("type") == "content_block_delta":
+                text = event.get("delta", {}).get("text")
+                if text:
+                    yield text
+
+
+class FakeBackend(LLMBackend):
+    """
+    Local stand-in for any provider (tests and benchmarks, no network)
+    
+    Echoes the last user line of the prompt word by word, waiting
+    FAKE_PROVIDER_LATENCY seconds before each chunk.
+    """
+    
+    name = "fake"
+    
+    def __init__(self, latency: float = None):
+        self.latency = latency if latency is not None else settings.FAKE_PROVIDER_LATENCY
+    
+    def _reply(self, model_id: str, prompt: str) -> str:
+        user_lines = [line for line in prompt.splitlines() if line.startswith("User: ")]
+        message = user_lines[-1][len("User: "):] if user_lines else prompt
+        return f"[{model_id}] You said: {message}"
+    
+    async def generate(self, model_id: str, prompt: str) -> str:
+        await asyncio.sleep(self.latency)
+        return self._reply(model_id, prompt)
+    
+    async def stream(self, model_id: str, prompt: str) -> AsyncIterator[str]:
+        words = self._reply(model_id, prompt).split(" ")
+        for index, word in enumerate(words):
+            await asyncio.sleep(self.latency)
+            yield word if index == len(words) - 1 else word + " "
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "openai": OpenAIBackend,
+    "claude": AnthropicBackend,
+    "fake": FakeBackend,
+}
+
+
+class ProviderTarget(NamedTuple):
+    """Where a request is sent: a provider's backend and model"""
+    provider: str
+    backend: LLMBackend
+    model_id: str
+    
+    @property
+    def key(self) -> str:
+        """Stable identity for caches and metrics, e.g. "openai:gpt-4" """
+        return f"{self.provider}:{self.model_id}"
+
+
+class ProviderRegistry:
+    """
+    Route provider agents (see services/catalog.py) to backends
+    
+    One backend instance per provider, created on first use. Provider names
+    can be pointed at another backend with LLM_PROVIDER_OVERRIDES, e.g.
+    {"*": "fake"} to run everything without network. The "auto" agent (and
+    requests without a provider agent) resolve to Gemini with GEMINI_MODEL;
+    auto routing (services/model_router.py) picks a concrete agent first.
+    """
+    
+    def __init__(self):
+        self._backends: Dict[str, LLMBackend] = {}
+    
+    def backend_name(self, provider: str) -> str:
+        """Name of the backend serving a provider (after overrides)"""
+        overrides = settings.LLM_PROVIDER_OVERRIDES
+        return overrides.get(provider, overrides.get("*", provider))
+    
+    def get_backend(self, provider: str) -> LLMBackend:
+        """Backend for a provider (after overrides)"""
+        name = self.backend_name(provider)
+        if name not in self._backends:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown LLM backend: {name}")
+            self._backends[name] = BACKENDS[name]()
+        return self._backends[name]
+    
+    def is_configured(self, provider: str) -> bool:
+        """Whether requests for a provider can be served (e.g. its API key is set)"""
+        try:
+            self.get_backend(provider)
+            return True
+        except (UpstreamError, ValueError):
+            return False
+    
+    def catalog(self, catalog: Optional[Catalog] = None) -> List[dict]:
+        """Provider agents requests may name"""
+        return (catalog or get_catalog()).provider_agents
+    
+    def check_catalog(self, catalog: Catalog):
+        """
+        Check that every provider agent names a provider with a backend
+        
+        Raises:
+            ValueError: If a provider is unknown
+        """
+        unknown = sorted({
+            agent["provider"] for agent in catalog.provider_agents
+            if agent["provider"] != DEFAULT_PROVIDER_AGENT and agent["provider"] not in BACKENDS
+        })
+        if unknown:
+            raise ValueError(f"Unknown providers: {', '.join(unknown)}")
+    
+    def default_target(self) -> ProviderTarget:
+        return ProviderTarget("gemini", self.get_backend("gemini"), settings.GEMINI_MODEL)
+    
+    def is_known(self, provider_agent_id: Optional[str], catalog: Optional[Catalog] = None) -> bool:
+        """Whether a request may name this provider agent"""
+        return (
+            not provider_agent_id
+            or provider_agent_id == DEFAULT_PROVIDER_AGENT
+            or self._get_agent(provider_agent_id, catalog) is not None
+        )
+    
+    def resolve(self, provider_agent_id: Optional[str] = None, catalog: Optional[Catalog] = None) -> ProviderTarget:
+        """
+        Backend and model for a provider agent
+        
+        Args:
+            provider_agent_id: Provider agent ID (None or "auto" = default Gemini)
+            catalog: Catalog snapshot to look it up in (default: the current one)
+        
+        Raises:
+            ValueError: If the provider agent doesn't exist
+            UpstreamError: If its provider isn't configured (no API key)
+        """
+        if not provider_agent_id or provider_agent_id == DEFAULT_PROVIDER_AGENT:
+            return self.default_target()
+        agent = self._get_agent(provider_agent_id, catalog)
+        if agent is None:
+            raise ValueError(f"Unknown provider agent: {provider_agent_id}")
+        provider = agent["provider"]
+        return ProviderTarget(provider, self.get_backend(provider), agent["model_id"])
+    
+    def _get_agent(self, provider_agent_id: str, catalog: Optional[Catalog] = None) -> Optional[dict]:
+        return (catalog or get_catalog()).get_provider_agent(provider_agent_id)
+    
+    async def close(self):
+        """Close pooled HTTP clients (on shutdown)"""
+        for backend in self._backends.values():
+            try:
+                await backend.close()
+            except Exception as e:
+                print(f"Error closing {backend.name} client: {e}")
+
+
+# Global instance
+_provider_registry = None
+
+
+def get_provider_registry() -> ProviderRegistry:
+    """Get provider registry instance (singleton)"""
+    global _provider_registry
+    if _provider_registry is None:
+        _provider_registry = ProviderRegistry()
+    return _provider_registry
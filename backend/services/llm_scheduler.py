@@ -0,0 +1,139 @@
+"""Admission control for upstream LLM calls"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+
+from core.config import settings
+
+PRIORITY_LANE = "priority"  # premium users and unlimited-tier subscribers
+STANDARD_LANE = "standard"
+LANES = (PRIORITY_LANE, STANDARD_LANE)  # dequeue order
+
+
+class UpstreamBusyError(Exception):
+    """Raised when an upstream call can't be admitted (queue full or wait too long)"""
+
+
+class LLMScheduler:
+    """
+    Bound concurrent upstream calls per worker
+    
+    At most LLM_MAX_CONCURRENCY calls run at once. Further calls wait in a
+    per-lane FIFO queue; whenever a slot frees up the priority lane is served
+    before the standard lane. Calls are rejected with UpstreamBusyError when
+    LLM_MAX_QUEUE calls are already waiting or after waiting longer than
+    LLM_QUEUE_TIMEOUT seconds.
+    """
+    
+    def __init__(self, max_concurrency: int = None, max_queue: int = None, queue_timeout: float = None):
+        self.max_concurrency = max_concurrency if max_concurrency is not None else settings.LLM_MAX_CONCURRENCY
+        self.max_queue = max_queue if max_queue is not None else settings.LLM_MAX_QUEUE
+        self.queue_timeout = queue_timeout if queue_timeout is not None else settings.LLM_QUEUE_TIMEOUT
+        self._active = 0
+        self._queues: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self._stats = {
+            lane: {"admitted": 0, "rejected": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for lane in LANES
+        }
+    
+    @asynccontextmanager
+    async def slot(self, lane: str = STANDARD_LANE):
+        """
+        Hold an upstream slot for the duration of the block
+        
+        Raises:
+            UpstreamBusyError: If the call can't be admitted
+        """
+        if lane not in self._queues:
+            lane = STANDARD_LANE
+        await self._acquire(lane)
+        try:
+            yield
+        finally:
+            self._release()
+    
+    @property
+    def queued(self) -> int:
+        """Calls waiting for a slot"""
+        return self._queued()
+    
+    def metrics(self) -> dict:
+        """Concurrency in use and queue-wait statistics per lane"""
+        lanes = {}
+        for lane in LANES:
+            stats = self._stats[lane]
+            admitted = stats["admitted"]
+            lanes[lane] = {
+                "queued": len(self._queues[lane]),
+                "admitted": admitted,
+                "rejected": stats["rejected"],
+                "avg_wait_ms": round(stats["wait_total"] / admitted * 1000, 2) if admitted else 0.0,
+                "max_wait_ms": round(stats["wait_max"] * 1000, 2),
+            }
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "lanes": lanes,
+        }
+    
+    async def _acquire(self, lane: str):
+        stats = self._stats[lane]
+        if self._active < self.max_concurrency and not self._queued():
+            self._active += 1
+            stats["admitted"] += 1
+            return
+        
+        if self._queued() >= self.max_queue:
+            stats["rejected"] += 1
+            raise UpstreamBusyError("Upstream queue is full")
+        
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self._queues[lane]
+        queue.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed to us just as we gave up; pass it on
+                self._release()
+            elif waiter in queue:
+                queue.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                stats["rejected"] += 1
+                raise UpstreamBusyError("Timed out waiting for an upstream slot")
+            raise
+        
+        waited = time.monotonic() - started
+        stats["admitted"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+    
+    def _release(self):
+        # Hand the slot straight to the next waiter, highest lane first
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self._active -= 1
+    
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+
+# Global instance
+_llm_scheduler = None
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Get upstream scheduler instance (singleton)"""
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        _llm_scheduler = LLMScheduler()
+    return _llm_scheduler
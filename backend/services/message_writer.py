@@ -0,0 +1,205 @@
+"""Write-behind persistence for chat messages"""
+import asyncio
+import time
+from collections import Counter
+from typing import List, Optional
+
+from core.config import settings
+from core.datastore import get_datastore
+from services.rate_limiter import get_rate_limiter
+
+MESSAGES_COLLECTION = "messages"
+
+# Queued by stop() to tell the flush loop to drain and exit
+_STOP = object()
+
+
+class MessageWriter:
+    """
+    Queue chat messages and flush them to the data store in batches
+    
+    Handlers enqueue a message and reply immediately; a background task
+    writes queued messages in one batched write once MESSAGE_BATCH_SIZE
+    messages are waiting or MESSAGE_FLUSH_INTERVAL seconds have passed,
+    then adds them to their users' usage counters (one write per user).
+    The queue is bounded: when it is full, enqueue waits (backpressure).
+    """
+    
+    def __init__(self, store=None, rate_limiter=None):
+        self._store = store
+        self._rate_limiter = rate_limiter
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        # Metrics
+        self.enqueued = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+    
+    @property
+    def store(self):
+        """Data store (defaults to the shared process-wide store)"""
+        if self._store is None:
+            self._store = get_datastore()
+        return self._store
+    
+    @property
+    def rate_limiter(self):
+        """Usage counters (defaults to the shared rate limiter)"""
+        if self._rate_limiter is None:
+            self._rate_limiter = get_rate_limiter()
+        return self._rate_limiter
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        """Start the background flush task"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.MESSAGE_QUEUE_MAX)
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Flush everything still queued and stop the flush task"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+    
+    async def enqueue(self, message: dict):
+        """
+        Queue a message for persistence
+        
+        Waits while the queue is full. If the writer isn't running (e.g. in a
+        script without the app lifespan), the message is written directly.
+        """
+        self.enqueued += 1
+        if not self.running:
+            await self._flush([message])
+            return
+        await self._queue.put(message)
+    
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+    
+    def metrics(self) -> dict:
+        """Queue depth and flush statistics"""
+        return {
+            "queue_depth": self.queue_depth,
+            "queue_capacity": settings.MESSAGE_QUEUE_MAX,
+            "pending": self.enqueued - self.flushed - self.failed,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_flush_latency_ms": round(self.last_flush_latency * 1000, 2),
+            "avg_flush_latency_ms": round(self._total_flush_latency / self.batches * 1000, 2) if self.batches else 0.0,
+            "max_flush_latency_ms": round(self.max_flush_latency * 1000, 2),
+        }
+    
+    async def _run(self):
+        """Collect messages into batches and flush them until stopped"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + settings.MESSAGE_FLUSH_INTERVAL
+            
+            while len(batch) < settings.MESSAGE_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            await self._flush(batch)
+    
+    async def _flush(self, batch: List[dict]):
+        """Write one batch, retrying once before giving up"""
+        if not self.store.available:
+            # Persistence is optional - drop quietly when Firestore isn't configured
+            self.failed += len(batch)
+            return
+        
+        started = time.perf_counter()
+        for attempt in range(2):
+            try:
+                await self.store.add_many(MESSAGES_COLLECTION, batch)
+                self.flushed += len(batch)
+                break
+            except Exception as e:
+                if attempt == 0:
+                    await asyncio.sleep(0.5)
+                    continue
+                self.failed += len(batch)
+                _log_persist_error(e)
+        
+        await self._record_usage(batch)
+        
+        latency = time.perf_counter() - started
+        self.batches += 1
+        self.last_flush_latency = latency
+        self._total_flush_latency += latency
+        self.max_flush_latency = max(self.max_flush_latency, latency)
+    
+    async def _record_usage(self, batch: List[dict]):
+        """Count a batch's messages against their users' rate limits"""
+        messages_per_user = Counter(message["user_id"] for message in batch)
+        results = await asyncio.gather(
+            *(self.rate_limiter.increment_usage(user_id, count) for user_id, count in messages_per_user.items()),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Failed to update rate limiter (continuing anyway): {result}")
+                break
+
+
+def _log_persist_error(e: Exception):
+    """Log a persistence failure once per kind (Firestore is optional)"""
+    error_str = str(e)
+    # Check for database existence error FIRST (most common after API is enabled)
+    if "does not exist" in error_str or ("404" in error_str and "database" in error_str.lower()):
+        # Database doesn't exist - need to create it
+        if not hasattr(_log_persist_error, '_firestore_db_warning_logged'):
+            print("⚠️  Firestore database doesn't exist. Messages won't be persisted. Create database at: https://console.firebase.google.com/project/agentchat-f7eb8/firestore")
+            _log_persist_error._firestore_db_warning_logged = True
+    elif "SERVICE_DISABLED" in error_str or ("firestore.googleapis.com" in error_str and "not been used" in error_str):
+        # API not enabled
+        if not hasattr(_log_persist_error, '_firestore_warning_logged'):
+            print("⚠️  Firestore API not enabled. Messages won't be persisted. Enable at: https://console.developers.google.com/apis/api/firestore.googleapis.com/overview?project=agentchat-f7eb8")
+            _log_persist_error._firestore_warning_logged = True
+    else:
+        # Other errors - log once
+        if not hasattr(_log_persist_error, '_firestore_other_warning_logged'):
+            print(f"⚠️  Failed to save message to Firestore (continuing anyway): {e}")
+            _log_persist_error._firestore_other_warning_logged = True
+
+
+# Global instance
+_message_writer = None
+
+
+def get_message_writer() -> MessageWriter:
+    """Get message writer instance (singleton)"""
+    global _message_writer
+    if _message_writer is None:
+        _message_writer = MessageWriter()
+    return _message_writer
@@ -0,0 +1,191 @@
+"""Latency-aware routing for the "auto" provider agent"""
+import random
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from core.config import settings
+
+# Prompt-size buckets; models are compared on requests of similar size
+SHORT = "short"
+LONG = "long"
+
+
+class ModelStats:
+    """Rolling latency and error statistics for one model and prompt-size bucket"""
+    
+    def __init__(self):
+        self.count = 0
+        self.ewma_latency = 0.0
+        self.ewma_error = 0.0
+        self.p95 = 0.0
+        self._recent: Deque[float] = deque(maxlen=settings.AUTO_ROUTING_SAMPLES)
+    
+    def record(self, latency: Optional[float], ok: bool):
+        alpha = settings.AUTO_ROUTING_EWMA_ALPHA
+        self.ewma_error = float(not ok) if self.count == 0 else (1 - alpha) * self.ewma_error + alpha * (not ok)
+        if latency is not None:
+            if not self._recent:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = (1 - alpha) * self.ewma_latency + alpha * latency
+            self._recent.append(latency)
+            ordered = sorted(self._recent)
+            self.p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        self.count += 1
+    
+    @property
+    def has_latency(self) -> bool:
+        return bool(self._recent)
+    
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1),
+            "p95_latency_ms": round(self.p95 * 1000, 1),
+            "error_rate": round(self.ewma_error, 4),
+        }
+
+
+class ModelRouter:
+    """
+    Pick a model for "auto" requests from rolling per-model statistics
+    
+    Every upstream call reports its latency and outcome. A candidate's score
+    is its expected latency (EWMA, pulled towards p95 by
+    AUTO_ROUTING_TAIL_WEIGHT) for the request's prompt-size bucket, inflated
+    by its recent error rate and by how many calls it already has in flight.
+    The lowest score wins, so traffic drifts away from slow or throttled
+    models. Models without samples are scored at AUTO_ROUTING_PRIOR_LATENCY,
+    and AUTO_ROUTING_EXPLORE of requests go to a random candidate so stale
+    statistics get refreshed.
+    """
+    
+    def __init__(self, clock: Callable[[], float] = time.monotonic, rng: random.Random = None):
+        self.clock = clock
+        self.rng = rng or random.Random()
+        # (model key, bucket) -> stats
+        self._stats: Dict[tuple, ModelStats] = {}
+        self._in_flight: Dict[str, int] = {}
+        # model key -> completion times within AUTO_ROUTING_WINDOW
+        self._completions: Dict[str, Deque[float]] = {}
+        self.decisions: Dict[str, int] = {}
+    
+    @staticmethod
+    def bucket(prompt_chars: int) -> str:
+        return LONG if prompt_chars >= settings.AUTO_ROUTING_LONG_PROMPT_CHARS else SHORT
+    
+    def choose(self, candidates: Dict[str, str], prompt_chars: int) -> Optional[str]:
+        """
+        Pick a candidate
+        
+        Args:
+            candidates: Provider agent ID -> model key (see ProviderTarget.key)
+            prompt_chars: Approximate prompt size of the request
+        
+        Returns:
+            Chosen provider agent ID, or None if there are no candidates
+        """
+        if not candidates:
+            return None
+        if len(candidates) > 1 and self.rng.random() < settings.AUTO_ROUTING_EXPLORE:
+            choice = self.rng.choice(list(candidates))
+        else:
+            bucket = self.bucket(prompt_chars)
+            choice = min(candidates, key=lambda agent_id: self.score(candidates[agent_id], bucket))
+        self.decisions[choice] = self.decisions.get(choice, 0) + 1
+        return choice
+    
+    def score(self, key: str, bucket: str) -> float:
+        """Expected cost of sending a request of this bucket to a model (lower is better)"""
+        stats = self._stats.get((key, bucket))
+        if stats is None or not stats.has_latency:
+            # Fall back to the other bucket before the prior
+            stats = self._stats.get((key, SHORT if bucket == LONG else LONG))
+        if stats is not None and stats.has_latency:
+            latency = stats.ewma_latency + settings.AUTO_ROUTING_TAIL_WEIGHT * max(0.0, stats.p95 - stats.ewma_latency)
+            error_rate = stats.ewma_error
+        else:
+            latency = settings.AUTO_ROUTING_PRIOR_LATENCY
+            error_rate = stats.ewma_error if stats is not None else 0.0
+        load = self._in_flight.get(key, 0) / settings.AUTO_ROUTING_LOAD_SCALE
+        return latency * (1 + settings.AUTO_ROUTING_ERROR_PENALTY * error_rate) * (1 + load)
+    
+    def start(self, key: str):
+        """A call to this model started"""
+        self._in_flight[key] = self._in_flight.get(key, 0) + 1
+    
+    def record(self, key: str, prompt_chars: int, latency: Optional[float], ok: Optional[bool]):
+        """
+        A call to this model ended
+        
+        Args:
+            latency: Seconds the call took (None if unknown, e.g. it failed)
+            ok: Whether it succeeded; None if it was cancelled (no outcome)
+        """
+        self._in_flight[key] = max(0, self._in_flight.get(key, 0) - 1)
+        if ok is None:
+            return
+        stats = self._stats.setdefault((key, self.bucket(prompt_chars)), ModelStats())
+        stats.record(latency if ok else None, ok)
+        if ok:
+            completions = self._completions.setdefault(key, deque())
+            completions.append(self.clock())
+    
+    def throughput(self, key: str) -> float:
+        """Completed calls per second over AUTO_ROUTING_WINDOW"""
+        completions = self._completions.get(key)
+        if not completions:
+            return 0.0
+        cutoff = self.clock() - settings.AUTO_ROUTING_WINDOW
+        while completions and completions[0] < cutoff:
+            completions.popleft()
+        return len(completions) / settings.AUTO_ROUTING_WINDOW
+    
+    def metrics(self) -> dict:
+        models: Dict[str, dict] = {}
+        for (key, bucket), stats in self._stats.items():
+            models.setdefault(key, {})[bucket] = stats.to_dict()
+        for key, model in models.items():
+            model["in_flight"] = self._in_flight.get(key, 0)
+            model["throughput_per_s"] = round(self.throughput(key), 3)
+        return {
+            "enabled": settings.AUTO_ROUTING_ENABLED,
+            "decisions": dict(self.decisions),
+            "models": models,
+        }
+
+
+def auto_candidates(catalog: List[dict], premium: bool, exclude: Callable[[dict], bool] = None) -> List[dict]:
+    """
+    Provider agents "auto" may route a request to
+    
+    AUTO_ROUTING_CANDIDATES restricts the pool (empty = every provider agent
+    except "auto"); AUTO_ROUTING_PREMIUM_AGENTS are only used for premium users.
+    """
+    allowed = set(settings.AUTO_ROUTING_CANDIDATES)
+    premium_only = set(settings.AUTO_ROUTING_PREMIUM_AGENTS)
+    candidates = []
+    for agent in catalog:
+        if agent["provider"] == "auto":
+            continue
+        if allowed and agent["id"] not in allowed:
+            continue
+        if agent["id"] in premium_only and not premium:
+            continue
+        if exclude is not None and exclude(agent):
+            continue
+        candidates.append(agent)
+    return candidates
+
+
+# Global instance
+_model_router = None
+
+
+def get_model_router() -> ModelRouter:
+    """Get auto-routing instance (singleton)"""
+    global _model_router
+    if _model_router is None:
+        _model_router = ModelRouter()
+    return _model_router
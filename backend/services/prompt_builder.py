@@ -0,0 +1,81 @@
+"""Token-budget-aware prompt assembly"""
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+from core.config import settings
+
+# Words and individual punctuation marks
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Roughly how many characters of a word one model token covers
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=settings.PROMPT_TOKEN_CACHE_SIZE)
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate the model token count of a text
+    
+    A local approximation of a subword tokenizer: every punctuation mark is one
+    token and words cost one token per ~4 characters. Counts are cached per
+    text, so history turns are only counted once.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        tokens += -(-len(piece) // _CHARS_PER_TOKEN)  # ceil division
+    return tokens
+
+
+def get_token_budget(model: str) -> int:
+    """Prompt token budget for a model (per-model override or the default)"""
+    return settings.PROMPT_TOKEN_BUDGETS.get(model, settings.PROMPT_TOKEN_BUDGET)
+
+
+class PromptBuilder:
+    """
+    Build prompts that fit a token budget
+    
+    The persona, the running conversation summary (if any) and the current
+    message are always included. History turns are then packed newest-first
+    until the next turn would exceed the budget, so long messages can't blow
+    up prompt size and short chats keep more context.
+    """
+    
+    def build(
+        self,
+        agent_persona: str,
+        user_message: str,
+        conversation_history: List[dict],
+        token_budget: Optional[int] = None,
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """Build the full prompt with persona and as much history as fits"""
+        if token_budget is None:
+            token_budget = settings.PROMPT_TOKEN_BUDGET
+        
+        header = [agent_persona]
+        if conversation_summary:
+            header.append(f"Summary of the earlier conversation: {conversation_summary}")
+        current = [f"User: {user_message}", "Assistant:"]
+        used = sum(estimate_tokens(line) for line in header + current)
+        
+        # Pack history newest-first, keeping it contiguous
+        history_parts = []
+        for msg in reversed(conversation_history):
+            turn = [
+                f"User: {msg.get('user_message', '')}",
+                f"Assistant: {msg.get('response', '')}",
+            ]
+            cost = sum(estimate_tokens(line) for line in turn)
+            if used + cost > token_budget:
+                break
+            used += cost
+            history_parts.append(turn)
+        
+        prompt_parts = header
+        for turn in reversed(history_parts):
+            prompt_parts.extend(turn)
+        prompt_parts.extend(current)
+        
+        return "\n".join(prompt_parts)
@@ -1,28 +1,30 @@
 """Rate limiting service"""
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from core.config import settings
-from core.firebase import get_firestore_client
-from typing import Dict
+from core.datastore import get_datastore, Increment, SERVER_TIMESTAMP
+from typing import Dict, Optional, Tuple
+
+# Per-user message counters: usage_counters/{user_id}.periods.{tier}_{YYYYMMDD}
+USAGE_COUNTERS_COLLECTION = "usage_counters"
+TIERS = ("weekly", "monthly", "annual")
 
 
 class RateLimiter:
     """Service for checking and enforcing rate limits"""
     
-    def __init__(self):
-        self._db = None
+    def __init__(self, store=None):
+        self._store = store
+        # user_id -> (expires_at, subscription tier or None) from the last read, LRU ordered
+        self._tiers: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
     
     @property
-    def db(self):
-        """Lazy initialization of Firestore client"""
-        if self._db is None:
-            try:
-                self._db = get_firestore_client()
-            except Exception as e:
-                # Firestore not available - return None to indicate unavailable
-                if "SERVICE_DISABLED" in str(e) or "firestore.googleapis.com" in str(e):
-                    print("⚠️  Firestore API not enabled. Rate limiting disabled. Enable at: https://console.developers.google.com/apis/api/firestore.googleapis.com/overview?project=agentchat-f7eb8")
-                raise
-        return self._db
+    def store(self):
+        """Data store (defaults to the shared process-wide store)"""
+        if self._store is None:
+            self._store = get_datastore()
+        return self._store
     
     async def check_limit(self, user_id: str) -> bool:
         """
@@ -32,28 +34,29 @@ class RateLimiter:
             True if user can send message, False otherwise
         """
         try:
-            # Try to get Firestore client - if it fails, allow messages
-            try:
-                db = self.db
-            except Exception:
-                # Firestore not available - allow messages
+            # If the data store isn't available, allow messages
+            if not self.store.available:
                 return True
             
-            # Get user's subscription tier
-            subscription = await self._get_subscription(user_id)
+            # Fetch subscription and message counters in one round-trip
+            subscription, counters = await self._get_subscription_and_counters(user_id)
             
             # If no subscription found, allow messages (for development/testing)
             # In production, you'd want to check subscription status
             if not subscription:
+                self._remember_tier(user_id, None)
                 return True  # Allow for now - implement subscription check later
             
+            tier = subscription.get("tier", "weekly")
+            self._remember_tier(user_id, tier)
+            limit = self._get_limit_for_tier(tier)
+            if limit == float("inf"):
+                return True
+            
             # Get message count for current period
-            period_start = self._get_period_start(subscription.get("tier", "weekly"))
-            message_count = await self._get_message_count(user_id, period_start)
+            message_count = counters.get(self.get_period_id(tier), 0)
             
             # Check against limit
-            limit = self._get_limit_for_tier(subscription.get("tier", "weekly"))
-            
             return message_count < limit
         except Exception as e:
             # If there's an error checking limits, allow the message
@@ -62,16 +65,72 @@ class RateLimiter:
                 print(f"Error checking rate limit: {e}")
             return True
     
+    def has_unlimited_tier(self, user_id: str) -> bool:
+        """Whether the user's cached tier has no message limit (no data store read)"""
+        tier = self._cached_tier(user_id)
+        return tier is not None and self._get_limit_for_tier(tier) == float("inf")
+    
+    async def load_tier(self, user_id: str) -> Optional[str]:
+        """
+        Read and remember the user's subscription tier (for has_unlimited_tier)
+        
+        A tier read less than TIER_CACHE_TTL seconds ago is reused.
+        
+        Returns:
+            The tier, or None without a subscription or data store
+        """
+        cached = self._tiers.get(user_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        try:
+            if not self.store.available:
+                return None
+            subscription = await self._get_subscription(user_id)
+        except Exception as e:
+            print(f"Error loading subscription tier: {e}")
+            return None
+        tier = subscription.get("tier", "weekly") if subscription else None
+        self._remember_tier(user_id, tier)
+        return tier
+    
+    def _cached_tier(self, user_id: str) -> Optional[str]:
+        cached = self._tiers.get(user_id)
+        if cached is None:
+            return None
+        expires_at, tier = cached
+        if expires_at <= time.monotonic():
+            # A downgrade must not keep the old tier's priority
+            del self._tiers[user_id]
+            return None
+        return tier
+    
+    def _remember_tier(self, user_id: str, tier: Optional[str]):
+        self._tiers[user_id] = (time.monotonic() + settings.TIER_CACHE_TTL, tier)
+        self._tiers.move_to_end(user_id)
+        while len(self._tiers) > settings.TOKEN_CACHE_MAX_USERS:
+            self._tiers.popitem(last=False)
+    
     async def _get_subscription(self, user_id: str) -> Dict:
         """Get user's subscription info"""
-        doc = self.db.collection("subscriptions").document(user_id).get()
-        if doc.exists:
-            return doc.to_dict()
-        return None
+        return await self.store.get("subscriptions", user_id)
+    
+    async def _get_subscription_and_counters(self, user_id: str) -> Tuple[Optional[Dict], Dict[str, int]]:
+        """
+        Get subscription info and the user's period counters in one batched read
+        
+        Returns:
+            Tuple of (subscription dict or None, {period_id: message count})
+        """
+        subscription, counter_doc = await self.store.get_many([
+            ("subscriptions", user_id),
+            (USAGE_COUNTERS_COLLECTION, user_id),
+        ])
+        counters = counter_doc.get("periods", {}) if counter_doc else {}
+        return subscription, counters
     
-    def _get_period_start(self, tier: str) -> datetime:
-        """Get start of current billing period"""
-        now = datetime.utcnow()
+    def _get_period_start(self, tier: str, now: Optional[datetime] = None) -> datetime:
+        """Get start of the billing period containing `now` (defaults to current time)"""
+        now = now or datetime.utcnow()
         if tier == "weekly":
             return now - timedelta(days=now.weekday())
         elif tier == "monthly":
@@ -80,14 +139,13 @@ class RateLimiter:
             return now.replace(month=1, day=1)
         return now
     
-    async def _get_message_count(self, user_id: str, period_start: datetime) -> int:
-        """Get message count for user in current period"""
-        messages_ref = self.db.collection("messages")
-        query = messages_ref.where("user_id", "==", user_id).where(
-            "timestamp", ">=", period_start
-        )
-        docs = query.stream()
-        return sum(1 for _ in docs)
+    def get_period_id(self, tier: str, at: Optional[datetime] = None) -> str:
+        """
+        Get counter key for the billing period containing `at`
+        
+        e.g. "weekly_20240108", "monthly_20240101", "annual_20240101"
+        """
+        return f"{tier}_{self._get_period_start(tier, at).strftime('%Y%m%d')}"
     
     def _get_limit_for_tier(self, tier: str) -> int:
         """Get message limit for subscription tier"""
@@ -98,9 +156,29 @@ class RateLimiter:
         }
         return limits.get(tier, settings.MESSAGE_RATE_LIMIT)
     
-    async def increment_usage(self, user_id: str):
-        """Increment message usage counter for user"""
-        # This would typically update a counter in Firestore
-        # For now, it's a placeholder
-        pass
+    async def increment_usage(self, user_id: str, count: int = 1):
+        """
+        Increment message usage counters for user by `count` messages
+        
+        The current period of every tier is incremented in a single atomic
+        write, so a tier change mid-period still sees an accurate count.
+        """
+        await self.store.set(USAGE_COUNTERS_COLLECTION, user_id, {
+            "user_id": user_id,
+            "periods": {
+                self.get_period_id(tier): Increment(count) for tier in TIERS
+            },
+            "updated_at": SERVER_TIMESTAMP,
+        }, merge=True)
+
+
+# Lazy initialization - will be created on first use
+_rate_limiter = None
+
 
+def get_rate_limiter() -> RateLimiter:
+    """Get rate limiter instance (lazy initialization)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
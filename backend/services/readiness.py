@@ -0,0 +1,161 @@
+"""Cached dependency health and load shedding for /health/ready"""
+import asyncio
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from core.config import settings
+from core.datastore import get_datastore
+from services.llm_scheduler import get_llm_scheduler
+from services.gemini_service import get_gemini_service
+from services.message_writer import get_message_writer
+from services.resilience import get_circuit_breaker
+from services.warmup import build_default_model, get_warmup
+
+# Document read by the Firestore check (it doesn't need to exist)
+PROBE_COLLECTION = "_health"
+PROBE_DOCUMENT = "readiness"
+
+# () -> (in use, capacity)
+LoadGauge = Callable[[], Tuple[int, int]]
+
+
+class ReadinessChecker:
+    """
+    Decide whether this worker should receive traffic
+    
+    Dependency checks (a Firestore read, building the default LLM backend's
+    client) run in the background every READINESS_CHECK_INTERVAL
+    seconds and their results are cached, so a probe only reads local state
+    and never calls upstream services. A probe also fails while any load
+    gauge (LLM queue, message write queue, WebSocket connections) is at
+    READINESS_SATURATION_RATIO of its capacity, so the load balancer sheds
+    traffic to other workers.
+    
+    Upstream circuit breakers are reported but don't fail readiness: a
+    provider outage opens them on every worker at once, and taking all
+    replicas out of the load balancer would only turn degraded replies
+    into connection errors.
+    """
+    
+    def __init__(self):
+        self.checks: Dict[str, dict] = {}  # check -> {"ok", "latency_ms", "error"}
+        self.checked_at: Optional[float] = None
+        self.gauges: Dict[str, LoadGauge] = {
+            "llm_queue": lambda: (get_llm_scheduler().queued, get_llm_scheduler().max_queue),
+            "message_queue": lambda: (get_message_writer().queue_depth, settings.MESSAGE_QUEUE_MAX),
+        }
+        self.not_ready = 0  # probes answered 503
+    
+    def add_gauge(self, name: str, gauge: LoadGauge):
+        """Also shed traffic when this gauge is saturated"""
+        self.gauges[name] = gauge
+    
+    async def check(self):
+        """Run every dependency check once and cache the results"""
+        self.checks = {
+            "datastore": await self._check("datastore", self._check_datastore()),
+            "llm": await self._check("llm", asyncio.to_thread(self._check_llm)),
+        }
+        self.checked_at = time.monotonic()
+    
+    async def run(self):
+        """Re-check dependencies periodically (run as a background task)"""
+        # Checks during warmup would only measure SDK imports
+        await get_warmup().wait()
+        while True:
+            await self.check()
+            await asyncio.sleep(settings.READINESS_CHECK_INTERVAL)
+    
+    def status(self) -> dict:
+        """
+        Readiness from cached checks and current load
+        
+        Returns:
+            {"ready", "status", "checks", "checked_seconds_ago", "load"}; status
+            is "ready", "warming_up", "unhealthy" or "saturated"
+        """
+        load = {}
+        saturated = False
+        for name, gauge in self.gauges.items():
+            used, capacity = gauge()
+            full = capacity > 0 and used >= capacity * settings.READINESS_SATURATION_RATIO
+            saturated = saturated or full
+            load[name] = {"used": used, "capacity": capacity, "saturated": full}
+        
+        # A checker that stopped running can't vouch for dependencies
+        stale = self.checked_at is not None and (
+            time.monotonic() - self.checked_at > 3 * settings.READINESS_CHECK_INTERVAL
+        )
+        if not get_warmup().done or self.checked_at is None:
+            status = "warming_up"
+        elif stale or not all(check["ok"] for check in self.checks.values()):
+            status = "unhealthy"
+        elif saturated:
+            status = "saturated"
+        else:
+            status = "ready"
+        if status != "ready":
+            self.not_ready += 1
+        return {
+            "ready": status == "ready",
+            "status": status,
+            "checks": self.checks,
+            "checked_seconds_ago": round(time.monotonic() - self.checked_at, 1) if self.checked_at else None,
+            "load": load,
+        }
+    
+    def metrics(self) -> dict:
+        return {
+            "checks": self.checks,
+            "not_ready_probes": self.not_ready,
+        }
+    
+    async def _check(self, name: str, awaitable) -> dict:
+        started = time.monotonic()
+        error = None
+        details = None
+        try:
+            details = await asyncio.wait_for(awaitable, timeout=settings.READINESS_CHECK_TIMEOUT)
+        except asyncio.TimeoutError:
+            error = f"timed out after {settings.READINESS_CHECK_TIMEOUT}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        if error is not None and self.checks.get(name, {}).get("ok", True):
+            print(f"Readiness check {name} failed: {error}")
+        return {
+            "ok": error is None,
+            "latency_ms": round((time.monotonic() - started) * 1000, 1),
+            "error": error,
+            **(details or {}),
+        }
+    
+    async def _check_datastore(self):
+        store = get_datastore()
+        if not store.available:
+            raise RuntimeError("data store client is not available")
+        await store.get(PROBE_COLLECTION, PROBE_DOCUMENT)
+    
+    def _check_llm(self) -> dict:
+        """
+        The default LLM backend's client builds (no upstream call)
+        
+        Retries the warmup step, so a worker whose warmup failed stays
+        unready until the client can actually be built.
+        """
+        build_default_model()
+        if get_warmup().errors.pop("llm", None) is not None:
+            print("LLM backend recovered after a failed warmup")
+        target = get_gemini_service().providers.default_target()
+        return {"circuit_breaker": get_circuit_breaker(target.provider).state}
+
+
+# Global instance
+_readiness_checker = None
+
+
+def get_readiness_checker() -> ReadinessChecker:
+    """Get readiness checker instance (singleton)"""
+    global _readiness_checker
+    if _readiness_checker is None:
+        _readiness_checker = ReadinessChecker()
+    return _readiness_checker
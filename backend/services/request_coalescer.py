@@ -0,0 +1,147 @@
+"""Single-flight coalescing of identical in-flight generations"""
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from core.config import settings
+
+
+class _Flight:
+    """One upstream generation and the chunks it has produced so far"""
+    
+    def __init__(self, key: str):
+        self.key = key
+        self.chunks: List[str] = []
+        self.error: Optional[Exception] = None
+        self.done = False
+        self.waiters = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+    
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+    
+    def finish(self, error: Optional[Exception] = None):
+        self.error = error
+        self.done = True
+        self._notify()
+    
+    def _notify(self):
+        # Wake everyone waiting on the current event, then arm a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+    
+    async def follow(self) -> AsyncIterator[str]:
+        """Replay chunks produced so far, then yield new ones as they arrive"""
+        index = 0
+        while True:
+            if index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class RequestCoalescer:
+    """
+    Share one upstream call between identical concurrent requests
+    
+    The first request for a key starts the generation in a background task;
+    requests with the same key that arrive while it is in flight follow the
+    same chunk stream (from the start) instead of calling upstream again.
+    A flight takes at most COALESCE_MAX_WAITERS consumers; past that a new
+    flight is started for later arrivals. If every consumer goes away
+    before the generation finishes, it is cancelled.
+    """
+    
+    def __init__(self, max_waiters: int = None):
+        self.max_waiters = max_waiters if max_waiters is not None else settings.COALESCE_MAX_WAITERS
+        self._flights: Dict[str, _Flight] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.overflow = 0
+    
+    def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Stream the generation for `key`, joining an in-flight one if possible
+        
+        Args:
+            key: Identity of the request (same key = same upstream output)
+            factory: Starts the upstream generation when no flight can be joined
+        
+        Returns:
+            Async iterator of response chunks; upstream errors are re-raised
+            to every consumer. Nothing is joined or started until it is
+            iterated, so a caller that never iterates holds no seat.
+        """
+        return self._consume(key, factory)
+    
+    def metrics(self) -> dict:
+        """Upstream calls made and calls saved by coalescing"""
+        return {
+            "enabled": settings.COALESCE_ENABLED,
+            "in_flight": len(self._flights),
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "overflow": self.overflow,
+        }
+    
+    def _join(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> _Flight:
+        """The in-flight generation for `key` with a free seat, or a new one"""
+        flight = self._flights.get(key)
+        if flight is not None and flight.waiters < self.max_waiters:
+            self.coalesced += 1
+            return flight
+        if flight is not None:
+            self.overflow += 1
+        flight = _Flight(key)
+        self._flights[key] = flight
+        self.upstream_calls += 1
+        flight.task = asyncio.create_task(self._run(flight, factory))
+        return flight
+    
+    async def _consume(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        # The seat is taken and given back inside the consuming generator, so
+        # a consumer that is cancelled or closed early always frees it
+        flight = self._join(key, factory)
+        flight.waiters += 1
+        try:
+            async for chunk in flight.follow():
+                yield chunk
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.done and flight.task is not None:
+                # Nobody is listening any more; don't let new requests join it
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+                flight.task.cancel()
+    
+    async def _run(self, flight: _Flight, factory: Callable[[], AsyncIterator[str]]):
+        try:
+            async for chunk in factory():
+                flight.publish(chunk)
+            flight.finish()
+        except asyncio.CancelledError:
+            flight.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+
+# Global instance
+_request_coalescer = None
+
+
+def get_request_coalescer() -> RequestCoalescer:
+    """Get request coalescer instance (singleton)"""
+    global _request_coalescer
+    if _request_coalescer is None:
+        _request_coalescer = RequestCoalescer()
+    return _request_coalescer
@@ -0,0 +1,280 @@
+"""Retry and circuit breaking for upstream LLM calls"""
+import asyncio
+import random
+import re
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from core.config import settings
+from services.llm_scheduler import UpstreamBusyError
+
+# Error codes and the HTTP status the chat endpoints answer with. Provider
+# throttling is a 503, not a 429: clients treat 429 as the user's own
+# message limit (see routers/chat.py) and ask them to upgrade.
+ERROR_STATUS = {
+    "upstream_throttled": 503,
+    "busy": 503,
+    "circuit_open": 503,
+    "unavailable": 503,
+    "auth": 502,
+    "error": 502,
+}
+
+# Retry-After (seconds) sent for throttling when the provider gave no hint
+THROTTLED_RETRY_AFTER = 5.0
+
+# Failures that say the upstream itself is unhealthy and count against its
+# circuit breaker. Others ("auth", "error", e.g. a blocked prompt) concern
+# one request or the configuration and must not block every user.
+UPSTREAM_HEALTH_CODES = ("upstream_throttled", "unavailable")
+
+
+class UpstreamError(Exception):
+    """
+    An upstream LLM call failed
+    
+    Carries a stable `code`, a user-facing `message` and, when known, how
+    many seconds the client should wait before retrying.
+    """
+    
+    def __init__(self, code: str, message: str, retry_after: Optional[float] = None, retryable: bool = False):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.retry_after = retry_after
+        self.retryable = retryable
+    
+    @property
+    def status_code(self) -> int:
+        return ERROR_STATUS.get(self.code, 502)
+    
+    @property
+    def client_retry_after(self) -> Optional[float]:
+        """Seconds the client should wait, defaulted for throttling"""
+        if self.retry_after is None and self.code == "upstream_throttled":
+            return THROTTLED_RETRY_AFTER
+        return self.retry_after
+    
+    def to_dict(self) -> dict:
+        data = {"code": self.code, "error": self.message}
+        if self.client_retry_after is not None:
+            data["retry_after"] = round(self.client_retry_after, 1)
+        return data
+
+
+def classify_error(error: Exception) -> UpstreamError:
+    """Convert an exception from the Gemini client into an UpstreamError"""
+    if isinstance(error, UpstreamError):
+        return error
+    if isinstance(error, UpstreamBusyError):
+        return UpstreamError(
+            "busy",
+            "I'm handling a lot of requests right now. Please try again in a moment.",
+            retry_after=1.0,
+        )
+    
+    # Errors from the HTTP provider backends carry their status code
+    status_code = getattr(error, "status_code", None)
+    if status_code == 429:
+        return UpstreamError(
+            "upstream_throttled",
+            "The AI service is receiving too many requests. Please try again shortly.",
+            retry_after=getattr(error, "retry_after", None),
+            retryable=True,
+        )
+    if status_code in (401, 403):
+        return UpstreamError("auth", "There's an authentication error. Please check the provider API key configuration.")
+    if status_code is not None and status_code >= 500:
+        return UpstreamError(
+            "unavailable",
+            "The AI service is temporarily unavailable. Please try again shortly.",
+            retryable=True,
+        )
+    
+    error_msg = str(error)
+    lowered = error_msg.lower()
+    if "429" in error_msg or "quota" in lowered or "rate limit" in lowered:
+        # Extract retry time if available
+        retry_after = None
+        retry_match = re.search(r'retry.*?(\d+\.?\d*)\s*s', error_msg, re.IGNORECASE)
+        if retry_match:
+            retry_after = float(retry_match.group(1))
+        return UpstreamError(
+            "upstream_throttled",
+            "The AI service is receiving too many requests. Please try again shortly.",
+            retry_after=retry_after,
+            retryable=True,
+        )
+    if "ACCESS_TOKEN_SCOPE_INSUFFICIENT" in error_msg or "insufficient authentication scopes" in error_msg:
+        return UpstreamError(
+            "auth",
+            "There's an authentication error. Please check that the Gemini API key is properly configured in the backend.",
+        )
+    if "API_KEY_INVALID" in error_msg or "invalid api key" in lowered:
+        return UpstreamError(
+            "auth",
+            "The API key is invalid. Please check the Gemini API key configuration.",
+        )
+    if (
+        isinstance(error, (asyncio.TimeoutError, ConnectionError))
+        or re.search(r"\b50[0234]\b", error_msg)
+        or "unavailable" in lowered
+        or "deadline" in lowered
+    ):
+        return UpstreamError(
+            "unavailable",
+            "The AI service is temporarily unavailable. Please try again shortly.",
+            retryable=True,
+        )
+    return UpstreamError("error", f"I encountered an error: {error_msg}")
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before retry number `attempt` (0-based)
+    
+    Honors the upstream retry delay when there is one (plus up to
+    LLM_RETRY_JITTER of it, so waiting callers don't retry in lockstep);
+    otherwise exponential backoff with full jitter.
+    """
+    if retry_after is not None:
+        return retry_after * (1 + random.uniform(0, settings.LLM_RETRY_JITTER))
+    return random.uniform(0, settings.LLM_RETRY_BASE_DELAY * (2 ** attempt))
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the upstream is failing
+    
+    Outcomes of the last LLM_BREAKER_WINDOW seconds are tracked. Once at least
+    LLM_BREAKER_MIN_CALLS calls were made and the failure rate reaches
+    LLM_BREAKER_FAILURE_RATE, the breaker opens for LLM_BREAKER_COOLDOWN
+    seconds (or the upstream retry delay, if longer) and calls are rejected
+    without reaching Gemini. After that a single trial call is let through;
+    its outcome closes the breaker or opens it again.
+    """
+    
+    def __init__(
+        self,
+        failure_rate: float = None,
+        min_calls: int = None,
+        window: float = None,
+        cooldown: float = None,
+        name: str = "gemini"
+    ):
+        self.name = name
+        self.failure_rate = failure_rate if failure_rate is not None else settings.LLM_BREAKER_FAILURE_RATE
+        self.min_calls = min_calls if min_calls is not None else settings.LLM_BREAKER_MIN_CALLS
+        self.window = window if window is not None else settings.LLM_BREAKER_WINDOW
+        self.cooldown = cooldown if cooldown is not None else settings.LLM_BREAKER_COOLDOWN
+        # (time, succeeded)
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0  # failures in self._outcomes
+        self._open_until = 0.0
+        self._trial_started: Optional[float] = None
+        self.opened = 0
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        now = time.monotonic()
+        if now < self._open_until:
+            return "open"
+        if self._open_until:
+            return "half_open"
+        return "closed"
+    
+    def before_call(self):
+        """
+        Admit a call or fail fast
+        
+        Raises:
+            UpstreamError: If the breaker is open (or a trial call is already running)
+        """
+        now = time.monotonic()
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and (self._trial_started is None or now - self._trial_started > self.cooldown):
+            self._trial_started = now
+            return
+        self.rejected += 1
+        raise UpstreamError(
+            "circuit_open",
+            "The AI service is temporarily unavailable. Please try again shortly.",
+            retry_after=max(self._open_until - now, 1.0),
+        )
+    
+    def record_success(self):
+        if self._open_until:
+            if self.state != "half_open":
+                return  # a call that started before the breaker opened
+            # Trial call succeeded
+            self._open_until = 0.0
+            self._trial_started = None
+            self._outcomes.clear()
+            self._failures = 0
+        self._record(True)
+    
+    def record_failure(self, retry_after: Optional[float] = None):
+        if self._open_until:
+            if self.state == "half_open":
+                # Trial call failed
+                self._open(retry_after)
+            return
+        self._record(False)
+        calls = len(self._outcomes)
+        if calls >= self.min_calls and self._failures / calls >= self.failure_rate:
+            self._open(retry_after)
+    
+    def record_ignored(self):
+        """A call ended in a failure that isn't the upstream's (see UPSTREAM_HEALTH_CODES)"""
+        if self.state == "half_open":
+            # Not a verdict on the trial: let the next call try again
+            self._trial_started = None
+    
+    def metrics(self) -> dict:
+        self._prune(time.monotonic())
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+    
+    def _open(self, retry_after: Optional[float]):
+        self._open_until = time.monotonic() + max(self.cooldown, retry_after or 0)
+        self._trial_started = None
+        self.opened += 1
+        print(f"{self.name} circuit breaker opened for {self._open_until - time.monotonic():.0f}s")
+    
+    def _record(self, succeeded: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, succeeded))
+        if not succeeded:
+            self._failures += 1
+        self._prune(now)
+    
+    def _prune(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            _, succeeded = self._outcomes.popleft()
+            if not succeeded:
+                self._failures -= 1
+
+
+# One breaker per provider, so one failing provider doesn't block the others
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(provider: str = "gemini") -> CircuitBreaker:
+    """Get the circuit breaker for a provider"""
+    if provider not in _circuit_breakers:
+        _circuit_breakers[provider] = CircuitBreaker(name=provider)
+    return _circuit_breakers[provider]
+
+
+def circuit_breaker_metrics() -> Dict[str, dict]:
+    """Breaker state per provider"""
+    return {provider: breaker.metrics() for provider, breaker in _circuit_breakers.items()}
@@ -0,0 +1,226 @@
+"""Response cache for repeated prompts per agent persona"""
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from core.config import settings
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a user message so trivially different phrasings share a key"""
+    message = re.sub(r"\s+", " ", message.strip().lower())
+    return message.rstrip(" ?!.")
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry expiry"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # key -> (expires_at, value), LRU ordered
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+    
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    async def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    Cache in a local SQLite file, shared by every worker process on the host
+    
+    Queries run on a dedicated thread so they never block the event loop,
+    and give up after RESPONSE_CACHE_SQLITE_TIMEOUT seconds when another
+    worker holds the write lock. Least recently used entries are evicted
+    once the table grows past max_entries; to keep hits read-only, an
+    entry's access time is only refreshed once per RESPONSE_CACHE_TOUCH_INTERVAL.
+    """
+    
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="response-cache")
+        self._conn = sqlite3.connect(
+            path,
+            timeout=settings.RESPONSE_CACHE_SQLITE_TIMEOUT,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+    
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._get, key)
+    
+    async def set(self, key: str, value: str, ttl: float):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._set, key, value, ttl)
+    
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            if now >= expires_at:
+                return None  # removed by eviction or the next set
+            if now - accessed_at >= settings.RESPONSE_CACHE_TOUCH_INTERVAL:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return value
+    
+    def _set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    Opt-in cache of complete agent responses
+    
+    Keyed on (persona, model, conversation context, normalized message), so a
+    hit is only possible when the model would see the same prompt. Only
+    agents listed in RESPONSE_CACHE_AGENTS are cached ("*" enables all).
+    """
+    
+    def __init__(self, backend=None):
+        self._backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._agent_stats: Dict[str, Dict[str, int]] = {}
+    
+    @property
+    def backend(self):
+        """Cache backend (lazy initialization from settings)"""
+        if self._backend is None:
+            if settings.RESPONSE_CACHE_BACKEND == "sqlite":
+                self._backend = SQLiteCacheBackend(
+                    settings.RESPONSE_CACHE_PATH, settings.RESPONSE_CACHE_MAX_ENTRIES
+                )
+            else:
+                self._backend = MemoryCacheBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+        return self._backend
+    
+    def is_enabled_for(self, agent_id: str) -> bool:
+        """Whether responses for this agent may be cached"""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return False
+        agents = settings.RESPONSE_CACHE_AGENTS
+        return "*" in agents or agent_id in agents
+    
+    def make_key(
+        self,
+        persona: str,
+        model: str,
+        user_message: str,
+        conversation_history: Optional[List[dict]] = None,
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """Build the cache key for a request"""
+        context = json.dumps(
+            [conversation_summary or "", conversation_history or []],
+            sort_keys=True,
+        )
+        parts = [
+            hashlib.sha256(persona.encode()).hexdigest(),
+            model,
+            hashlib.sha256(context.encode()).hexdigest(),
+            normalize_message(user_message),
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+    
+    async def get(self, agent_id: str, key: str) -> Optional[str]:
+        """Look up a response, recording a hit or miss"""
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            print(f"Response cache lookup failed: {e}")
+            value = None
+        stats = self._agent_stats.setdefault(agent_id, {"hits": 0, "misses": 0})
+        if value is None:
+            self.misses += 1
+            stats["misses"] += 1
+        else:
+            self.hits += 1
+            stats["hits"] += 1
+        return value
+    
+    async def set(self, key: str, response: str):
+        """Store a successful response"""
+        try:
+            await self.backend.set(key, response, settings.RESPONSE_CACHE_TTL)
+        except Exception as e:
+            print(f"Response cache store failed: {e}")
+    
+    def metrics(self) -> dict:
+        """Hit-rate statistics, overall and per agent"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            "backend": settings.RESPONSE_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "agents": {
+                agent_id: {
+                    **stats,
+                    "hit_rate": round(stats["hits"] / (stats["hits"] + stats["misses"]), 4),
+                }
+                for agent_id, stats in self._agent_stats.items()
+            },
+        }
+
+
+# Global instance
+_response_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Get response cache instance (singleton)"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
@@ -1,25 +1,53 @@
 """Token/Usage tracking service - tracks free tokens per user"""
-from typing import Optional
-from datetime import datetime, timedelta
-from google.cloud import firestore
-from core.firebase import get_firestore_client
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from core.config import settings
+from core.datastore import get_datastore, SERVER_TIMESTAMP
 
 # Constants
 FREE_TOKENS_LIMIT = 6
 TOKEN_RESET_INTERVAL_DAYS = 7  # Reset tokens weekly for free users
 
 
+class TokenLease:
+    """
+    Tokens reserved in Firestore and spent locally by this worker
+    
+    Reserved tokens are already counted in the user's `tokens_used`, so other
+    workers can never grant them again. Unspent tokens are returned when the
+    lease expires.
+    """
+    
+    def __init__(self, remaining: int, ttl: float, status: dict):
+        self.remaining = remaining
+        self.expires_at = time.monotonic() + ttl
+        # Stored status right after the reservation; its reset_date identifies
+        # the token period the reserved tokens belong to
+        self.status = status
+    
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
 class TokenService:
     """Service to track and manage user tokens"""
     
-    def __init__(self):
-        self._db = None
+    def __init__(self, store=None):
+        self._store = store
+        # user_id -> (expires_at, status as stored in Firestore), LRU ordered
+        self._status_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._leases: Dict[str, TokenLease] = {}
+        self._lease_locks: Dict[str, asyncio.Lock] = {}
     
-    def _get_db(self):
-        """Get Firestore client (lazy initialization)"""
-        if self._db is None:
-            self._db = get_firestore_client()
-        return self._db
+    def _get_store(self):
+        """Get data store (lazy initialization)"""
+        if self._store is None:
+            self._store = get_datastore()
+        return self._store
     
     async def get_token_status(self, user_id: str) -> dict:
         """
@@ -31,56 +59,16 @@ class TokenService:
             'is_premium': bool,
             'reset_date': Optional[datetime]
         }
+        
+        Served from a short-TTL in-process cache when possible. Tokens leased
+        by this worker but not yet spent are reported as remaining.
         """
         try:
-            print(f"🔍 TokenService: Getting token status for user_id: {user_id}")
-            db = self._get_db()
-            user_doc_ref = db.collection("users").document(user_id)
-            user_doc = user_doc_ref.get()
-            
-            if not user_doc.exists:
-                # New user - initialize with free tokens
-                await self._initialize_user(user_id)
-                return {
-                    'tokens_remaining': FREE_TOKENS_LIMIT,
-                    'tokens_used': 0,
-                    'tokens_limit': FREE_TOKENS_LIMIT,
-                    'is_premium': False,
-                    'reset_date': None,
-                }
-            
-            user_data = user_doc.to_dict()
-            is_premium = user_data.get('is_premium', False)
-            tokens_used = user_data.get('tokens_used', 0)
-            last_reset = user_data.get('last_reset')
-            
-            # Check if tokens should be reset (weekly reset for free users)
-            if not is_premium and last_reset:
-                last_reset_date = last_reset
-                if isinstance(last_reset_date, datetime):
-                    # Handle both timezone-aware and naive datetimes
-                    now = datetime.now(last_reset_date.tzinfo) if last_reset_date.tzinfo else datetime.now()
-                    # Make both timezone-aware or both naive
-                    if last_reset_date.tzinfo and not now.tzinfo:
-                        now = datetime.now(last_reset_date.tzinfo)
-                    elif not last_reset_date.tzinfo and now.tzinfo:
-                        now = datetime.now()
-                    
-                    days_since_reset = (now - last_reset_date).days
-                    if days_since_reset >= TOKEN_RESET_INTERVAL_DAYS:
-                        # Reset tokens
-                        await self._reset_tokens(user_id)
-                        tokens_used = 0
-            
-            tokens_remaining = 0 if is_premium else max(0, FREE_TOKENS_LIMIT - tokens_used)
-            
-            return {
-                'tokens_remaining': tokens_remaining if not is_premium else -1,  # -1 = unlimited
-                'tokens_used': tokens_used,
-                'tokens_limit': FREE_TOKENS_LIMIT,
-                'is_premium': is_premium,
-                'reset_date': last_reset,
-            }
+            status = self._get_cached_status(user_id)
+            if status is None:
+                status = await self._fetch_token_status(user_id)
+                self._cache_status(user_id, status)
+            return self._apply_lease(user_id, status)
         except Exception as e:
             # Return default values on error
             return {
@@ -91,6 +79,93 @@ class TokenService:
                 'reset_date': None,
             }
     
+    async def _fetch_token_status(self, user_id: str) -> dict:
+        """
+        Read token status from Firestore
+        
+        Read-only: a new user or a due weekly reset is reported as a fresh
+        token period, but the document is only created or reset by the
+        transaction that reserves tokens (see _reserve_tokens), so a read
+        can never overwrite tokens reserved meanwhile.
+        """
+        print(f"🔍 TokenService: Getting token status for user_id: {user_id}")
+        user_data = await self._get_store().get("users", user_id)
+        
+        if user_data is None:
+            # New user - all free tokens available
+            return self._build_status(False, 0, None)
+        
+        is_premium = user_data.get('is_premium', False)
+        tokens_used = user_data.get('tokens_used', 0)
+        last_reset = user_data.get('last_reset')
+        
+        # Weekly reset due for a free user: the next reservation applies it
+        if not is_premium and self._is_reset_due(last_reset):
+            return self._build_status(False, 0, None)
+        
+        return self._build_status(is_premium, tokens_used, last_reset)
+    
+    def _is_reset_due(self, last_reset) -> bool:
+        """Check if a free user's weekly token reset is due"""
+        if not isinstance(last_reset, datetime):
+            return False
+        # Handle both timezone-aware and naive datetimes
+        now = datetime.now(last_reset.tzinfo) if last_reset.tzinfo else datetime.now()
+        days_since_reset = (now - last_reset).days
+        return days_since_reset >= TOKEN_RESET_INTERVAL_DAYS
+    
+    def _build_status(self, is_premium: bool, tokens_used: int, last_reset) -> dict:
+        """Build a token status dict from stored values"""
+        tokens_remaining = 0 if is_premium else max(0, FREE_TOKENS_LIMIT - tokens_used)
+        
+        return {
+            'tokens_remaining': tokens_remaining if not is_premium else -1,  # -1 = unlimited
+            'tokens_used': tokens_used,
+            'tokens_limit': FREE_TOKENS_LIMIT,
+            'is_premium': is_premium,
+            'reset_date': last_reset,
+        }
+    
+    def is_premium_cached(self, user_id: str) -> bool:
+        """Premium flag from the local cache or lease, without a Firestore read"""
+        status = self._get_cached_status(user_id)
+        if status is None:
+            lease = self._leases.get(user_id)
+            status = lease.status if lease is not None else None
+        return bool(status and status['is_premium'])
+    
+    def _get_cached_status(self, user_id: str) -> Optional[dict]:
+        """Get cached Firestore status if still fresh"""
+        entry = self._status_cache.get(user_id)
+        if entry is None:
+            return None
+        expires_at, status = entry
+        if time.monotonic() >= expires_at:
+            del self._status_cache[user_id]
+            return None
+        self._status_cache.move_to_end(user_id)
+        return status
+    
+    def _cache_status(self, user_id: str, status: dict):
+        """Cache Firestore status for TOKEN_STATUS_CACHE_TTL seconds"""
+        self._status_cache[user_id] = (time.monotonic() + settings.TOKEN_STATUS_CACHE_TTL, status)
+        self._status_cache.move_to_end(user_id)
+        while len(self._status_cache) > settings.TOKEN_CACHE_MAX_USERS:
+            self._status_cache.popitem(last=False)
+    
+    def _invalidate(self, user_id: str):
+        """Drop cached status and any lease for a user"""
+        self._status_cache.pop(user_id, None)
+        self._leases.pop(user_id, None)
+    
+    def _apply_lease(self, user_id: str, status: dict) -> dict:
+        """Report leased-but-unspent tokens as remaining rather than used"""
+        lease = self._leases.get(user_id)
+        if status['is_premium'] or lease is None or lease.remaining <= 0:
+            return dict(status)
+        tokens_used = max(0, status['tokens_used'] - lease.remaining)
+        return self._build_status(False, tokens_used, status['reset_date'])
+    
     async def can_use_token(self, user_id: str) -> bool:
         """Check if user can use a token (has tokens remaining or is premium)"""
         try:
@@ -110,87 +185,232 @@ class TokenService:
         Use a token (decrement token count)
         Returns True if token was used, False if no tokens available
         """
+        token_used, _ = await self.consume_token(user_id)
+        return token_used
+    
+    async def consume_token(self, user_id: str) -> Tuple[bool, dict]:
+        """
+        Atomically check and use a token
+        
+        Free users spend tokens from a small lease reserved in Firestore, so
+        most calls don't touch Firestore at all. When the lease is spent or
+        expired, a new one is reserved in a single transaction that also
+        applies the weekly reset, so the check, reset and increment can't
+        race with other requests or workers.
+        
+        Returns:
+            Tuple of (True if token was used, token status after the call)
+        """
         try:
-            db = self._get_db()
-            user_doc_ref = db.collection("users").document(user_id)
-            user_doc = user_doc_ref.get()
-            
-            if not user_doc.exists:
-                await self._initialize_user(user_id)
-                user_doc = user_doc_ref.get()
-            
-            user_data = user_doc.to_dict() if user_doc.exists else {}
-            is_premium = user_data.get('is_premium', False)
+            status = self._get_cached_status(user_id)
             
             # Premium users have unlimited tokens - don't decrement
-            if is_premium:
-                return True
-            
-            tokens_used = user_data.get('tokens_used', 0)
-            
-            # Check if user has tokens remaining
-            if tokens_used >= FREE_TOKENS_LIMIT:
-                return False
+            if status is not None and status['is_premium']:
+                return True, dict(status)
             
-            # Increment tokens used
-            tokens_used += 1
-            user_doc_ref.set({
-                'tokens_used': tokens_used,
-                'last_used': firestore.SERVER_TIMESTAMP,
-                'updated_at': firestore.SERVER_TIMESTAMP,
-            }, merge=True)
+            if self._spend_leased_token(user_id):
+                return True, self._current_status(user_id)
             
-            return True
+            lock = self._lease_locks.setdefault(user_id, asyncio.Lock())
+            async with lock:
+                # Another request may have reserved a lease while we waited
+                if self._spend_leased_token(user_id):
+                    return True, self._current_status(user_id)
+                
+                # Return unspent tokens from an expired lease before reserving
+                await self._release_lease(user_id)
+                
+                granted, stored_status = await self._reserve_tokens(user_id, settings.TOKEN_LEASE_SIZE)
+                self._cache_status(user_id, stored_status)
+                if stored_status['is_premium']:
+                    return True, dict(stored_status)
+                if granted == 0:
+                    return False, dict(stored_status)
+                
+                self._leases[user_id] = TokenLease(granted - 1, settings.TOKEN_LEASE_TTL, stored_status)
+                return True, self._current_status(user_id)
         except Exception as e:
             # On error, allow (fail open for development)
-            return True
-    
-    async def _initialize_user(self, user_id: str):
-        """Initialize user document with default token values"""
-        try:
-            db = self._get_db()
-            user_doc_ref = db.collection("users").document(user_id)
-            user_doc_ref.set({
-                'user_id': user_id,
+            print(f"Error consuming token (allowing the message): {e}")
+            return True, {
+                'tokens_remaining': FREE_TOKENS_LIMIT,
                 'tokens_used': 0,
                 'tokens_limit': FREE_TOKENS_LIMIT,
                 'is_premium': False,
-                'created_at': firestore.SERVER_TIMESTAMP,
-                'last_reset': firestore.SERVER_TIMESTAMP,
-                'updated_at': firestore.SERVER_TIMESTAMP,
-            })
-        except Exception as e:
-            print(f"Error initializing user: {e}")
+                'reset_date': None,
+            }
     
-    async def _reset_tokens(self, user_id: str):
-        """Reset tokens for a user (weekly reset for free users)"""
+    async def refund_token(self, user_id: str, token_status: dict):
+        """
+        Give back a token used for a message that got no reply
+        
+        `token_status` is the status consume_token returned with the token.
+        The token goes back into this worker's lease when the lease is from
+        the same token period, otherwise it's returned in a transaction.
+        Nothing is refunded across a weekly reset, which already restored it.
+        """
+        if token_status['is_premium']:
+            return
+        reset_date = token_status['reset_date']
+        lease = self._leases.get(user_id)
+        if lease is not None and lease.status['reset_date'] == reset_date:
+            lease.remaining += 1
+            return
+        
+        def refund(user_data: Optional[dict]):
+            if user_data is None or user_data.get('last_reset') != reset_date:
+                return None, None
+            return {
+                'tokens_used': max(0, user_data.get('tokens_used', 0) - 1),
+                'updated_at': SERVER_TIMESTAMP,
+            }, None
+        
         try:
-            db = self._get_db()
-            user_doc_ref = db.collection("users").document(user_id)
-            user_doc_ref.set({
-                'tokens_used': 0,
-                'last_reset': firestore.SERVER_TIMESTAMP,
-                'updated_at': firestore.SERVER_TIMESTAMP,
-            }, merge=True)
+            self._status_cache.pop(user_id, None)
+            await self._get_store().transact("users", user_id, refund)
         except Exception as e:
-            print(f"Error resetting tokens: {e}")
+            print(f"Error refunding token: {e}")
     
-    async def set_premium_status(self, user_id: str, is_premium: bool):
-        """Update user's premium status"""
-        try:
-            db = self._get_db()
-            user_doc_ref = db.collection("users").document(user_id)
-            user_doc_ref.set({
-                'is_premium': is_premium,
-                'updated_at': firestore.SERVER_TIMESTAMP,
-            }, merge=True)
+    def _current_status(self, user_id: str) -> dict:
+        """Status for a user holding a lease, without a Firestore read"""
+        status = self._get_cached_status(user_id) or self._leases[user_id].status
+        return self._apply_lease(user_id, status)
+    
+    def _spend_leased_token(self, user_id: str) -> bool:
+        """Spend one token from an active local lease, without touching Firestore"""
+        lease = self._leases.get(user_id)
+        if lease is None or lease.expired or lease.remaining <= 0:
+            return False
+        lease.remaining -= 1
+        return True
+    
+    async def _reserve_tokens(self, user_id: str, count: int) -> Tuple[int, dict]:
+        """
+        Reserve up to `count` tokens in one Firestore transaction
+        
+        Returns:
+            Tuple of (tokens granted, stored status after the reservation)
+        """
+        def reserve(user_data: Optional[dict]):
+            exists = user_data is not None
+            user_data = user_data or {}
+            is_premium = user_data.get('is_premium', False)
+            tokens_used = user_data.get('tokens_used', 0)
+            last_reset = user_data.get('last_reset')
             
-            # Reset tokens when upgrading to premium
             if is_premium:
-                await self._reset_tokens(user_id)
+                return None, (0, self._build_status(True, tokens_used, last_reset))
+            
+            update = {}
+            if not exists or self._is_reset_due(last_reset):
+                # New user or weekly reset due - start a fresh token period
+                tokens_used = 0
+                last_reset = datetime.now(timezone.utc)
+                update['last_reset'] = last_reset
+            
+            granted = max(0, min(count, FREE_TOKENS_LIMIT - tokens_used))
+            if granted:
+                update.update({
+                    'tokens_used': tokens_used + granted,
+                    'last_used': SERVER_TIMESTAMP,
+                })
+            if update:
+                if not exists:
+                    update.update({
+                        'user_id': user_id,
+                        'tokens_limit': FREE_TOKENS_LIMIT,
+                        'is_premium': False,
+                        'created_at': SERVER_TIMESTAMP,
+                    })
+                update['updated_at'] = SERVER_TIMESTAMP
+            return update, (granted, self._build_status(False, tokens_used + granted, last_reset))
+        
+        return await self._get_store().transact("users", user_id, reserve)
+    
+    async def _release_lease(self, user_id: str):
+        """Return a lease's unspent tokens to Firestore"""
+        lease = self._leases.pop(user_id, None)
+        self._status_cache.pop(user_id, None)
+        if lease is None or lease.remaining <= 0:
+            return
+        
+        def release(user_data: Optional[dict]):
+            if user_data is None:
+                return None, None
+            # A reset since the reservation already wiped the leased tokens
+            if user_data.get('last_reset') != lease.status['reset_date']:
+                return None, None
+            tokens_used = user_data.get('tokens_used', 0)
+            return {
+                'tokens_used': max(0, tokens_used - lease.remaining),
+                'updated_at': SERVER_TIMESTAMP,
+            }, None
+        
+        await self._get_store().transact("users", user_id, release)
+    
+    async def release_expired_leases(self):
+        """Reconcile expired leases, returning their unspent tokens"""
+        for user_id, lease in list(self._leases.items()):
+            if lease.expired:
+                try:
+                    await self._release_lease(user_id)
+                except Exception as e:
+                    print(f"Error releasing token lease: {e}")
+        
+        # Drop idle per-user locks so the map stays bounded
+        for user_id, lock in list(self._lease_locks.items()):
+            if user_id not in self._leases and not lock.locked():
+                del self._lease_locks[user_id]
+    
+    async def release_all_leases(self):
+        """Return every unspent leased token (e.g. on shutdown)"""
+        for user_id in list(self._leases):
+            try:
+                await self._release_lease(user_id)
+            except Exception as e:
+                print(f"Error releasing token lease: {e}")
+    
+    async def run_lease_reconciler(self):
+        """Periodically reconcile expired leases (run as a background task)"""
+        while True:
+            await asyncio.sleep(settings.TOKEN_LEASE_TTL)
+            await self.release_expired_leases()
+    
+    async def set_premium_status(self, user_id: str, is_premium: bool):
+        """
+        Update user's premium status
+        
+        Runs in one transaction, which also creates a missing user document
+        and, when upgrading, starts a fresh token period.
+        """
+        def update_premium(user_data: Optional[dict]):
+            update = {
+                'is_premium': is_premium,
+                'updated_at': SERVER_TIMESTAMP,
+            }
+            if user_data is None:
+                update.update({
+                    'user_id': user_id,
+                    'tokens_used': 0,
+                    'tokens_limit': FREE_TOKENS_LIMIT,
+                    'last_reset': datetime.now(timezone.utc),
+                    'created_at': SERVER_TIMESTAMP,
+                })
+            elif is_premium:
+                # Reset tokens when upgrading to premium
+                update.update({
+                    'tokens_used': 0,
+                    'last_reset': datetime.now(timezone.utc),
+                })
+            return update, None
+        
+        try:
+            await self._release_lease(user_id)
+            await self._get_store().transact("users", user_id, update_premium)
         except Exception as e:
             print(f"Error setting premium status: {e}")
-
+        finally:
+            self._invalidate(user_id)
 
 # Global instance
 _token_service = None
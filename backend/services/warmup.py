@@ -0,0 +1,107 @@
+"""Background warmup of SDKs and clients"""
+import asyncio
+import importlib
+import time
+from typing import Dict, Optional
+
+from core.config import settings
+from core.datastore import get_datastore
+from core.firebase import ensure_firebase
+from services.gemini_service import get_gemini_service
+from services.llm_providers import GeminiBackend, get_provider_registry
+
+# Imported in a worker thread so the event loop keeps serving meanwhile
+SDK_MODULES = ("firebase_admin", "firebase_admin.firestore_async", "google.cloud.firestore", "httpx")
+GEMINI_SDK_MODULE = "google.generativeai"
+
+
+class Warmup:
+    """
+    Load SDKs and build clients ahead of the first request
+    
+    Heavy SDKs are imported on first use rather than at startup, so the
+    process binds its port quickly. Warmup then imports them, initializes
+    Firebase and builds the data store and default LLM clients, either in
+    the background (LAZY_STARTUP) or before the app starts serving.
+    /health/ready reports ready once it has finished.
+    """
+    
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, float] = {}  # step -> milliseconds
+        self.errors: Dict[str, str] = {}
+        self._finished = asyncio.Event()
+    
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+    
+    async def wait(self):
+        """Return once warmup has finished"""
+        await self._finished.wait()
+    
+    async def run(self):
+        """Run every warmup step; failures are logged and don't stop later steps"""
+        self.started_at = time.monotonic()
+        modules = SDK_MODULES
+        if get_provider_registry().backend_name("gemini") == "gemini":
+            modules += (GEMINI_SDK_MODULE,)
+        await self._step("imports", asyncio.to_thread(_import_all, modules))
+        await self._step("firebase", asyncio.to_thread(ensure_firebase))
+        await self._step("datastore", self._warm_datastore())
+        await self._step("llm", asyncio.to_thread(build_default_model))
+        self.finished_at = time.monotonic()
+        self._finished.set()
+        print(f"Warmup finished in {(self.finished_at - self.started_at) * 1000:.0f}ms: {self.steps}")
+    
+    def metrics(self) -> dict:
+        return {
+            "lazy_startup": settings.LAZY_STARTUP,
+            "done": self.done,
+            "duration_ms": round((self.finished_at - self.started_at) * 1000, 1) if self.done else None,
+            "steps_ms": self.steps,
+            "errors": self.errors,
+        }
+    
+    async def _step(self, name: str, awaitable):
+        started = time.monotonic()
+        try:
+            await awaitable
+        except Exception as e:
+            self.errors[name] = str(e)
+            print(f"Warmup step {name} failed: {e}")
+        self.steps[name] = round((time.monotonic() - started) * 1000, 1)
+    
+    async def _warm_datastore(self):
+        # Builds the shared async Firestore client on the event loop it serves
+        get_datastore().available
+
+
+def _import_all(modules):
+    for module in modules:
+        importlib.import_module(module)
+
+
+def build_default_model():
+    """
+    Configure the default LLM backend and build its model object
+    
+    Raises:
+        ValueError: If the backend isn't configured (e.g. no GEMINI_API_KEY)
+    """
+    target = get_gemini_service().providers.default_target()
+    if isinstance(target.backend, GeminiBackend):
+        target.backend.get_model(target.model_id)
+
+
+# Global instance
+_warmup = None
+
+
+def get_warmup() -> Warmup:
+    """Get warmup instance (singleton)"""
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup()
+    return _warmup
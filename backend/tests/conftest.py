@@ -0,0 +1,13 @@
+"""Test configuration: run against the in-memory data store and the fake LLM backend"""
+import os
+import sys
+from pathlib import Path
+
+# Set before any app module reads settings
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("DATASTORE_BACKEND", "memory")
+os.environ.setdefault("FIREBASE_CREDENTIALS_PATH", "/nonexistent/test.json")
+os.environ.setdefault("LLM_PROVIDER_OVERRIDES", '{"*": "fake"}')
+os.environ.setdefault("FAKE_PROVIDER_LATENCY", "0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,46 @@
+"""Catalog endpoints: pre-serialized bodies and ETag revalidation"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("path", ["/api/agents/", "/api/agents/ceo_coach", "/api/provider-agents/"])
+def test_matching_etag_answers_304(client, path):
+    first = client.get(path)
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "no-cache"
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        revalidated = client.get(path, headers={"If-None-Match": header})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+        assert revalidated.headers["etag"] == etag
+
+
+def test_stale_etag_gets_the_body(client):
+    response = client.get("/api/agents/", headers={"If-None-Match": '"stale"'})
+
+    assert response.status_code == 200
+    assert any(agent["id"] == "ceo_coach" for agent in response.json())
+
+
+def test_filtered_lists_have_their_own_etag(client):
+    everything = client.get("/api/provider-agents/")
+    openai = client.get("/api/provider-agents/", params={"provider": "OpenAI"})
+
+    assert openai.headers["etag"] != everything.headers["etag"]
+    assert {agent["provider"] for agent in openai.json()} == {"openai"}
+    revalidated = client.get(
+        "/api/provider-agents/",
+        params={"provider": "openai"},
+        headers={"If-None-Match": openai.headers["etag"]},
+    )
+    assert revalidated.status_code == 304
@@ -0,0 +1,103 @@
+"""Chat endpoints over HTTP and WebSocket"""
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from core.config import settings
+from services.llm_providers import get_provider_registry
+from services.token_service import FREE_TOKENS_LIMIT, get_token_service
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def slow_provider(monkeypatch):
+    """Fake provider waiting 0.1s per chunk"""
+    monkeypatch.setattr(get_provider_registry().get_backend("gemini"), "latency", 0.1)
+
+
+def receive_until(ws, frame_type, request_id):
+    frames = []
+    while True:
+        frames.append(ws.receive_json())
+        if frames[-1].get("type") == frame_type and frames[-1].get("request_id") == request_id:
+            return frames
+
+
+def test_unconfigured_provider_is_rejected_before_using_a_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER_OVERRIDES", {})
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "")
+
+    response = client.post("/api/chat/message", json={
+        "user_id": "picker", "agent_id": "ceo_coach", "message": "hi", "provider": "openai",
+    })
+
+    assert response.status_code == 400
+    assert "not available" in response.json()["detail"]
+    status = client.portal.call(get_token_service().get_token_status, "picker")
+    assert status["tokens_remaining"] == FREE_TOKENS_LIMIT
+
+
+def test_websocket_messages_are_answered_concurrently(client, slow_provider):
+    with client.websocket_connect("/api/chat/ws/concurrent") as ws:
+        ws.send_json({"agent_id": "ceo_coach", "message": "a long streamed reply", "stream": True, "request_id": "slow"})
+        ws.send_json({"agent_id": "tech_mentor", "message": "quick", "request_id": 2})
+
+        frames = receive_until(ws, "done", "slow")
+
+    replies = [frame for frame in frames if "response" in frame]
+    # The single-chunk reply overtakes the streamed one started before it
+    assert [frame["request_id"] for frame in replies] == [2, "slow"]
+    assert all("request_id" in frame for frame in frames)
+
+
+def test_websocket_cancel_stops_a_generation(client, slow_provider):
+    with client.websocket_connect("/api/chat/ws/canceller") as ws:
+        ws.send_json({"agent_id": "ceo_coach", "message": "never mind", "request_id": "r1"})
+        ws.send_json({"type": "cancel", "request_id": "r1"})
+        assert ws.receive_json() == {"request_id": "r1", "type": "cancelled"}
+
+        ws.send_json({"type": "cancel", "request_id": "r1"})
+        assert ws.receive_json()["code"] == "unknown_request"
+
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}  # no reply for r1 came first
+
+
+def test_malformed_frames_dont_close_the_socket(client):
+    with client.websocket_connect("/api/chat/ws/sloppy") as ws:
+        for frame in ("not json", "[1, 2]", '"text"'):
+            ws.send_text(frame)
+            assert ws.receive_json()["code"] == "invalid_frame"
+
+        ws.send_json({"agent_id": "ceo_coach", "message": "still there?", "request_id": "ok"})
+        assert "response" in receive_until(ws, None, "ok")[-1]
+
+
+def test_idle_socket_is_closed(client, monkeypatch):
+    monkeypatch.setattr(settings, "WEBSOCKET_TIMEOUT", 0.2)
+
+    with client.websocket_connect("/api/chat/ws/idle") as ws:
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            ws.receive_json()
+
+    assert excinfo.value.code == 1000
+
+
+def test_unanswered_ping_closes_the_socket(client, monkeypatch):
+    monkeypatch.setattr(settings, "WEBSOCKET_PING_INTERVAL", 0.1)
+    monkeypatch.setattr(settings, "WEBSOCKET_PONG_TIMEOUT", 0.2)
+
+    with client.websocket_connect("/api/chat/ws/silent") as ws:
+        assert ws.receive_json() == {"type": "ping"}
+        ws.send_json({"type": "pong"})
+        assert ws.receive_json() == {"type": "ping"}  # the pong kept it open
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            ws.receive_json()
+
+    assert excinfo.value.code == 1001
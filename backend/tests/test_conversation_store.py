@@ -0,0 +1,94 @@
+"""Conversation turns and the running summary"""
+import asyncio
+
+import pytest
+
+from core.config import settings
+from core.datastore import MemoryDataStore
+from services.conversation_store import CONVERSATIONS_COLLECTION, ConversationStore
+
+
+class Summarizer:
+    """Fake summarizer that waits until released"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = asyncio.Event()
+
+    async def __call__(self, summary, turns):
+        self.calls.append([turn["user_message"] for turn in turns])
+        await self.release.wait()
+        return f"summary of {len(turns)}"
+
+
+@pytest.fixture(autouse=True)
+def small_window(monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_WINDOW_TURNS", 2)
+    monkeypatch.setattr(settings, "CONVERSATION_SUMMARY_BATCH", 2)
+    monkeypatch.setattr(settings, "CONVERSATION_MAX_TURNS", 10)
+
+
+@pytest.fixture
+def store():
+    return MemoryDataStore()
+
+
+@pytest.fixture
+def summarizer():
+    return Summarizer()
+
+
+@pytest.fixture
+def conversations(store, summarizer):
+    return ConversationStore(store=store, summarizer=summarizer)
+
+
+async def append(conversations, *messages, **kwargs):
+    for message in messages:
+        await conversations.append_turn("alice", "coach", message, "ok", **kwargs)
+
+
+def stored(store):
+    return store.collections[CONVERSATIONS_COLLECTION][ConversationStore.conversation_id("alice", "coach")]
+
+
+@pytest.mark.asyncio
+async def test_turns_appended_while_summarizing_are_kept(conversations, store, summarizer):
+    await append(conversations, "t1", "t2", "t3", "t4")
+    await asyncio.sleep(0)
+    assert summarizer.calls == [["t1", "t2"]]
+
+    await append(conversations, "t5")  # lands while the summary is being written
+    summarizer.release.set()
+    await conversations.flush()
+
+    assert summarizer.calls == [["t1", "t2"]]  # one summarization at a time
+    doc = stored(store)
+    assert doc["summary"] == "summary of 2"
+    assert [turn["user_message"] for turn in doc["turns"]] == ["t3", "t4", "t5"]
+    summary, turns = await conversations.get_context("alice", "coach")
+    assert summary == "summary of 2"
+    assert [turn["user_message"] for turn in turns] == ["t3", "t4", "t5"]
+
+
+@pytest.mark.asyncio
+async def test_fold_is_skipped_when_the_turns_were_already_dropped(conversations, store, summarizer):
+    await append(conversations, "t1", "t2", "t3", "t4")
+    await asyncio.sleep(0)
+
+    # Another worker folded the same turns first
+    stored(store).update({"summary": "theirs", "turns": stored(store)["turns"][2:]})
+    summarizer.release.set()
+    await conversations.flush()
+
+    assert stored(store)["summary"] == "theirs"
+    assert [turn["user_message"] for turn in stored(store)["turns"]] == ["t3", "t4"]
+
+
+@pytest.mark.asyncio
+async def test_no_summary_when_the_client_sends_history(conversations, store, summarizer):
+    await append(conversations, "t1", "t2", "t3", "t4", summarize=False)
+    await conversations.flush()
+
+    assert summarizer.calls == []
+    assert len(stored(store)["turns"]) == 4
@@ -0,0 +1,66 @@
+"""Scheduler admission, lane priority and queue limits"""
+import asyncio
+
+import pytest
+
+from services.llm_scheduler import PRIORITY_LANE, STANDARD_LANE, LLMScheduler, UpstreamBusyError
+
+
+async def hold(scheduler, lane, order, release):
+    async with scheduler.slot(lane):
+        order.append(lane)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_priority_lane_is_served_before_standard():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10, queue_timeout=5)
+    order = []
+    release = asyncio.Event()
+
+    busy = asyncio.create_task(hold(scheduler, STANDARD_LANE, order, release))
+    await asyncio.sleep(0)
+    waiting = [asyncio.create_task(hold(scheduler, STANDARD_LANE, order, release))]
+    await asyncio.sleep(0)
+    waiting.append(asyncio.create_task(hold(scheduler, PRIORITY_LANE, order, release)))
+    await asyncio.sleep(0)
+    assert scheduler.queued == 2
+
+    release.set()
+    await asyncio.gather(busy, *waiting)
+
+    # The priority call queued last but went first
+    assert order == [STANDARD_LANE, PRIORITY_LANE, STANDARD_LANE]
+    assert scheduler.metrics()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_rejects_the_call():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10, queue_timeout=0.05)
+    release = asyncio.Event()
+    busy = asyncio.create_task(hold(scheduler, STANDARD_LANE, [], release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(UpstreamBusyError):
+        async with scheduler.slot(STANDARD_LANE):
+            pass
+
+    assert scheduler.queued == 0
+    assert scheduler.metrics()["lanes"][STANDARD_LANE]["rejected"] == 1
+    release.set()
+    await busy
+
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_immediately():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=0, queue_timeout=5)
+    release = asyncio.Event()
+    busy = asyncio.create_task(hold(scheduler, STANDARD_LANE, [], release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(UpstreamBusyError):
+        async with scheduler.slot(PRIORITY_LANE):
+            pass
+
+    release.set()
+    await busy
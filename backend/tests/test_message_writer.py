@@ -0,0 +1,69 @@
+"""Write-behind batching, draining and usage counting"""
+import asyncio
+
+import pytest
+
+from core.config import settings
+from core.datastore import MemoryDataStore
+from services.message_writer import MESSAGES_COLLECTION, MessageWriter
+from services.rate_limiter import USAGE_COUNTERS_COLLECTION, RateLimiter
+
+
+@pytest.fixture
+def store():
+    return MemoryDataStore()
+
+
+@pytest.fixture
+def writer(store, monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "MESSAGE_FLUSH_INTERVAL", 60)
+    return MessageWriter(store=store, rate_limiter=RateLimiter(store=store))
+
+
+def message(user_id, text="hi"):
+    return {"user_id": user_id, "agent_id": "coach", "message": text, "response": "hello"}
+
+
+def stored_messages(store):
+    return list(store.collections.get(MESSAGES_COLLECTION, {}).values())
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_flushed_in_one_write(writer, store):
+    writer.start()
+    for user_id in ("alice", "alice", "bob"):
+        await writer.enqueue(message(user_id))
+    await asyncio.sleep(0.01)
+
+    assert len(stored_messages(store)) == 3
+    assert writer.batches == 1
+    assert writer.metrics()["pending"] == 0
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_stop_drains_a_partial_batch(writer, store):
+    writer.start()
+    await writer.enqueue(message("alice", "one"))
+    await writer.enqueue(message("alice", "two"))
+    await asyncio.sleep(0.01)
+    assert stored_messages(store) == []  # waiting for a full batch or the interval
+
+    await writer.stop()
+
+    assert sorted(m["message"] for m in stored_messages(store)) == ["one", "two"]
+    assert not writer.running
+
+
+@pytest.mark.asyncio
+async def test_flushed_messages_are_counted_per_user(writer, store):
+    writer.start()
+    for user_id in ("alice", "alice", "bob"):
+        await writer.enqueue(message(user_id))
+    await writer.stop()
+
+    weekly = RateLimiter().get_period_id("weekly")
+    counters = store.collections[USAGE_COUNTERS_COLLECTION]
+    assert counters["alice"]["periods"][weekly] == 2
+    assert counters["bob"]["periods"][weekly] == 1
@@ -0,0 +1,70 @@
+"""Subscription tiers and usage counters"""
+from datetime import datetime
+
+import pytest
+
+from core.config import settings
+from core.datastore import MemoryDataStore
+from services.rate_limiter import RateLimiter
+
+
+@pytest.fixture
+def store():
+    return MemoryDataStore()
+
+
+@pytest.fixture
+def limiter(store):
+    return RateLimiter(store=store)
+
+
+@pytest.mark.asyncio
+async def test_loaded_annual_tier_gets_priority(limiter, store):
+    await store.set("subscriptions", "alice", {"tier": "annual"})
+    assert not limiter.has_unlimited_tier("alice")
+
+    assert await limiter.load_tier("alice") == "annual"
+    assert limiter.has_unlimited_tier("alice")
+
+
+@pytest.mark.asyncio
+async def test_cached_tier_is_reused_until_it_expires(limiter, store, monkeypatch):
+    await store.set("subscriptions", "alice", {"tier": "annual"})
+    await limiter.load_tier("alice")
+    await store.set("subscriptions", "alice", {"tier": "weekly"})
+    assert await limiter.load_tier("alice") == "annual"  # still fresh: no re-read
+
+    monkeypatch.setattr(settings, "TIER_CACHE_TTL", 0)
+    limiter._tiers.clear()
+    await store.set("subscriptions", "alice", {"tier": "annual"})
+    await limiter.load_tier("alice")
+    await store.set("subscriptions", "alice", {"tier": "weekly"})
+
+    # A downgrade doesn't keep the old tier's priority
+    assert not limiter.has_unlimited_tier("alice")
+    assert await limiter.load_tier("alice") == "weekly"
+
+
+@pytest.mark.parametrize("tier, at, period_id", [
+    ("weekly", datetime(2024, 1, 14, 23, 59), "weekly_20240108"),  # Sunday: week began Monday
+    ("weekly", datetime(2024, 1, 15), "weekly_20240115"),
+    ("weekly", datetime(2024, 3, 1), "weekly_20240226"),  # week spans a month boundary
+    ("monthly", datetime(2024, 2, 29), "monthly_20240201"),
+    ("annual", datetime(2024, 12, 31), "annual_20240101"),
+])
+def test_period_ids(limiter, tier, at, period_id):
+    assert limiter.get_period_id(tier, at) == period_id
+
+
+@pytest.mark.asyncio
+async def test_usage_counts_against_every_tier_and_the_limit(limiter, store, monkeypatch):
+    monkeypatch.setattr(settings, "MESSAGE_RATE_LIMIT", 2)
+    await store.set("subscriptions", "alice", {"tier": "weekly"})
+
+    await limiter.increment_usage("alice")
+    assert await limiter.check_limit("alice")
+    await limiter.increment_usage("alice")
+    assert not await limiter.check_limit("alice")
+
+    periods = (await store.get("usage_counters", "alice"))["periods"]
+    assert periods == {limiter.get_period_id(tier): 2 for tier in ("weekly", "monthly", "annual")}
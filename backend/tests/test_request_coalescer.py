@@ -0,0 +1,101 @@
+"""Coalesced generations: fan-out, errors and cancellation"""
+import asyncio
+
+import pytest
+
+from services.request_coalescer import RequestCoalescer
+
+
+class Upstream:
+    """Fake generation that counts calls and notices cancellation"""
+
+    def __init__(self, words=("a", "b", "c"), delay=0.01, error=None):
+        self.words = words
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = False
+
+    async def generate(self):
+        self.calls += 1
+        try:
+            for word in self.words:
+                await asyncio.sleep(self.delay)
+                yield word
+            if self.error is not None:
+                raise self.error
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_one_upstream_call():
+    coalescer = RequestCoalescer(max_waiters=10)
+    upstream = Upstream()
+
+    results = await asyncio.gather(*(collect(coalescer.stream("key", upstream.generate)) for _ in range(3)))
+
+    assert results == [["a", "b", "c"]] * 3
+    assert upstream.calls == 1
+    assert coalescer.metrics()["coalesced"] == 2
+    assert coalescer.metrics()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_flights_are_capped_at_max_waiters():
+    coalescer = RequestCoalescer(max_waiters=2)
+    upstream = Upstream()
+
+    await asyncio.gather(*(collect(coalescer.stream("key", upstream.generate)) for _ in range(3)))
+
+    assert upstream.calls == 2
+    assert coalescer.metrics()["overflow"] == 1
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_reach_every_consumer():
+    coalescer = RequestCoalescer(max_waiters=10)
+    upstream = Upstream(error=RuntimeError("boom"))
+
+    results = await asyncio.gather(
+        *(collect(coalescer.stream("key", upstream.generate)) for _ in range(2)),
+        return_exceptions=True,
+    )
+
+    assert [str(result) for result in results] == ["boom", "boom"]
+    assert upstream.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_generation_is_cancelled_when_every_consumer_leaves():
+    coalescer = RequestCoalescer(max_waiters=10)
+    upstream = Upstream(delay=1)
+    consumers = [asyncio.create_task(collect(coalescer.stream("key", upstream.generate))) for _ in range(2)]
+    await asyncio.sleep(0.01)
+
+    consumers[0].cancel()
+    await asyncio.sleep(0.01)
+    assert not upstream.cancelled  # one consumer is still listening
+
+    consumers[1].cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+    await asyncio.sleep(0.01)
+    assert upstream.cancelled
+    assert coalescer.metrics()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_streams_that_are_never_iterated_hold_no_seat():
+    coalescer = RequestCoalescer(max_waiters=1)
+    upstream = Upstream()
+    unused = coalescer.stream("key", upstream.generate)
+
+    assert await collect(coalescer.stream("key", upstream.generate)) == ["a", "b", "c"]
+    assert upstream.calls == 1
+    assert coalescer.metrics()["overflow"] == 0
+    await unused.aclose()
@@ -0,0 +1,121 @@
+"""Circuit breaker states and upstream error classification"""
+import time
+
+import pytest
+
+from core.config import settings
+from services.gemini_service import GeminiService
+from services.llm_providers import LLMBackend, ProviderHTTPError, ProviderTarget
+from services.llm_scheduler import STANDARD_LANE
+from services.resilience import (
+    CircuitBreaker,
+    THROTTLED_RETRY_AFTER,
+    UpstreamError,
+    classify_error,
+    get_circuit_breaker,
+)
+
+COOLDOWN = 0.05
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker(failure_rate=0.5, min_calls=2, window=30, cooldown=COOLDOWN, name="test")
+
+
+class FailingBackend(LLMBackend):
+    """Backend whose every call raises the same error"""
+
+    def __init__(self, error):
+        self.error = error
+
+    async def generate(self, model_id, prompt):
+        raise self.error
+
+
+async def call_failing(provider, error):
+    target = ProviderTarget(provider, FailingBackend(error), "model")
+    with pytest.raises(UpstreamError) as excinfo:
+        async for _ in GeminiService()._call_model("prompt", None, STANDARD_LANE, target, stream=False):
+            pass
+    return excinfo.value
+
+
+def open_breaker(breaker):
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_breaker_opens_at_the_failure_rate(breaker):
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "closed"  # below min_calls
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(UpstreamError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.code == "circuit_open"
+    assert breaker.rejected == 1
+
+
+def test_breaker_half_opens_after_cooldown_and_closes_on_success(breaker):
+    open_breaker(breaker)
+    time.sleep(COOLDOWN * 1.5)
+    assert breaker.state == "half_open"
+
+    breaker.before_call()  # the trial call
+    with pytest.raises(UpstreamError):
+        breaker.before_call()  # only one trial at a time
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_the_breaker(breaker):
+    open_breaker(breaker)
+    time.sleep(COOLDOWN * 1.5)
+
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert breaker.opened == 2
+
+
+def test_provider_throttling_is_a_503_with_retry_after():
+    error = classify_error(Exception("429 Resource has been exhausted (e.g. check quota)."))
+
+    assert error.code == "upstream_throttled"
+    assert error.status_code == 503
+    assert error.retryable
+    # No hint from the provider: clients still get a Retry-After, internal retries don't
+    assert error.retry_after is None
+    assert error.client_retry_after == THROTTLED_RETRY_AFTER
+
+
+@pytest.mark.asyncio
+async def test_request_errors_dont_count_against_the_breaker(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+
+    for _ in range(settings.LLM_BREAKER_MIN_CALLS + 1):
+        error = await call_failing("test_blocked", ValueError("response was blocked"))
+        assert error.code == "error"
+
+    metrics = get_circuit_breaker("test_blocked").metrics()
+    assert metrics["state"] == "closed"
+    assert metrics["window_failures"] == 0
+
+
+@pytest.mark.asyncio
+async def test_upstream_outages_count_against_the_breaker(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_ATTEMPTS", 0)
+
+    error = await call_failing("test_down", ProviderHTTPError("test_down", 503, "overloaded"))
+
+    assert error.code == "unavailable"
+    assert get_circuit_breaker("test_down").metrics()["window_failures"] == 1
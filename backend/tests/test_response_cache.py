@@ -0,0 +1,46 @@
+"""Response cache backends"""
+import pytest
+
+from core.config import settings
+from services.response_cache import SQLiteCacheBackend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=2)
+
+
+def accessed_at(backend, key):
+    return backend._conn.execute("SELECT accessed_at FROM responses WHERE key = ?", (key,)).fetchone()[0]
+
+
+@pytest.mark.asyncio
+async def test_hits_and_expiry(backend):
+    await backend.set("fresh", "hello", ttl=60)
+    await backend.set("stale", "old", ttl=-1)
+
+    assert await backend.get("fresh") == "hello"
+    assert await backend.get("stale") is None
+    assert await backend.get("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_hits_only_refresh_access_time_once_per_interval(backend, monkeypatch):
+    await backend.set("key", "hello", ttl=60)
+    stored = accessed_at(backend, "key")
+
+    await backend.get("key")
+    assert accessed_at(backend, "key") == stored  # no write on a recent entry
+
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_TOUCH_INTERVAL", 0)
+    await backend.get("key")
+    assert accessed_at(backend, "key") > stored
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_entries_are_evicted(backend):
+    for key in ("a", "b", "c"):
+        await backend.set(key, key, ttl=60)
+
+    assert len(backend) == 2
+    assert await backend.get("a") is None
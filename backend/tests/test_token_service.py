@@ -0,0 +1,156 @@
+"""Token leases, reservation and the weekly reset"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from core.config import settings
+from core.datastore import MemoryDataStore
+from services.token_service import FREE_TOKENS_LIMIT, TokenService
+
+
+@pytest.fixture
+def store():
+    return MemoryDataStore()
+
+
+@pytest.fixture
+def service(store, monkeypatch):
+    monkeypatch.setattr(settings, "TOKEN_LEASE_SIZE", 2)
+    return TokenService(store=store)
+
+
+async def stored_tokens_used(store, user_id):
+    return (await store.get("users", user_id))["tokens_used"]
+
+
+@pytest.mark.asyncio
+async def test_consume_token_stops_at_the_limit(service):
+    results = [(await service.consume_token("alice"))[0] for _ in range(FREE_TOKENS_LIMIT)]
+    assert all(results)
+
+    allowed, status = await service.consume_token("alice")
+    assert not allowed
+    assert status["tokens_remaining"] == 0
+    assert status["tokens_used"] == FREE_TOKENS_LIMIT
+
+
+@pytest.mark.asyncio
+async def test_lease_reserves_ahead_and_releases_unspent_tokens(service, store):
+    allowed, status = await service.consume_token("alice")
+    assert allowed
+    # The whole lease is counted in storage, but only one token is reported as used
+    assert await stored_tokens_used(store, "alice") == 2
+    assert status["tokens_used"] == 1
+
+    # The second token comes from the lease, without another reservation
+    store.collections["users"]["alice"]["tokens_used"] = 99
+    assert (await service.consume_token("alice"))[0]
+    store.collections["users"]["alice"]["tokens_used"] = 2
+
+    assert (await service.consume_token("alice"))[0]
+    assert await stored_tokens_used(store, "alice") == 4
+    await service.release_all_leases()
+    assert await stored_tokens_used(store, "alice") == 3
+
+
+@pytest.mark.asyncio
+async def test_release_after_a_weekly_reset_keeps_the_new_period(service, store):
+    await service.consume_token("alice")
+
+    # Another worker applies the weekly reset while this lease is outstanding
+    store.collections["users"]["alice"].update({
+        "tokens_used": 0,
+        "last_reset": datetime.now(timezone.utc) + timedelta(seconds=1),
+    })
+    await service.release_all_leases()
+
+    assert await stored_tokens_used(store, "alice") == 0
+
+
+@pytest.mark.asyncio
+async def test_reservation_applies_a_due_weekly_reset(service, store):
+    last_reset = datetime.now(timezone.utc) - timedelta(days=8)
+    await store.set("users", "alice", {
+        "tokens_used": FREE_TOKENS_LIMIT,
+        "is_premium": False,
+        "last_reset": last_reset,
+    })
+
+    allowed, status = await service.consume_token("alice")
+
+    assert allowed
+    assert status["tokens_used"] == 1
+    assert await stored_tokens_used(store, "alice") == 2
+    assert (await store.get("users", "alice"))["last_reset"] > last_reset
+
+
+@pytest.mark.asyncio
+async def test_premium_users_are_not_charged(service, store):
+    await store.set("users", "bob", {"is_premium": True, "tokens_used": 0})
+
+    for _ in range(FREE_TOKENS_LIMIT + 1):
+        assert (await service.consume_token("bob"))[0]
+    assert await stored_tokens_used(store, "bob") == 0
+
+
+@pytest.mark.asyncio
+async def test_refund_returns_the_token_to_the_lease(service, store):
+    _, status = await service.consume_token("alice")
+
+    await service.refund_token("alice", status)
+    await service.release_all_leases()
+
+    assert await stored_tokens_used(store, "alice") == 0
+
+
+@pytest.mark.asyncio
+async def test_refund_without_a_lease_is_transactional(service, store):
+    _, status = await service.consume_token("alice")
+    await service.release_all_leases()
+    assert await stored_tokens_used(store, "alice") == 1
+
+    await service.refund_token("alice", status)
+
+    assert await stored_tokens_used(store, "alice") == 0
+
+
+@pytest.mark.asyncio
+async def test_refund_after_a_weekly_reset_is_skipped(service, store):
+    _, status = await service.consume_token("alice")
+    await service.release_all_leases()
+    store.collections["users"]["alice"].update({
+        "tokens_used": 1,
+        "last_reset": datetime.now(timezone.utc) + timedelta(seconds=1),
+    })
+
+    await service.refund_token("alice", status)
+
+    assert await stored_tokens_used(store, "alice") == 1
+
+
+@pytest.mark.asyncio
+async def test_status_reads_never_write(service, store):
+    status = await service.get_token_status("alice")
+    assert status["tokens_remaining"] == FREE_TOKENS_LIMIT
+    assert await store.get("users", "alice") is None
+
+    # A due reset is reported but left to the next reservation
+    last_reset = datetime.now(timezone.utc) - timedelta(days=8)
+    await store.set("users", "bob", {"tokens_used": FREE_TOKENS_LIMIT, "is_premium": False, "last_reset": last_reset})
+    status = await service.get_token_status("bob")
+    assert status["tokens_remaining"] == FREE_TOKENS_LIMIT
+    assert await store.get("users", "bob") == {
+        "tokens_used": FREE_TOKENS_LIMIT, "is_premium": False, "last_reset": last_reset,
+    }
+
+
+@pytest.mark.asyncio
+async def test_upgrade_starts_a_fresh_period(service, store):
+    for _ in range(FREE_TOKENS_LIMIT):
+        await service.consume_token("alice")
+
+    await service.set_premium_status("alice", True)
+
+    status = await service.get_token_status("alice")
+    assert status["is_premium"]
+    assert await stored_tokens_used(store, "alice") == 0